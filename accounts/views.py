@@ -160,7 +160,7 @@ def dashboard(request):
         return redirect('workflow:customer_admin_allocation')
     
     # Get all documents (S3 files)
-    documents = Document.objects.all().order_by('-uploaded_at')[:10]
+    documents = Document.objects.select_related('uploaded_by').order_by('-uploaded_at')[:10]
     
     # Get recently processed requests by this user
     processed_logs = ApprovalLog.objects.filter(user=request.user).select_related('request', 'step').order_by('-timestamp')[:5]
@@ -0,0 +1,119 @@
+"""
+Benchmark of large document uploads to S3 (project/storage.py).
+
+Uploads files of several sizes to an S3-compatible endpoint through:
+
+* sequential      - S3Storage with AWS_S3_USE_THREADS=False, one part at a time
+* s3storage       - S3Storage with boto3's default transfer settings
+* parallel        - ParallelUploadS3Storage (the configured backend's upload path)
+
+and reports the wall time of each save() and the throughput. By default a
+moto server on localhost stands in for S3 (pip install "moto[server]");
+pass --endpoint to use MinIO or any other S3-compatible service instead.
+
+A loopback server has no real network in the way, so every request to it is
+held back to emulate one TCP stream of --link-mbps with --rtt-ms latency, the
+limit parallel parts work around on a real link. Use --link-mbps 0 to
+measure the raw endpoint.
+
+Usage:
+    python benchmark_s3_uploads.py
+    python benchmark_s3_uploads.py --sizes 8,32,128 --link-mbps 80
+    python benchmark_s3_uploads.py --endpoint http://127.0.0.1:9000 --link-mbps 0
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.getcwd())
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+
+import django
+django.setup()
+
+import boto3
+from django.core.files.base import ContentFile
+from storages.backends.s3 import S3Storage
+
+from project.storage import ParallelUploadS3Storage
+
+BUCKET = 'benchmark-uploads'
+CREDENTIALS = {'access_key': 'benchmark', 'secret_key': 'benchmark', 'region_name': 'us-east-1'}
+
+
+def start_moto():
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f'http://{host}:{port}'
+
+
+def throttle(link_mbps, rtt_ms):
+    """botocore before-send hook holding each request back as a single stream would."""
+    def hold(request, **kwargs):
+        try:
+            size = len(request.body or b'')
+        except TypeError:
+            size = 0
+        time.sleep(rtt_ms / 1000 + size * 8 / (link_mbps * 1e6))
+    return hold
+
+
+def make_storages(endpoint):
+    options = dict(CREDENTIALS, bucket_name=BUCKET, endpoint_url=endpoint, file_overwrite=False)
+    return {
+        'sequential': S3Storage(use_threads=False, **options),
+        's3storage': S3Storage(**options),
+        'parallel': ParallelUploadS3Storage(**options),
+    }
+
+
+def benchmark(sizes_mb, endpoint, link_mbps, rtt_ms, repeat):
+    server = None
+    if not endpoint:
+        server, endpoint = start_moto()
+    boto3.client(
+        's3', endpoint_url=endpoint, aws_access_key_id=CREDENTIALS['access_key'],
+        aws_secret_access_key=CREDENTIALS['secret_key'], region_name=CREDENTIALS['region_name'],
+    ).create_bucket(Bucket=BUCKET)
+
+    storages = make_storages(endpoint)
+    if link_mbps:
+        for storage in storages.values():
+            storage.connection.meta.client.meta.events.register('before-send.s3', throttle(link_mbps, rtt_ms))
+
+    print(f"Endpoint {endpoint}, link {link_mbps or 'unthrottled'} Mbit/s per stream, RTT {rtt_ms} ms")
+    print(f"{'size':>8} {'backend':>12} {'seconds':>9} {'MB/s':>8}")
+    try:
+        for size_mb in sizes_mb:
+            data = os.urandom(size_mb * 1024 * 1024)
+            for label, storage in storages.items():
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    name = storage.save(f'bench/{uuid.uuid4().hex}.pdf', ContentFile(data))
+                    timings.append(time.perf_counter() - start)
+                    assert storage.size(name) == len(data)
+                    storage.delete(name)
+                best = min(timings)
+                print(f"{size_mb:>6}MB {label:>12} {best:>9.2f} {size_mb / best:>8.1f}")
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='4,16,64', help='File sizes in MB, comma separated')
+    parser.add_argument('--endpoint', help='S3-compatible endpoint URL (default: a local moto server)')
+    parser.add_argument('--link-mbps', type=float, default=100, help='Emulated per-stream bandwidth, 0 = off')
+    parser.add_argument('--rtt-ms', type=float, default=20, help='Emulated latency per request')
+    parser.add_argument('--repeat', type=int, default=2, help='Runs per size and backend; the best is kept')
+    args = parser.parse_args()
+    benchmark([int(size) for size in args.sizes.split(',')], args.endpoint, args.link_mbps, args.rtt_ms, args.repeat)
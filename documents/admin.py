@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Document
+from .models import Document, FileMetadata
 
 
 @admin.register(Document)
@@ -8,3 +8,11 @@ class DocumentAdmin(admin.ModelAdmin):
     list_filter = ('content_type', 'uploaded_at')
     search_fields = ('original_filename', 'description')
     readonly_fields = ('id', 'uploaded_at')
+
+
+@admin.register(FileMetadata)
+class FileMetadataAdmin(admin.ModelAdmin):
+    list_display = ('name', 'content_type', 'size_display', 'width', 'height', 'pages', 'created_at')
+    list_filter = ('content_type',)
+    search_fields = ('name', 'sha256')
+    readonly_fields = ('created_at',)
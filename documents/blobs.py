@@ -0,0 +1,202 @@
+"""
+Content-addressed deduplication of stored media.
+
+The same ID card, CC card and discharge scans are uploaded with claim after
+claim. Every upload is hashed (SHA-256) by the upload handlers while the
+request body streams in; DedupStorageMixin.save() then looks the digest up
+in StoredBlob and, for known content, returns the existing storage key
+instead of writing (or sending to S3) another copy. New content is stored
+as usual and recorded as a blob. Either way the file's metadata is recorded
+(documents/metadata.py).
+
+Refcounts are bumped on reuse and dropped by delete(), which never removes
+the object itself. Objects go only through collect_garbage() (``manage.py
+gc_blobs``): it recounts the references held by every FileField, and deletes
+blobs that have none and were not reused for the grace period - the row
+first, conditionally, so a concurrent upload either sees the blob and keeps
+it alive or stores its own copy. References and blob names are both sorted
+on disk and walked side by side, so the recount needs no in-memory map.
+"""
+import hashlib
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .metadata import describe, record_metadata
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingMemoryFileUploadHandler(MemoryFileUploadHandler):
+    """MemoryFileUploadHandler that leaves the upload's SHA-256 on ``file.sha256``."""
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.activated:
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """TemporaryFileUploadHandler that leaves the upload's SHA-256 on ``file.sha256``."""
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+def content_sha256(content):
+    """Digest of a File: taken from the upload handler, else hashed in one pass."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def _blobs():
+    # Looked up lazily: storages are built before the app registry is ready
+    return apps.get_model('documents', 'StoredBlob').objects
+
+
+class DedupStorageMixin:
+    """Storage mixin that stores each distinct content once (see module docstring)."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            return super().save(name, content, max_length)
+        if getattr(content, 'storage_name', None):
+            # Already put in storage by the browser (documents/direct.py)
+            return content.storage_name
+
+        digest = content_sha256(content)
+        # Described before saving: a temporary upload is moved away by the save
+        info = describe(content, name, digest)
+        existing = _blobs().filter(sha256=digest).values_list('name', flat=True).first()
+        if existing and (max_length is None or len(existing) <= max_length):
+            # The conditional update loses to a GC that deleted the row meanwhile
+            if _blobs().filter(sha256=digest).update(
+                refcount=F('refcount') + 1, last_referenced_at=timezone.now()
+            ):
+                record_metadata(existing, info)
+                return existing
+
+        stored_name = super().save(name, content, max_length)
+        try:
+            with transaction.atomic():
+                _blobs().create(sha256=digest, name=stored_name, size=content.size or 0)
+        except IntegrityError:
+            # Stored concurrently by another upload (or too long to reuse): keep our copy untracked
+            pass
+        record_metadata(stored_name, info)
+        return stored_name
+
+    def delete(self, name):
+        # Objects are removed by collect_garbage() once nothing references them
+        if _blobs().filter(name=name).update(refcount=models.Case(
+            models.When(refcount__gt=0, then=F('refcount') - 1), default=0
+        )):
+            return
+        super().delete(name)
+
+    def delete_blob_object(self, name):
+        super().delete(name)
+
+
+class DedupFileSystemStorage(DedupStorageMixin, FileSystemStorage):
+    """Local media storage with content deduplication."""
+
+
+def reference_counts(run_size=None):
+    """
+    (storage name, references) over every FileField, in name order. Names
+    are sorted on disk (documents/orphans.py), so memory stays flat.
+    """
+    # Imported here: this module is loaded with the storages, before the apps
+    from .orphans import RUN_SIZE, external_sort, file_column_names
+
+    names = external_sort(file_column_names(), run_size or RUN_SIZE, distinct=False)
+    for name, group in groupby(names):
+        yield name, sum(1 for _ in group)
+
+
+def blob_reference_counts(run_size=None):
+    """(blob name, references) for every StoredBlob, in name order."""
+    from .orphans import RUN_SIZE, external_sort
+
+    blob_names = external_sort(
+        _blobs().values_list('name', flat=True).iterator(chunk_size=5000), run_size or RUN_SIZE
+    )
+    references = reference_counts(run_size)
+    current = next(references, None)
+    for name in blob_names:
+        while current is not None and current[0] < name:
+            current = next(references, None)
+        yield name, current[1] if current is not None and current[0] == name else 0
+
+
+def collect_garbage(storage, grace=timedelta(hours=24), batch_size=1000, dry_run=False, run_size=None):
+    """
+    Recount blob references and delete unreferenced blobs older than ``grace``.
+    Returns (blobs checked, blobs deleted, bytes freed).
+    """
+    cutoff = timezone.now() - grace
+    checked = deleted = freed = 0
+    counts = blob_reference_counts(run_size)
+    while True:
+        references = dict(islice(counts, batch_size))
+        if not references:
+            break
+        # By the unique name index; a blob removed meanwhile is simply skipped
+        batch = list(_blobs().filter(name__in=references))
+        checked += len(batch)
+        recounted = []
+        for blob in batch:
+            refcount = references[blob.name]
+            if refcount == 0 and blob.last_referenced_at < cutoff:
+                if dry_run:
+                    deleted += 1
+                    freed += blob.size
+                    continue
+                # Row first: an upload reusing the blob now bumps last_referenced_at and wins
+                if _blobs().filter(pk=blob.pk, last_referenced_at=blob.last_referenced_at).delete()[0]:
+                    storage.delete_blob_object(blob.name)
+                    deleted += 1
+                    freed += blob.size
+            elif blob.refcount != refcount:
+                blob.refcount = refcount
+                recounted.append(blob)
+        if recounted and not dry_run:
+            _blobs().bulk_update(recounted, ['refcount'], batch_size=500)
+    return checked, deleted, freed
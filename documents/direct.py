@@ -0,0 +1,171 @@
+"""
+Direct-to-storage browser uploads.
+
+Attachments no longer pass through a gunicorn worker on their way to S3.
+When a file is picked, the page asks for an upload grant and sends the
+bytes straight to storage; the claim form then posts only a signed key:
+
+* POST direct-uploads/            field, filename, content_type, size
+                                  -> url, fields, key
+  The browser posts ``fields`` plus the file (last) to ``url`` as
+  multipart/form-data. On S3 that is a presigned POST whose policy pins the
+  key, the content type and the exact size, valid for
+  DIRECT_UPLOAD_EXPIRY_SECONDS; the bucket needs a CORS rule allowing POST
+  from the site. With local media it is direct_upload_receive(), a signed
+  endpoint taking the same form, since there is no other server to send to.
+
+* The form posts ``<file field>_direct_key`` = ``key``. attach_direct_uploads()
+  checks the signature, the user, that the key was granted for that kind of
+  field, that no claim holds the object yet and that it is in storage with
+  the granted size, then puts a DirectUpload into request.FILES. Forms
+  validate it like any upload, and when the model is saved the storage
+  keeps the object's key instead of writing it again (DedupStorageMixin.save).
+
+Directly uploaded files are not deduplicated, so each object may belong to
+one claim only: replacing or deleting the file removes the object. Their
+metadata is recorded by the background processing of the claim
+(documents/processing.py).
+"""
+import os
+import posixpath
+import uuid
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.urls import reverse
+from storages.utils import clean_name
+
+from hospitals.models import Bill, BillAttachment, BillDocument, BillItem
+
+
+DIRECT_KEY_SUFFIX = '_direct_key'
+GRANT_SALT = 'documents.direct.grant'
+KEY_SALT = 'documents.direct.key'
+# A granted key can be posted with a form for this long (a draft may stay open)
+KEY_MAX_AGE = 24 * 3600
+
+# Form field names (the part after the last "-" of formset and draft names) -> model field
+UPLOAD_FIELDS = {
+    'id_card_file': Bill._meta.get_field('id_card_file'),
+    'cc_card_file': Bill._meta.get_field('cc_card_file'),
+    'discharge_summary_file': Bill._meta.get_field('discharge_summary_file'),
+    'supporting_document': BillItem._meta.get_field('supporting_document'),
+    'file': BillDocument._meta.get_field('file'),
+}
+
+
+class GrantError(Exception):
+    """An upload grant that cannot be issued or honoured."""
+
+
+class DirectUpload(UploadedFile):
+    """A file the browser already put in storage; saving it keeps ``storage_name``."""
+
+    def __init__(self, storage_name, size, content_type):
+        super().__init__(None, posixpath.basename(storage_name), content_type, size)
+        self.storage_name = storage_name
+
+    def close(self):
+        # Nothing was opened: the bytes stay in storage
+        pass
+
+
+def _field_kind(form_field):
+    return form_field.rsplit('-', 1)[-1]
+
+
+def _upload_field(form_field):
+    field = UPLOAD_FIELDS.get(_field_kind(form_field))
+    if field is None:
+        raise GrantError(f'{form_field} does not take uploads.')
+    return field
+
+
+def issue_grant(user, form_field, filename, content_type, size, storage=None):
+    """
+    Reserve a fresh key for one upload; returns {'url', 'fields', 'key'}:
+    where and how the browser sends the file, and the signed key to post.
+    """
+    storage = storage or default_storage
+    field = _upload_field(form_field)
+    if size <= 0 or size > settings.DIRECT_UPLOAD_MAX_SIZE:
+        raise GrantError(f'File size must be between 1 byte and {settings.DIRECT_UPLOAD_MAX_SIZE} bytes.')
+
+    # Under the field's upload_to, unique without asking storage
+    base = field.generate_filename(None, os.path.basename(filename) or 'upload')
+    directory, name = posixpath.split(base)
+    key = posixpath.join(directory, f'{uuid.uuid4().hex[:12]}_{name}')[:field.max_length]
+    content_type = (content_type or 'application/octet-stream')[:100]
+    grant = {'key': key, 'size': size, 'type': content_type, 'user': user.pk, 'field': _field_kind(form_field)}
+
+    if hasattr(storage, 'bucket_name'):
+        post = storage.connection.meta.client.generate_presigned_post(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(key)),
+            Fields={'Content-Type': content_type},
+            Conditions=[{'Content-Type': content_type}, ['content-length-range', size, size]],
+            ExpiresIn=settings.DIRECT_UPLOAD_EXPIRY_SECONDS,
+        )
+        url, fields = post['url'], post['fields']
+    else:
+        url = reverse('documents:direct_upload_receive', args=[signing.dumps(grant, salt=GRANT_SALT)])
+        fields = {}
+    return {'url': url, 'fields': fields, 'key': signing.dumps(grant, salt=KEY_SALT)}
+
+
+def receive_upload(token, upload, storage=None):
+    """Store the file sent to the local signed endpoint under its granted key."""
+    storage = storage or default_storage
+    try:
+        grant = signing.loads(token, salt=GRANT_SALT, max_age=settings.DIRECT_UPLOAD_EXPIRY_SECONDS)
+    except signing.BadSignature:
+        raise GrantError('Invalid or expired upload grant.')
+    if upload is None or upload.size != grant['size']:
+        raise GrantError('The file does not match the granted size.')
+    if storage.exists(grant['key']):
+        raise GrantError('This grant has already been used.')
+    # _save(): the exact key, no deduplication, like a presigned POST
+    if storage._save(grant['key'], upload) != grant['key']:
+        raise GrantError('The granted key is taken.')
+    return grant['key']
+
+
+def verify_key(user, signed_key, form_field, storage=None):
+    """DirectUpload for a key posted with ``form_field``, once it is known to be in storage as granted."""
+    storage = storage or default_storage
+    try:
+        grant = signing.loads(signed_key, salt=KEY_SALT, max_age=KEY_MAX_AGE)
+    except signing.BadSignature:
+        raise GrantError('Invalid or expired upload key.')
+    if grant['user'] != user.pk:
+        raise GrantError('Upload key issued to another user.')
+    if grant.get('field') != _field_kind(form_field):
+        raise GrantError('Upload key issued for another field.')
+    # Single use: a second claim holding the object would lose it when the first replaces it
+    if BillAttachment.objects.filter(name=grant['key']).exists():
+        raise GrantError('This upload is already attached to a claim.')
+    try:
+        size = storage.size(grant['key'])
+    except (OSError, ClientError):
+        raise GrantError('The uploaded file is not in storage.')
+    if size != grant['size']:
+        raise GrantError('The uploaded file does not match the granted size.')
+    return DirectUpload(grant['key'], size, grant['type'])
+
+
+def attach_direct_uploads(request):
+    """Add the verified files named by ``<field>_direct_key`` posts to request.FILES."""
+    for key, value in request.POST.items():
+        if not key.endswith(DIRECT_KEY_SUFFIX) or not value:
+            continue
+        field = key[:-len(DIRECT_KEY_SUFFIX)]
+        if field in request.FILES:
+            continue
+        try:
+            request.FILES[field] = verify_key(request.user, value, field)
+        except GrantError:
+            # Left out: the form reports the file as missing, as for a failed upload
+            continue
@@ -0,0 +1,69 @@
+"""
+Record size, type, dimensions/pages and checksum of claim files stored
+before FileMetadata existed (documents/metadata.py).
+
+Claims are walked in keyset batches; the files of a batch not described yet
+are read by a thread pool - the work is mostly waiting on storage - and
+their rows inserted together. Files missing from storage are reported and
+skipped, so the command can be re-run until nothing is left.
+
+Usage:
+    python manage.py backfill_file_metadata
+    python manage.py backfill_file_metadata --workers 16 --batch-size 200
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from documents.metadata import describe_stored
+from documents.models import FileMetadata
+from documents.previews import bill_media_names
+from hospitals.employees import create_missing
+from hospitals.models import Bill
+
+
+def _describe(name):
+    try:
+        return name, describe_stored(default_storage, name)
+    except OSError:
+        return name, None
+
+
+class Command(BaseCommand):
+    help = 'Record the metadata of claim files that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Reading threads (default: 8)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Claims per batch (default: 500)')
+
+    def handle(self, *args, **options):
+        described = missing = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                bill_ids = list(
+                    Bill.objects.filter(id__gt=last_id)
+                    .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+                )
+                if not bill_ids:
+                    break
+                last_id = bill_ids[-1]
+                names = bill_media_names(bill_ids)
+                names -= set(FileMetadata.objects.filter(name__in=names).values_list('name', flat=True))
+
+                rows = []
+                for name, info in pool.map(_describe, sorted(names)):
+                    if info is None:
+                        missing += 1
+                        self.stderr.write(f'Not found in storage: {name}')
+                        continue
+                    rows.append(FileMetadata(name=name, **info))
+                create_missing(FileMetadata, rows)
+                described += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Described {described} files; {missing} missing from storage.'
+        ))
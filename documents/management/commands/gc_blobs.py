@@ -0,0 +1,49 @@
+"""
+Garbage-collect deduplicated media blobs (documents/blobs.py).
+
+Recounts the references every FileField holds to each stored blob, fixes
+drifted refcounts, and deletes the blobs nothing references that were not
+reused within the grace period - row first, then the stored object.
+
+Usage, e.g. nightly from cron:
+    python manage.py gc_blobs
+    python manage.py gc_blobs --grace-hours 72 --dry-run
+"""
+from datetime import timedelta
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.blobs import DedupStorageMixin, collect_garbage
+from documents.orphans import RUN_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Delete stored media blobs that no longer have any references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Keep unreferenced blobs reused within this many hours (default: 24)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Blobs per batch (default: 1000)')
+        parser.add_argument('--run-size', type=int, default=RUN_SIZE,
+                            help=f'References sorted in memory at a time (default: {RUN_SIZE})')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        storage = storages['default']
+        if not isinstance(storage, DedupStorageMixin):
+            raise CommandError('The default storage does not deduplicate; nothing to collect.')
+
+        checked, deleted, freed = collect_garbage(
+            storage,
+            grace=timedelta(hours=options['grace_hours']),
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            run_size=options['run_size'],
+        )
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} blobs. {verb} {deleted} unreferenced blobs ({freed} bytes).'
+        ))
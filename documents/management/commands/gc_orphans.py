@@ -0,0 +1,50 @@
+"""
+Delete media files no row references any more (documents/orphans.py):
+leftovers of deleted claims, replaced uploads and rolled-back submissions.
+
+Referenced names and the storage listing are compared as two sorted
+streams, so memory stays flat however many files there are. Only objects
+older than the grace period are touched, which covers uploads still being
+saved while the command runs. With --quarantine they are moved under
+quarantine/ instead of deleted.
+
+Usage, e.g. weekly from cron:
+    python manage.py gc_orphans --dry-run
+    python manage.py gc_orphans --grace-hours 72 --quarantine
+"""
+from datetime import timedelta
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+
+from documents.orphans import QUARANTINE_PREFIX, RUN_SIZE, collect_orphans
+
+
+class Command(BaseCommand):
+    help = 'Delete or quarantine stored media files that no row references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Leave files modified within this many hours (default: 24)')
+        parser.add_argument('--quarantine', action='store_true',
+                            help=f'Move orphans under {QUARANTINE_PREFIX} instead of deleting them')
+        parser.add_argument('--run-size', type=int, default=RUN_SIZE,
+                            help=f'Referenced names sorted in memory at a time (default: {RUN_SIZE})')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be removed')
+
+    def handle(self, *args, **options):
+        removed, freed = collect_orphans(
+            storages['default'],
+            grace=timedelta(hours=options['grace_hours']),
+            quarantine=options['quarantine'],
+            dry_run=options['dry_run'],
+            run_size=options['run_size'],
+        )
+        if options['dry_run']:
+            verb = 'Would remove'
+        else:
+            verb = 'Quarantined' if options['quarantine'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} orphaned files ({freed / 1e6:.1f} MB).'
+        ))
@@ -0,0 +1,62 @@
+"""
+Render thumbnails and previews for claim documents that have none yet
+(documents/previews.py) - claims filed before previews existed, or whose
+background job was lost to a worker restart.
+
+Claims are walked in keyset batches; each batch's files are rendered by a
+thread pool, since Pillow releases the GIL while decoding and resizing.
+
+Usage:
+    python manage.py generate_previews
+    python manage.py generate_previews --workers 8 --retry-failed
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from documents.models import MediaPreview
+from documents.previews import bill_media_names, generate_preview
+from hospitals.models import Bill
+
+
+def _generate(name):
+    try:
+        return generate_preview(name)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Create missing thumbnails and previews of claim documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Rendering threads (default: 4)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Claims per batch (default: 500)')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Render again the files whose previous attempt failed')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            MediaPreview.objects.filter(status='FAILED').delete()
+
+        rendered = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                bill_ids = list(
+                    Bill.objects.filter(id__gt=last_id).exclude(status='DRAFT')
+                    .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+                )
+                if not bill_ids:
+                    break
+                last_id = bill_ids[-1]
+                names = bill_media_names(bill_ids)
+                names -= set(MediaPreview.objects.filter(source__in=names).values_list('source', flat=True))
+                rendered += sum(1 for preview in pool.map(_generate, sorted(names)) if preview)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {rendered} files; {MediaPreview.objects.filter(status="READY").count()} previews ready.'
+        ))
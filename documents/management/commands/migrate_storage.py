@@ -0,0 +1,124 @@
+"""
+Copy every stored media file to the other storage backend, local media to
+S3 or back (documents/transfer.py), before switching STORAGES over.
+
+Rows of each FileField are walked in keyset batches; the distinct files of
+a batch are copied by a thread pool and verified by checksum. After each
+batch the position reached is written to the checkpoint file, so a stopped
+run resumes where it left off, retrying the files that failed. Progress
+lines report the throughput.
+
+Usage:
+    python manage.py migrate_storage --to s3
+    python manage.py migrate_storage --to local --workers 32 --checkpoint /var/tmp/to_local.json
+    python manage.py migrate_storage --to s3 --restart
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.transfer import BACKENDS, TransferError, backend, copy_file, file_columns
+
+
+def _copy(source, target, name):
+    try:
+        size, present = copy_file(source, target, name)
+        return name, size, present, None
+    except (OSError, TransferError) as e:
+        return name, 0, False, str(e) or type(e).__name__
+
+
+class Command(BaseCommand):
+    help = 'Copy all media files between local storage and S3, verifying checksums'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', choices=BACKENDS, required=True,
+                            help='Backend to copy to; files are read from the other one')
+        parser.add_argument('--workers', type=int, default=16,
+                            help='Copying threads (default: 16)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per batch (default: 1000)')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, 'storage_migration.json'),
+                            help='Progress file (default: storage_migration.json in the project)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint and start from the beginning')
+
+    def handle(self, *args, **options):
+        self.checkpoint_path = options['checkpoint']
+        self.checkpoint = {'to': options['to'], 'positions': {}, 'failed': []}
+        if os.path.exists(self.checkpoint_path) and not options['restart']:
+            with open(self.checkpoint_path) as f:
+                self.checkpoint = json.load(f)
+            if self.checkpoint.get('to') != options['to']:
+                raise CommandError(
+                    f"{self.checkpoint_path} belongs to a copy to {self.checkpoint.get('to')}; use --restart."
+                )
+            self.stdout.write(f'Resuming from {self.checkpoint_path}.')
+
+        try:
+            target = backend(options['to'])
+            source = backend(next(label for label in BACKENDS if label != options['to']))
+        except TransferError as e:
+            raise CommandError(e)
+
+        self.copied = self.present = self.bytes = 0
+        self.started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            self.pool = pool
+            retry = self.checkpoint['failed']
+            self.checkpoint['failed'] = []
+            if retry:
+                self._copy_batch('previous failures', source, target, retry)
+                self._save_checkpoint()
+
+            positions = self.checkpoint['positions']
+            for label, model, column in file_columns():
+                while True:
+                    rows = model._default_manager.exclude(**{column: ''}).exclude(**{f'{column}__isnull': True})
+                    if label in positions:
+                        rows = rows.filter(pk__gt=positions[label])
+                    batch = list(rows.order_by('pk').values_list('pk', column)[:options['batch_size']])
+                    if not batch:
+                        break
+                    self._copy_batch(label, source, target, {name for _, name in batch})
+                    last_pk = batch[-1][0]
+                    positions[label] = last_pk if isinstance(last_pk, int) else str(last_pk)
+                    self._save_checkpoint()
+
+        failed = self.checkpoint['failed']
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Copied {self.copied} files ({self.bytes / 1e6:.1f} MB) at {self._rate()}; '
+            f'{self.present} already present; {len(failed)} failed'
+            + (f', listed in {self.checkpoint_path} and retried on the next run.' if failed else '.')
+        ))
+
+    def _copy_batch(self, label, source, target, names):
+        names = sorted(names)
+        count = len(names)
+        for name, size, present, error in self.pool.map(_copy, [source] * count, [target] * count, names):
+            if error:
+                self.stderr.write(f'{name}: {error}')
+                self.checkpoint['failed'].append(name)
+            elif present:
+                self.present += 1
+            else:
+                self.copied += 1
+                self.bytes += size
+        self.stdout.write(
+            f'{label}: {count} files; {self.copied} copied, {self.bytes / 1e6:.1f} MB, {self._rate()}'
+        )
+
+    def _rate(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return f'{self.copied / elapsed:.1f} files/s, {self.bytes / elapsed / 1e6:.1f} MB/s'
+
+    def _save_checkpoint(self):
+        partial = f'{self.checkpoint_path}.tmp'
+        with open(partial, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(partial, self.checkpoint_path)
@@ -0,0 +1,66 @@
+"""
+Normalize the images of claims filed before upload normalization existed
+(documents/normalize.py): cap resolution, strip metadata and re-encode,
+replacing each file only when that makes it clearly smaller.
+
+Claims are walked in keyset batches and handed to a thread pool, since
+Pillow releases the GIL while decoding and encoding. Previews of replaced
+files are not rebuilt here; run ``generate_previews`` afterwards.
+
+Usage:
+    python manage.py normalize_media
+    python manage.py normalize_media --workers 8 --merge-pages
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from documents.normalize import merge_document_pages, normalize_bill_media
+from hospitals.models import Bill
+
+
+def _normalize(bill_id, merge_pages):
+    try:
+        result = normalize_bill_media([bill_id])
+        if merge_pages:
+            merge_document_pages(bill_id)
+        return result
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Downscale and re-encode the images of submitted claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Encoding threads (default: 4)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Claims per batch (default: 500)')
+        parser.add_argument('--merge-pages', action='store_true',
+                            help="Also merge each claim's photographed pages into one PDF")
+
+    def handle(self, *args, **options):
+        replaced = before = after = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                bill_ids = list(
+                    Bill.objects.filter(id__gt=last_id).exclude(status='DRAFT')
+                    .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+                )
+                if not bill_ids:
+                    break
+                last_id = bill_ids[-1]
+                results = pool.map(_normalize, bill_ids, [options['merge_pages']] * len(bill_ids))
+                for files, size_before, size_after in results:
+                    replaced += files
+                    before += size_before
+                    after += size_after
+
+        saved = before - after
+        self.stdout.write(self.style.SUCCESS(
+            f'Replaced {replaced} files: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB '
+            f'({saved / 1e6:.1f} MB saved).'
+        ))
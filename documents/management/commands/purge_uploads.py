@@ -0,0 +1,18 @@
+"""
+Delete resumable uploads older than CHUNKED_UPLOAD_EXPIRY_HOURS, with their
+part files (documents/uploads.py).
+
+Meant to run from cron, e.g. hourly:
+    python manage.py purge_uploads
+"""
+from django.core.management.base import BaseCommand
+
+from documents.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Remove expired resumable uploads'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Removed {deleted} expired uploads.'))
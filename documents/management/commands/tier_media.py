@@ -0,0 +1,90 @@
+"""
+Move the files of long-closed claims to the cold S3 storage class
+(documents/tiering.py). Keys and URLs do not change.
+
+Requests are walked in keyset batches; each batch's claims are handled by a
+small thread pool, with a pause between batches so the job can run beside
+normal traffic. Already-archived requests are skipped, so it can run
+nightly from cron.
+
+Usage:
+    python manage.py tier_media --dry-run
+    python manage.py tier_media --older-than-days 1095 --workers 4 --pause 2
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from documents.previews import bill_media_names
+from documents.tiering import COLD_STORAGE_CLASSES, archive_request, cold_requests
+
+
+class Command(BaseCommand):
+    help = 'Move the files of claims closed long ago to the cold storage tier'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.MEDIA_COLD_AFTER_DAYS,
+                            help=f'Claims closed at least this long ago (default: {settings.MEDIA_COLD_AFTER_DAYS})')
+        parser.add_argument('--storage-class', default=settings.MEDIA_COLD_STORAGE_CLASS,
+                            choices=COLD_STORAGE_CLASSES,
+                            help=f'Target S3 storage class (default: {settings.MEDIA_COLD_STORAGE_CLASS})')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Claims handled at once (default: 4)')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Claims per batch (default: 200)')
+        parser.add_argument('--pause', type=float, default=1.0,
+                            help='Seconds to wait between batches (default: 1)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the claims and files that qualify')
+
+    def handle(self, *args, **options):
+        storage = storages['default']
+        if not hasattr(storage, 'bucket_name'):
+            raise CommandError('Storage tiering needs S3 media storage; local media has a single tier.')
+        if options['storage_class'] not in COLD_STORAGE_CLASSES:
+            raise CommandError(f"MEDIA_COLD_STORAGE_CLASS must be one of {', '.join(COLD_STORAGE_CLASSES)}.")
+
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        pending = cold_requests(cutoff).filter(media_archived_at__isnull=True)
+
+        def archive(row):
+            try:
+                return archive_request(storage, row[0], row[1], cutoff, options['storage_class'])
+            finally:
+                close_old_connections()
+
+        requests = files = size = kept = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(
+                    pending.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'bill_id')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                requests += len(batch)
+                if options['dry_run']:
+                    files += len(bill_media_names([bill_id for _, bill_id in batch]))
+                    continue
+                for moved, moved_bytes, hot in pool.map(archive, batch):
+                    files += moved
+                    size += moved_bytes
+                    kept += hot
+                self.stdout.write(f'{requests} claims, {files} files ({size / 1e6:.1f} MB) moved')
+                time.sleep(options['pause'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{requests} claims with {files} files qualify.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {files} files ({size / 1e6:.1f} MB) of {requests} claims to {options['storage_class']}; "
+            f'{kept} shared with newer claims left hot.'
+        ))
@@ -0,0 +1,133 @@
+"""
+Stored file metadata.
+
+Size, MIME type, image dimensions, PDF page count and SHA-256 of every file
+saved through the media storage are captured once, while the upload is
+still at hand (DedupStorageMixin.save), and kept in FileMetadata keyed by
+storage name. Claim pages read them with one query per page instead of a
+HEAD/stat per attachment. ``manage.py backfill_file_metadata`` describes
+files stored before this existed.
+"""
+import hashlib
+import mimetypes
+import re
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from PIL import Image, UnidentifiedImageError
+
+
+CHUNK_SIZE = 64 * 1024
+# Page objects of a PDF; pages inside compressed object streams are not visible
+PDF_PAGE = re.compile(rb'/Type\s{0,8}/Page(?![A-Za-z])')
+
+
+def _metadata():
+    # Looked up lazily: storages are built before the app registry is ready
+    return apps.get_model('documents', 'FileMetadata').objects
+
+
+def pdf_page_count(content):
+    """Page objects found in a PDF, or 0; read in chunks."""
+    count = 0
+    carry = b''
+    for chunk in content.chunks(CHUNK_SIZE):
+        data = carry + chunk
+        # Matches near the end are counted next round, once the byte after them is known
+        cut = max(len(data) - 32, 0)
+        count += sum(1 for match in PDF_PAGE.finditer(data) if match.start() < cut)
+        carry = data[cut:]
+    return count + len(PDF_PAGE.findall(carry))
+
+
+def describe(content, name, sha256=''):
+    """Metadata of a File about to be stored as ``name``."""
+    content_type = mimetypes.guess_type(name)[0] or getattr(content, 'content_type', None) or ''
+    info = {
+        'size': content.size or 0,
+        'content_type': content_type[:100],
+        'width': None,
+        'height': None,
+        'pages': None,
+        'sha256': sha256,
+    }
+    content.seek(0)
+    if content_type.startswith('image/'):
+        try:
+            # Only the header is parsed; pixels are never decoded
+            image = Image.open(content)
+            info['width'], info['height'] = image.size
+            info['content_type'] = Image.MIME.get(image.format, content_type)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            pass
+    elif content_type == 'application/pdf':
+        info['pages'] = pdf_page_count(content) or None
+    content.seek(0)
+    return info
+
+
+def describe_stored(storage, name):
+    """Metadata of a file already in storage (backfill): one read for hash and page count."""
+    with storage.open(name, 'rb') as stored:
+        hasher = hashlib.sha256()
+        for chunk in stored.chunks(CHUNK_SIZE):
+            hasher.update(chunk)
+        return describe(stored, name, hasher.hexdigest())
+
+
+def record_metadata(name, info):
+    """Store the metadata of ``name`` unless it is already known."""
+    if _metadata().filter(name=name).exists():
+        return
+    try:
+        with transaction.atomic():
+            _metadata().create(name=name, **info)
+    except IntegrityError:
+        # Recorded concurrently
+        pass
+
+
+def metadata_for(names):
+    """{storage name: FileMetadata} for ``names``, in one query."""
+    names = [name for name in names if name]
+    if not names:
+        return {}
+    return {meta.name: meta for meta in _metadata().filter(name__in=names)}
+
+
+def attach_metadata(bill, items=(), documents=(), attachments=()):
+    """
+    Set ``.meta`` on the claim's items, documents and BillAttachments and return
+    the metadata of its own files as {'id_card': ..., 'cc_card': ..., 'discharge_summary': ...}.
+    """
+    bill_files = {
+        'id_card': bill.id_card_file.name,
+        'cc_card': bill.cc_card_file.name,
+        'discharge_summary': bill.discharge_summary_file.name,
+    }
+    found = metadata_for(
+        list(bill_files.values())
+        + [item.supporting_document.name for item in items]
+        + [document.file.name for document in documents]
+        + [attachment.name for attachment in attachments]
+    )
+    for item in items:
+        item.meta = found.get(item.supporting_document.name)
+    for document in documents:
+        document.meta = found.get(document.file.name)
+    for attachment in attachments:
+        attachment.meta = found.get(attachment.name)
+    return {key: found.get(name) for key, name in bill_files.items()}
+
+
+def record_bill_metadata(bill_id, storage):
+    """Describe the claim's files that have no metadata yet (uploaded straight to storage)."""
+    from .previews import bill_media_names
+
+    names = bill_media_names([bill_id])
+    names -= set(_metadata().filter(name__in=names).values_list('name', flat=True))
+    for name in sorted(names):
+        try:
+            record_metadata(name, describe_stored(storage, name))
+        except OSError:
+            continue
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_storedblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaPreview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('READY', 'Ready'), ('SKIPPED', 'Not an image'), ('FAILED', 'Failed')], max_length=10)),
+                ('thumbnail', models.FileField(blank=True, null=True, upload_to='')),
+                ('preview', models.FileField(blank=True, null=True, upload_to='')),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
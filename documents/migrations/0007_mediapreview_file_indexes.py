@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_filemetadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediapreview',
+            name='preview',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to=''),
+        ),
+        migrations.AlterField(
+            model_name='mediapreview',
+            name='thumbnail',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to=''),
+        ),
+    ]
@@ -1,7 +1,17 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 
 
+def format_size(size):
+    """Human readable file size."""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
 class Document(models.Model):
     """Generic document storage (S3)."""
     
@@ -21,6 +31,11 @@ class Document(models.Model):
     
     class Meta:
         ordering = ['-uploaded_at']
+        # Keyset pages of the library, unfiltered and by content type (documents/pagination.py)
+        indexes = [
+            models.Index(fields=['uploaded_at', 'id'], name='document_uploaded_idx'),
+            models.Index(fields=['content_type', 'uploaded_at', 'id'], name='document_type_uploaded_idx'),
+        ]
     
     def __str__(self):
         return self.original_filename
@@ -28,9 +43,96 @@ class Document(models.Model):
     @property
     def file_size_display(self):
         """Human readable file size."""
-        size = self.file_size
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024:
-                return f"{size:.1f} {unit}"
-            size /= 1024
-        return f"{size:.1f} TB"
+        return format_size(self.file_size)
+
+
+class StoredBlob(models.Model):
+    """
+    One stored object per distinct content (see documents/blobs.py).
+    Uploads with the same SHA-256 reuse ``name`` instead of storing a copy.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every reuse; the GC only removes blobs unreferenced for a grace period
+    last_referenced_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class MediaPreview(models.Model):
+    """
+    Thumbnail and mid-size preview of an uploaded image, stored next to the
+    original (see documents/previews.py). Non-image files get a SKIPPED row.
+    """
+    STATUS_CHOICES = (
+        ('READY', 'Ready'),
+        ('SKIPPED', 'Not an image'),
+        ('FAILED', 'Failed'),
+    )
+
+    source = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    # Indexed for the media permission check (documents/offload.py)
+    thumbnail = models.FileField(blank=True, null=True, db_index=True)
+    preview = models.FileField(blank=True, null=True, db_index=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+
+class ChunkedUpload(models.Model):
+    """
+    A file sent in chunks that can resume after a dropped connection (see
+    documents/uploads.py). ``offset`` bytes have been received so far.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='+')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class FileMetadata(models.Model):
+    """
+    Size, type, dimensions and checksum of a stored claim file, keyed by its
+    storage name and captured when it is saved (see documents/metadata.py),
+    so pages can describe attachments without a storage call.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    pages = models.PositiveIntegerField(null=True, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def kind(self):
+        """Short type label, e.g. PDF or JPEG."""
+        return (self.content_type.rpartition('/')[2] or 'file').upper()
+
+    @property
+    def size_display(self):
+        return format_size(self.size)
+
+    def __str__(self):
+        return f"{self.name} ({self.content_type}, {self.size} bytes)"
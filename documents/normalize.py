@@ -0,0 +1,180 @@
+"""
+Normalization of uploaded claim images.
+
+Hospitals upload phone photos and 600-dpi scans of 5-15 MB. After a claim
+is submitted every image among its files is re-encoded once: EXIF rotation
+applied, longest side capped at MEDIA_MAX_DIMENSION, metadata dropped, and
+saved as MEDIA_IMAGE_FORMAT (JPEG or WEBP) at MEDIA_IMAGE_QUALITY. The new
+file replaces the original in its column only when it is clearly smaller,
+so re-running is a no-op and already-compact files are left alone. PDFs are
+never touched.
+
+With MEDIA_MERGE_PAGES, a claim's BillDocuments of the same type that are
+all images (the pages of one discharge summary photographed one by one) are
+then merged into a single PDF document.
+
+Runs in the background pool of documents/processing.py; ``manage.py
+normalize_media`` handles claims filed earlier.
+"""
+import io
+import logging
+import os
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from hospitals.attachments import sync_attachments
+from hospitals.models import Bill, BillDocument, BillItem
+from .previews import is_image_name
+
+
+logger = logging.getLogger(__name__)
+
+# Files normalized in place: (model, file column, column pointing at the claim)
+NORMALIZED_FIELDS = [
+    (Bill, 'id_card_file', 'id'),
+    (Bill, 'cc_card_file', 'id'),
+    (Bill, 'discharge_summary_file', 'id'),
+    (BillItem, 'supporting_document', 'bill_id'),
+    (BillDocument, 'file', 'bill_id'),
+]
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+# A re-encode must save at least this share of the bytes to replace the original
+MIN_SAVING = 0.10
+PDF_RESOLUTION = 150
+
+
+def _prepared(image, max_dimension):
+    """Upright, flattened, downscaled copy of an opened image, ready to encode."""
+    # JPEG: let the decoder downscale by 2/4/8 before resizing
+    image.draft('RGB', (max_dimension, max_dimension))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, 'white')
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('L' if image.mode in ('1', 'I;16') else 'RGB')
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    return image
+
+
+def _encode(image, image_format, quality):
+    buffer = io.BytesIO()
+    if image_format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+    else:
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def normalize_image(name, storage=None):
+    """
+    Re-encode one stored image; returns (new name, bytes before, bytes after),
+    or None when the file is not an image or would not shrink enough.
+    """
+    storage = storage or default_storage
+    if not is_image_name(name):
+        return None
+    image_format = settings.MEDIA_IMAGE_FORMAT if settings.MEDIA_IMAGE_FORMAT in EXTENSIONS else 'JPEG'
+
+    original_size = storage.size(name)
+    with storage.open(name, 'rb') as original:
+        image = _prepared(Image.open(original), settings.MEDIA_MAX_DIMENSION)
+        data = _encode(image, image_format, settings.MEDIA_IMAGE_QUALITY)
+    if len(data) > original_size * (1 - MIN_SAVING):
+        return None
+
+    new_name = storage.save(os.path.splitext(name)[0] + EXTENSIONS[image_format], ContentFile(data))
+    return new_name, original_size, len(data)
+
+
+def _replace(model, field, pk, old_name, new_name, storage):
+    """Point one row at the normalized file unless it changed meanwhile; drop the loser."""
+    if model.objects.filter(pk=pk, **{field: old_name}).update(**{field: new_name}):
+        storage.delete(old_name)
+        return True
+    storage.delete(new_name)
+    return False
+
+
+def normalize_bill_media(bill_ids, storage=None):
+    """Normalize every image of the given claims; returns (files replaced, bytes before, bytes after)."""
+    storage = storage or default_storage
+    replaced = before = after = 0
+    for model, field, bill_column in NORMALIZED_FIELDS:
+        rows = (
+            model.objects.filter(**{f'{bill_column}__in': bill_ids})
+            .exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            .values_list('pk', field)
+        )
+        for pk, name in rows:
+            if not is_image_name(name):
+                continue
+            try:
+                result = normalize_image(name, storage)
+            except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+                logger.warning("Normalizing %s failed: %s", name, e)
+                continue
+            if result and _replace(model, field, pk, name, result[0], storage):
+                replaced += 1
+                before += result[1]
+                after += result[2]
+    if replaced:
+        sync_attachments(bill_ids)
+    return replaced, before, after
+
+
+def merge_document_pages(bill_id, storage=None):
+    """
+    Merge the claim's image-only BillDocuments of each type into one PDF
+    document; returns the number of documents merged away.
+    """
+    storage = storage or default_storage
+    groups = {}
+    for document in BillDocument.objects.filter(bill_id=bill_id).order_by('uploaded_at', 'id'):
+        groups.setdefault(document.document_type, []).append(document)
+
+    merged = 0
+    for document_type, pages in groups.items():
+        if len(pages) < 2 or not all(is_image_name(page.file.name) for page in pages):
+            continue
+        try:
+            with ExitStack() as stack:
+                images = [
+                    _prepared(Image.open(stack.enter_context(storage.open(page.file.name, 'rb'))),
+                              settings.MEDIA_MAX_DIMENSION)
+                    for page in pages
+                ]
+                buffer = io.BytesIO()
+                images[0].save(buffer, 'PDF', save_all=True, append_images=images[1:],
+                               resolution=PDF_RESOLUTION, quality=settings.MEDIA_IMAGE_QUALITY)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            logger.warning("Merging %s pages of claim %s failed: %s", document_type, bill_id, e)
+            continue
+
+        first, rest = pages[0], pages[1:]
+        pdf_name = storage.save(
+            f"{os.path.dirname(first.file.name)}/{bill_id}_{document_type.lower()}.pdf",
+            ContentFile(buffer.getvalue()),
+        )
+        with transaction.atomic():
+            # Pages replaced or removed meanwhile: leave the group as it is
+            updated = BillDocument.objects.filter(pk=first.pk, file=first.file.name).update(file=pdf_name)
+            deleted = updated and BillDocument.objects.filter(
+                pk__in=[page.pk for page in rest], document_type=document_type
+            ).delete()[0]
+            if not updated or deleted != len(rest):
+                transaction.set_rollback(True)
+                storage.delete(pdf_name)
+                continue
+        for page in pages:
+            storage.delete(page.file.name)
+        merged += len(rest)
+    if merged:
+        sync_attachments([bill_id])
+    return merged
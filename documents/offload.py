@@ -0,0 +1,71 @@
+"""
+Web-server file offload for local media storage.
+
+With MEDIA_OFFLOAD set, Django only authorizes a media download and answers
+with an empty response carrying an internal-redirect header; the front web
+server then streams the file itself and the gunicorn worker is free at once.
+
+* MEDIA_OFFLOAD = 'nginx'    -> X-Accel-Redirect: MEDIA_OFFLOAD_PREFIX + name
+      location /protected-media/ { internal; alias /path/to/media/; }
+* MEDIA_OFFLOAD = 'sendfile' -> X-Sendfile: absolute path (Apache mod_xsendfile,
+      lighttpd)
+
+Without it the file is streamed by Django (FileResponse), as before.
+Media under MEDIA_URL is only reachable through serve_media, so the web
+server must not expose MEDIA_ROOT directly.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse
+
+from hospitals.models import Bill, BillDocument, BillImport, BillItem, SanctionOrder
+from .models import MediaPreview
+
+
+OFFLOAD_MODES = ('nginx', 'sendfile')
+
+
+def offload_response(storage, name, download_name=None):
+    """Response that hands file ``name`` of a local ``storage`` to the web server."""
+    if not name or not storage.exists(name):
+        raise Http404('File not found')
+
+    mode = settings.MEDIA_OFFLOAD
+    if mode == 'nginx':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.MEDIA_OFFLOAD_PREFIX + quote(name)
+    elif mode == 'sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = storage.path(name)
+    else:
+        return FileResponse(storage.open(name, 'rb'), filename=download_name or os.path.basename(name))
+
+    content_type, encoding = mimetypes.guess_type(download_name or name)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(download_name or os.path.basename(name))}"
+    return response
+
+
+def hospital_owns_media(hospital, name):
+    """Whether a media file belongs to one of the hospital's claims, imports or sanction orders."""
+    # A thumbnail or preview belongs to whoever owns its original (a deduplicated
+    # one may serve several originals)
+    sources = list(
+        MediaPreview.objects.filter(Q(thumbnail=name) | Q(preview=name)).values_list('source', flat=True)
+    )
+    if sources:
+        return any(hospital_owns_media(hospital, source) for source in sources)
+    bills = Bill.objects.filter(hospital=hospital)
+    return (
+        bills.filter(Q(id_card_file=name) | Q(cc_card_file=name) | Q(discharge_summary_file=name)).exists()
+        or BillDocument.objects.filter(bill__in=bills, file=name).exists()
+        or BillItem.objects.filter(bill__in=bills, supporting_document=name).exists()
+        or SanctionOrder.objects.filter(bill__in=bills, pdf_file=name).exists()
+        or BillImport.objects.filter(hospital=hospital, error_report=name).exists()
+    )
@@ -0,0 +1,233 @@
+"""
+Garbage collection of orphaned media files.
+
+Deleted claims, replaced uploads and rolled-back submissions leave files in
+storage that no row points to. ``manage.py gc_orphans`` finds them by
+walking two sorted streams side by side:
+
+* every name held by a FileField (plus the StoredBlob rows, which gc_blobs
+  owns), read in chunks and sorted externally in runs of RUN_SIZE names
+  spilled to temporary files, so memory does not grow with the table;
+* the objects in storage, in name order. On S3 each top-level prefix is
+  listed by its own thread, LIST_PAGES pages ahead at most, and the
+  listings are merged; locally the media tree is walked in sorted order.
+
+A stored object missing from the referenced stream and last modified
+before the grace period is an orphan: it is deleted, or moved under
+QUARANTINE_PREFIX to be reviewed and removed later. Its FileMetadata and
+MediaPreview rows go with it.
+"""
+import heapq
+import os
+import queue
+import tempfile
+import threading
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+from operator import itemgetter
+
+from django.apps import apps
+from django.utils import timezone
+
+from .transfer import file_columns
+
+
+QUARANTINE_PREFIX = 'quarantine/'
+RUN_SIZE = 100_000
+LIST_PAGES = 4
+DELETE_BATCH = 1000
+_DONE = object()
+
+
+def _unique(names):
+    previous = None
+    for name in names:
+        if name != previous:
+            yield name
+            previous = name
+
+
+def _read_run(run):
+    run.seek(0)
+    for line in run:
+        yield line[:-1]
+
+
+def external_sort(names, run_size=RUN_SIZE, distinct=True):
+    """``names`` in order (distinct unless told otherwise), sorting runs of ``run_size`` on disk."""
+    runs = []
+    try:
+        while True:
+            chunk = list(islice(names, run_size))
+            if not chunk:
+                break
+            chunk = sorted(set(chunk) if distinct else chunk)
+            run = tempfile.TemporaryFile('w+', encoding='utf-8')
+            runs.append(run)
+            run.writelines(f'{name}\n' for name in chunk)
+        merged = heapq.merge(*(_read_run(run) for run in runs))
+        yield from _unique(merged) if distinct else merged
+    finally:
+        for run in runs:
+            run.close()
+
+
+def file_column_names():
+    """Every name held by a FileField, one per reference, unsorted."""
+    for _, model, column in file_columns():
+        yield from (
+            model._default_manager.exclude(**{column: ''}).exclude(**{f'{column}__isnull': True})
+            .values_list(column, flat=True).iterator(chunk_size=5000)
+        )
+
+
+def _referenced_stream():
+    yield from file_column_names()
+    blobs = apps.get_model('documents', 'StoredBlob').objects
+    yield from blobs.values_list('name', flat=True).iterator(chunk_size=5000)
+
+
+def referenced_names(run_size=RUN_SIZE):
+    """Every stored name referenced by a row, sorted and distinct."""
+    return external_sort(_referenced_stream(), run_size)
+
+
+def _prefetched(pages):
+    """Iterate the items of ``pages`` while a thread fetches up to LIST_PAGES ahead."""
+    pending = queue.Queue(maxsize=LIST_PAGES)
+
+    def produce():
+        try:
+            for page in pages:
+                pending.put(page)
+        except Exception as e:
+            pending.put(e)
+        pending.put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (page := pending.get()) is not _DONE:
+        if isinstance(page, Exception):
+            raise page
+        yield from page
+
+
+def _s3_pages(client, bucket, prefix, root, delimiter=None):
+    options = {'Bucket': bucket, 'Prefix': prefix}
+    if delimiter:
+        options['Delimiter'] = delimiter
+    for page in client.get_paginator('list_objects_v2').paginate(**options):
+        yield [
+            (item['Key'][len(root):], item['LastModified'], item['Size'])
+            for item in page.get('Contents', [])
+        ]
+
+
+def _list_s3(storage):
+    client = storage.connection.meta.client
+    bucket = storage.bucket_name
+    root = storage._normalize_name('')
+    prefixes = []
+    streams = []
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=root, Delimiter='/'):
+        prefixes.extend(common['Prefix'] for common in page.get('CommonPrefixes', []))
+        # Objects directly under the root
+        streams.append([
+            (item['Key'][len(root):], item['LastModified'], item['Size'])
+            for item in page.get('Contents', [])
+        ])
+    streams.extend(_prefetched(_s3_pages(client, bucket, prefix, root)) for prefix in prefixes)
+    # S3 lists in UTF-8 byte order, which is code point order like Python's
+    return heapq.merge(*streams, key=itemgetter(0))
+
+
+def _walk_sorted(directory, relative):
+    entries = []
+    with os.scandir(directory) as scan:
+        for entry in scan:
+            if entry.is_dir(follow_symlinks=False):
+                # A folder's files all sort as "<folder>/..."
+                entries.append((f'{relative}{entry.name}/', entry))
+            elif entry.is_file(follow_symlinks=False):
+                entries.append((f'{relative}{entry.name}', entry))
+    for name, entry in sorted(entries, key=itemgetter(0)):
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_sorted(entry.path, name)
+        else:
+            stat = entry.stat()
+            yield name, datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc), stat.st_size
+
+
+def stored_objects(storage):
+    """(name, last modified, size) of every object in storage, in name order."""
+    if hasattr(storage, 'bucket_name'):
+        return _list_s3(storage)
+    if not os.path.isdir(storage.location):
+        return iter(())
+    return _walk_sorted(storage.location, '')
+
+
+def find_orphans(storage, grace, run_size=RUN_SIZE):
+    """Yield (name, size) of stored objects no row references, older than ``grace``."""
+    cutoff = timezone.now() - grace
+    referenced = referenced_names(run_size)
+    current = next(referenced, None)
+    for name, modified, size in stored_objects(storage):
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if name == current or name.startswith(QUARANTINE_PREFIX) or modified >= cutoff:
+            continue
+        yield name, size
+
+
+def _remove_s3(storage, names, quarantine):
+    client = storage.connection.meta.client
+    bucket = storage.bucket_name
+    keys = [storage._normalize_name(name) for name in names]
+    if quarantine:
+        for name, key in zip(names, keys):
+            client.copy_object(
+                Bucket=bucket, Key=storage._normalize_name(QUARANTINE_PREFIX + name),
+                CopySource={'Bucket': bucket, 'Key': key},
+            )
+    client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+
+
+def _remove_local(storage, names, quarantine):
+    for name in names:
+        try:
+            if quarantine:
+                os.renames(storage.path(name), storage.path(QUARANTINE_PREFIX + name))
+            else:
+                os.remove(storage.path(name))
+        except FileNotFoundError:
+            pass
+
+
+def _remove(storage, names, quarantine):
+    if hasattr(storage, 'bucket_name'):
+        _remove_s3(storage, names, quarantine)
+    else:
+        _remove_local(storage, names, quarantine)
+    apps.get_model('documents', 'FileMetadata').objects.filter(name__in=names).delete()
+    apps.get_model('documents', 'MediaPreview').objects.filter(source__in=names).delete()
+
+
+def collect_orphans(storage, grace, quarantine=False, dry_run=False, run_size=RUN_SIZE):
+    """
+    Delete (or quarantine) orphaned objects older than ``grace``; returns
+    (objects removed, bytes freed).
+    """
+    removed = freed = 0
+    batch = []
+    for name, size in find_orphans(storage, grace, run_size):
+        removed += 1
+        freed += size
+        if dry_run:
+            continue
+        batch.append(name)
+        if len(batch) == DELETE_BATCH:
+            _remove(storage, batch, quarantine)
+            batch = []
+    if batch:
+        _remove(storage, batch, quarantine)
+    return removed, freed
@@ -0,0 +1,85 @@
+"""
+Keyset pagination for the document library.
+
+Pages are cut on the (uploaded_at, id) index instead of OFFSET, so page N
+costs the same as page 1 however many files are stored. The cursor is the
+sort key of the last (or first) row shown; the library total comes from a
+cached COUNT, refreshed every DOCUMENT_COUNT_CACHE_SECONDS.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(document):
+    return f"{document.uploaded_at.isoformat()}_{document.id.hex}"
+
+
+def decode_cursor(value):
+    """(uploaded_at, id) from a cursor, or None for a missing or malformed one."""
+    if not value or '_' not in value:
+        return None
+    timestamp, _, doc_id = value.rpartition('_')
+    try:
+        uploaded_at = parse_datetime(timestamp)
+        doc_id = uuid.UUID(doc_id)
+    except ValueError:
+        return None
+    if uploaded_at is None:
+        return None
+    return uploaded_at, doc_id
+
+
+class KeysetPage:
+    """One page of documents, newest first, with cursors to its neighbours."""
+
+    def __init__(self, queryset, after=None, before=None, page_size=PAGE_SIZE):
+        after, before = decode_cursor(after), decode_cursor(before)
+        if before:
+            uploaded_at, doc_id = before
+            rows = list(
+                queryset.filter(Q(uploaded_at__gt=uploaded_at) | Q(uploaded_at=uploaded_at, id__gt=doc_id))
+                .order_by('uploaded_at', 'id')[:page_size + 1]
+            )
+            self.has_previous = len(rows) > page_size
+            self.object_list = rows[:page_size][::-1]
+            self.has_next = True
+        else:
+            if after:
+                uploaded_at, doc_id = after
+                queryset = queryset.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=doc_id))
+            rows = list(queryset.order_by('-uploaded_at', '-id')[:page_size + 1])
+            self.has_next = len(rows) > page_size
+            self.object_list = rows[:page_size]
+            self.has_previous = after is not None
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.has_previous and self.object_list else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def cached_count(queryset, filters):
+    """COUNT(*) of a filtered library, cached per filter combination."""
+    key = 'documents:count:' + hashlib.sha256(repr(sorted(filters.items())).encode()).hexdigest()
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, settings.DOCUMENT_COUNT_CACHE_SECONDS)
+    return total
@@ -0,0 +1,132 @@
+"""
+Thumbnails and previews of scanned claim documents.
+
+For every image among a claim's files (Bill.*_file, BillItem.supporting_document,
+BillDocument.file) Pillow renders a small thumbnail and a mid-size preview,
+stored next to the original as ``<name>_thumb.jpg`` / ``<name>_preview.jpg``
+and recorded in MediaPreview. Detail pages show the thumbnail inline,
+link it to the preview, and fetch the original only when asked.
+
+Rendering happens off the request, in the background pool of
+documents/processing.py. The ``manage.py generate_previews`` command renders
+anything missed, e.g. claims filed before this existed or while a worker
+restarted.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from hospitals.attachments import UPLOADED_KINDS
+from hospitals.models import BillAttachment
+from .models import MediaPreview
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+SIZES = {'thumbnail': (240, 240), 'preview': (1280, 1280)}
+SUFFIXES = {'thumbnail': '_thumb.jpg', 'preview': '_preview.jpg'}
+JPEG_QUALITY = 80
+
+
+def is_image_name(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _render(name, storage):
+    """Stored thumbnail/preview names and the original's dimensions."""
+    with storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        width, height = image.size
+        # JPEG: let the decoder downscale; a full-resolution decode is never needed
+        image.draft('RGB', SIZES['preview'])
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        stored = {}
+        base = os.path.splitext(name)[0]
+        for kind in ('preview', 'thumbnail'):
+            image.thumbnail(SIZES[kind], Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            stored[kind] = storage.save(base + SUFFIXES[kind], ContentFile(buffer.getvalue()))
+    return stored, width, height
+
+
+def generate_preview(name, storage=None):
+    """Render and record the previews of one stored file; returns its MediaPreview or None."""
+    storage = storage or default_storage
+    if MediaPreview.objects.filter(source=name).exists():
+        return None
+
+    preview = MediaPreview(source=name, status='SKIPPED')
+    if is_image_name(name):
+        try:
+            stored, preview.width, preview.height = _render(name, storage)
+            preview.thumbnail.name = stored['thumbnail']
+            preview.preview.name = stored['preview']
+            preview.status = 'READY'
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            preview.status = 'FAILED'
+            preview.error = str(e)[:255]
+            logger.warning("Preview of %s failed: %s", name, e)
+    try:
+        with transaction.atomic():
+            preview.save()
+    except IntegrityError:
+        # Rendered concurrently by another worker
+        return None
+    return preview
+
+
+def bill_media_names(bill_ids):
+    """Stored names of every file uploaded with the given claims."""
+    return set(
+        BillAttachment.objects.filter(bill_id__in=bill_ids, kind__in=UPLOADED_KINDS)
+        .values_list('name', flat=True)
+    )
+
+
+def generate_bill_previews(bill_id):
+    """Render the missing previews of every file of one claim."""
+    for name in bill_media_names([bill_id]):
+        generate_preview(name)
+
+
+def previews_for(names):
+    """{source name: MediaPreview} of the ready previews among ``names``, in one query."""
+    names = [name for name in names if name]
+    if not names:
+        return {}
+    return {
+        preview.source: preview
+        for preview in MediaPreview.objects.filter(source__in=names, status='READY')
+    }
+
+
+def attach_previews(bill, items=(), documents=()):
+    """
+    Set ``.preview`` on the claim's items and documents and return the
+    previews of its own files as {'id_card': ..., 'cc_card': ..., 'discharge_summary': ...}.
+    """
+    bill_files = {
+        'id_card': bill.id_card_file.name,
+        'cc_card': bill.cc_card_file.name,
+        'discharge_summary': bill.discharge_summary_file.name,
+    }
+    previews = previews_for(
+        list(bill_files.values())
+        + [item.supporting_document.name for item in items]
+        + [document.file.name for document in documents]
+    )
+    for item in items:
+        item.preview = previews.get(item.supporting_document.name)
+    for document in documents:
+        document.preview = previews.get(document.file.name)
+    return {key: previews.get(name) for key, name in bill_files.items()}
@@ -0,0 +1,60 @@
+"""
+Background processing of a submitted claim's files.
+
+Once the claim's transaction commits it is handed to a small per-process
+thread pool (MEDIA_WORKERS), so the submit request returns as soon as the
+uploads are stored. Each job normalizes the claim's images
+(documents/normalize.py), optionally merges photographed pages into one
+PDF, then renders previews of the final files (documents/previews.py) and
+records the metadata of files uploaded straight to storage.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from .metadata import record_bill_metadata
+from .normalize import merge_document_pages, normalize_bill_media
+from .previews import generate_bill_previews
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def process_bill_media(bill_id):
+    """Normalize, merge, preview and describe one claim's files."""
+    try:
+        if settings.MEDIA_NORMALIZE:
+            normalize_bill_media([bill_id])
+        if settings.MEDIA_MERGE_PAGES:
+            merge_document_pages(bill_id)
+        generate_bill_previews(bill_id)
+        record_bill_metadata(bill_id, default_storage)
+    except Exception:
+        logger.exception("Processing files of claim %s failed", bill_id)
+    finally:
+        close_old_connections()
+
+
+def _media_executor():
+    global _executor
+    # Threaded workers: only the first request to get here builds the pool
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.MEDIA_WORKERS, thread_name_prefix='media')
+        return _executor
+
+
+def queue_bill_media(bill):
+    """Process the claim's files in the background once the current transaction commits."""
+    if not settings.MEDIA_WORKERS:
+        return
+    executor = _media_executor()
+    bill_id = bill.id
+    transaction.on_commit(lambda: executor.submit(process_bill_media, bill_id))
@@ -0,0 +1,426 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+
+from botocore.exceptions import ClientError
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import re_path
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import UserProfile
+from hospitals.attachments import sync_attachments
+from hospitals.models import Bill, Hospital
+from project.storage import PresignedUrlCache, upload_multipart
+from project.urls import urlpatterns as project_urlpatterns
+from workflow.models import SanctionRequest
+from . import processing
+from .blobs import collect_garbage
+from .bundles import stream_zip
+from .direct import GrantError, issue_grant, receive_upload, verify_key
+from .metadata import describe
+from .models import Document, FileMetadata, MediaPreview, StoredBlob
+from .normalize import normalize_bill_media
+from .orphans import collect_orphans, external_sort
+from .pagination import KeysetPage, decode_cursor
+from .previews import generate_preview
+from .tiering import hot_names
+from .transfer import copy_file
+from .uploads import UploadError, append_chunk, start_upload
+from .views import serve_media
+
+
+# project/urls.py only routes media through serve_media when MEDIA_OFFLOAD is set at import
+urlpatterns = project_urlpatterns + [
+    re_path(r'^media/(?P<path>.+)$', serve_media, name='serve_media'),
+]
+
+
+def hospital_user(code):
+    hospital = Hospital.objects.create(name=f'Hospital {code}', code=code)
+    user = User.objects.create_user(f'user-{code}', password='pw')
+    UserProfile.objects.create(user=user, role='HOSPITAL', hospital=hospital)
+    return hospital, user
+
+
+def image_bytes(size, image_format='PNG'):
+    """Noise image: barely compressible, so a re-encode always shrinks it."""
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class MediaTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+@override_settings(MEDIA_OFFLOAD='nginx', ROOT_URLCONF=__name__)
+class ServeMediaTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hospital, self.user = hospital_user('H1')
+        self.other_hospital, self.other_user = hospital_user('H2')
+        source = default_storage.save('bills/id_cards/scan.jpg', ContentFile(b'original'))
+        Bill.objects.create(hospital=self.hospital, status='SUBMITTED', id_card_file=source)
+        self.thumbnail = default_storage.save('bills/id_cards/scan_thumb.jpg', ContentFile(b'thumb'))
+        MediaPreview.objects.create(source=source, status='READY', thumbnail=self.thumbnail,
+                                    preview=default_storage.save('bills/id_cards/scan_preview.jpg',
+                                                                 ContentFile(b'preview')))
+
+    def test_hospital_fetches_thumbnail_of_own_claim(self):
+        self.client.force_login(self.user)
+        response = self.client.get(f'/media/{self.thumbnail}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.thumbnail}')
+
+    def test_other_hospital_is_denied_thumbnail(self):
+        self.client.force_login(self.other_user)
+        response = self.client.get(f'/media/{self.thumbnail}')
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_user_without_profile_is_denied(self):
+        self.client.force_login(User.objects.create_user('no-profile', password='pw'))
+        response = self.client.get(f'/media/{self.thumbnail}')
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_officer_fetches_any_claim_file(self):
+        officer = User.objects.create_user('jpo', password='pw')
+        UserProfile.objects.create(user=officer, role='JPO')
+        self.client.force_login(officer)
+        response = self.client.get(f'/media/{self.thumbnail}')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.thumbnail}')
+
+
+class DirectUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hospital, self.user = hospital_user('H1')
+
+    def upload(self, form_field, data=b'%PDF-1.4 scan'):
+        grant = issue_grant(self.user, form_field, 'scan.pdf', 'application/pdf', len(data))
+        token = grant['url'].rstrip('/').rsplit('/', 1)[-1]
+        receive_upload(token, SimpleUploadedFile('scan.pdf', data))
+        return grant['key']
+
+    def test_key_verifies_for_its_field(self):
+        upload = verify_key(self.user, self.upload('id_card_file'), 'id_card_file')
+        self.assertTrue(upload.storage_name.startswith('bills/id_cards/'))
+        self.assertEqual(upload.size, len(b'%PDF-1.4 scan'))
+
+    def test_key_refused_for_another_field(self):
+        key = self.upload('id_card_file')
+        with self.assertRaises(GrantError):
+            verify_key(self.user, key, 'form-0-supporting_document')
+
+    def test_key_refused_for_another_user(self):
+        key = self.upload('id_card_file')
+        _, other_user = hospital_user('H2')
+        with self.assertRaises(GrantError):
+            verify_key(other_user, key, 'id_card_file')
+
+    def test_key_is_single_use(self):
+        key = self.upload('id_card_file')
+        upload = verify_key(self.user, key, 'id_card_file')
+        bill = Bill.objects.create(hospital=self.hospital, status='SUBMITTED', id_card_file=upload.storage_name)
+        sync_attachments([bill.id])
+        with self.assertRaises(GrantError):
+            verify_key(self.user, key, 'id_card_file')
+
+
+class BlobGarbageTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hospital, _ = hospital_user('H1')
+        self.name = default_storage.save('bills/id_cards/card.pdf', ContentFile(b'%PDF card'))
+        # Same content again: the stored blob is reused
+        self.assertEqual(default_storage.save('bills/cc_cards/card.pdf', ContentFile(b'%PDF card')), self.name)
+        self.bills = [
+            Bill.objects.create(hospital=self.hospital, status='SUBMITTED', ip_number=f'IP{n}', id_card_file=self.name)
+            for n in range(2)
+        ]
+        for n in range(3):
+            # Other referenced names, so the sorted runs interleave
+            Bill.objects.create(hospital=self.hospital, status='SUBMITTED', ip_number=f'IP-other{n}',
+                                cc_card_file=f'bills/cc_cards/{n}.pdf')
+
+    def test_external_sort_keeps_duplicates_when_asked(self):
+        names = ['b', 'a', 'c', 'a', 'b']
+        self.assertEqual(list(external_sort(iter(names), run_size=2)), ['a', 'b', 'c'])
+        self.assertEqual(list(external_sort(iter(names), run_size=2, distinct=False)), sorted(names))
+
+    def test_recounts_drifted_refcount(self):
+        StoredBlob.objects.filter(name=self.name).update(refcount=7)
+        checked, deleted, _ = collect_garbage(default_storage, run_size=2)
+        self.assertEqual((checked, deleted), (1, 0))
+        self.assertEqual(StoredBlob.objects.get(name=self.name).refcount, 2)
+
+    def test_deletes_unreferenced_blob_after_grace(self):
+        Bill.objects.filter(id__in=[bill.id for bill in self.bills]).update(id_card_file='')
+        checked, deleted, _ = collect_garbage(default_storage, run_size=2)
+        self.assertEqual(deleted, 0)
+        StoredBlob.objects.update(last_referenced_at=timezone.now() - timedelta(days=2))
+        checked, deleted, freed = collect_garbage(default_storage, run_size=2)
+        self.assertEqual((deleted, freed), (1, len(b'%PDF card')))
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, self.name)))
+
+
+@override_settings(MEDIA_WORKERS=2)
+class MediaExecutorTests(SimpleTestCase):
+    def test_concurrent_first_use_builds_one_pool(self):
+        processing._executor = None
+        start = threading.Barrier(8)
+        pools = []
+
+        def first_use():
+            start.wait()
+            pools.append(processing._media_executor())
+
+        threads = [threading.Thread(target=first_use) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
+        pools[0].shutdown()
+        processing._executor = None
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        start = timezone.now()
+        for n in range(5):
+            document = Document.objects.create(file=f'documents/{n}.pdf', original_filename=f'{n}.pdf')
+            # Two documents share a timestamp: the id breaks the tie
+            Document.objects.filter(id=document.id).update(uploaded_at=start + timedelta(seconds=min(n, 3)))
+        self.newest_first = list(Document.objects.order_by('-uploaded_at', '-id'))
+
+    def test_walks_forward_and_back(self):
+        first = KeysetPage(Document.objects.all(), page_size=2)
+        self.assertEqual(list(first), self.newest_first[:2])
+        self.assertFalse(first.has_previous)
+        second = KeysetPage(Document.objects.all(), after=first.next_cursor, page_size=2)
+        self.assertEqual(list(second), self.newest_first[2:4])
+        last = KeysetPage(Document.objects.all(), after=second.next_cursor, page_size=2)
+        self.assertEqual(list(last), self.newest_first[4:])
+        self.assertIsNone(last.next_cursor)
+        back = KeysetPage(Document.objects.all(), before=last.previous_cursor, page_size=2)
+        self.assertEqual(list(back), self.newest_first[2:4])
+        self.assertTrue(back.has_previous)
+
+    def test_malformed_cursor_is_the_first_page(self):
+        self.assertIsNone(decode_cursor('garbage_value'))
+        self.assertIsNone(decode_cursor('2026-01-01T00:00:00_'))
+        self.assertEqual(list(KeysetPage(Document.objects.all(), after='nope', page_size=2)), self.newest_first[:2])
+
+
+class PresignedUrlCacheTests(SimpleTestCase):
+    def test_hits_expiry_and_eviction(self):
+        cache = PresignedUrlCache(max_entries=2, min_remaining=60)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 'url-a', 3600)
+        self.assertEqual(cache.get('a'), 'url-a')
+        cache.put('b', 'url-b', 30)
+        # Less than min_remaining left: never handed out
+        self.assertIsNone(cache.get('b'))
+        cache.put('c', 'url-c', 3600)
+        cache.put('d', 'url-d', 3600)
+        self.assertIsNone(cache.get('a'))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['expired'], stats['evictions'], stats['entries']), (1, 1, 1, 2))
+
+
+class PreviewTests(MediaTestCase):
+    def test_image_gets_thumbnail_and_preview(self):
+        name = default_storage.save('bills/id_cards/photo.png', ContentFile(image_bytes((600, 300))))
+        preview = generate_preview(name)
+        self.assertEqual((preview.status, preview.width, preview.height), ('READY', 600, 300))
+        with default_storage.open(preview.thumbnail.name) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (240, 120))
+        # Already rendered
+        self.assertIsNone(generate_preview(name))
+
+    def test_pdf_is_skipped(self):
+        name = default_storage.save('bills/id_cards/scan.pdf', ContentFile(b'%PDF-1.4 scan'))
+        self.assertEqual(generate_preview(name).status, 'SKIPPED')
+
+    def test_unreadable_image_is_recorded_as_failed(self):
+        name = default_storage.save('bills/id_cards/broken.jpg', ContentFile(b'not a jpeg'))
+        self.assertEqual(generate_preview(name).status, 'FAILED')
+
+
+@override_settings(MEDIA_MAX_DIMENSION=400, MEDIA_IMAGE_FORMAT='JPEG', MEDIA_IMAGE_QUALITY=80)
+class NormalizeTests(MediaTestCase):
+    def test_large_image_is_replaced_and_pdf_left_alone(self):
+        hospital, _ = hospital_user('H1')
+        photo = default_storage.save('bills/id_cards/photo.png', ContentFile(image_bytes((800, 600))))
+        scan = default_storage.save('bills/cc_cards/scan.pdf', ContentFile(b'%PDF-1.4 scan'))
+        bill = Bill.objects.create(hospital=hospital, status='SUBMITTED', id_card_file=photo, cc_card_file=scan)
+
+        replaced, before, after = normalize_bill_media([bill.id])
+        self.assertEqual(replaced, 1)
+        self.assertLess(after, before)
+        bill.refresh_from_db()
+        self.assertEqual(bill.id_card_file.name, 'bills/id_cards/photo.jpg')
+        self.assertEqual(bill.cc_card_file.name, scan)
+        with default_storage.open(bill.id_card_file.name) as normalized:
+            self.assertEqual(Image.open(normalized).size, (400, 300))
+        # Nothing left to shrink
+        self.assertEqual(normalize_bill_media([bill.id])[0], 0)
+
+
+class RecordingS3Client:
+    """Multipart calls of boto3's S3 client, kept in memory; part ``fail_part`` is refused."""
+
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.parts = {}
+        self.completed = self.aborted = None
+
+    def create_multipart_upload(self, Bucket, Key, **params):
+        return {'UploadId': 'upload-1'}
+
+    def upload_part(self, PartNumber, Body, **upload):
+        if PartNumber == self.fail_part:
+            raise ClientError({'Error': {'Code': 'InternalError'}}, 'UploadPart')
+        self.parts[PartNumber] = Body
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, MultipartUpload, **upload):
+        self.completed = MultipartUpload['Parts']
+
+    def abort_multipart_upload(self, **upload):
+        self.aborted = upload['UploadId']
+
+
+@override_settings(S3_UPLOAD_THREADS=4, S3_UPLOAD_PART_ATTEMPTS=1)
+class MultipartUploadTests(SimpleTestCase):
+    def test_parts_are_completed_in_order(self):
+        client = RecordingS3Client()
+        upload_multipart(client, 'bucket', 'key', io.BytesIO(b'abcdefghij'), {}, part_size=3, concurrency=2)
+        self.assertEqual([part['PartNumber'] for part in client.completed], [1, 2, 3, 4])
+        self.assertEqual(b''.join(client.parts[n] for n in range(1, 5)), b'abcdefghij')
+        self.assertIsNone(client.aborted)
+
+    def test_failed_part_aborts_the_upload(self):
+        client = RecordingS3Client(fail_part=2)
+        with self.assertRaises(ClientError):
+            upload_multipart(client, 'bucket', 'key', io.BytesIO(b'abcdefghij'), {}, part_size=3, concurrency=2)
+        self.assertEqual(client.aborted, 'upload-1')
+        self.assertIsNone(client.completed)
+
+
+class BundleTests(MediaTestCase):
+    def test_streams_files_and_lists_missing_ones(self):
+        name = default_storage.save('bills/id_cards/card.pdf', ContentFile(b'%PDF card' * 1000))
+        archive = b''.join(stream_zip(default_storage, [
+            ('id_card/card.pdf', name),
+            ('cc_card/gone.pdf', 'bills/cc_cards/gone.pdf'),
+        ]))
+        with zipfile.ZipFile(io.BytesIO(archive)) as bundle:
+            self.assertEqual(bundle.namelist(), ['id_card/card.pdf', 'missing_files.txt'])
+            self.assertEqual(bundle.read('id_card/card.pdf'), b'%PDF card' * 1000)
+            self.assertIn(b'bills/cc_cards/gone.pdf', bundle.read('missing_files.txt'))
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        parts = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, parts, ignore_errors=True)
+        chunked = override_settings(CHUNKED_UPLOAD_DIR=parts)
+        chunked.enable()
+        self.addCleanup(chunked.disable)
+        self.user = User.objects.create_user('uploader', password='pw')
+
+    def test_resumes_at_the_acknowledged_offset(self):
+        upload = start_upload(self.user, 'scan.pdf', 10)
+        upload = append_chunk(upload.id, self.user, 0, io.BytesIO(b'01234'), 5)
+        with self.assertRaises(UploadError) as refused:
+            append_chunk(upload.id, self.user, 0, io.BytesIO(b'01234'), 5)
+        self.assertEqual(refused.exception.status, 409)
+        upload = append_chunk(upload.id, self.user, 5, io.BytesIO(b'56789'), 5)
+        self.assertTrue(upload.complete)
+
+    def test_chunk_past_declared_size_is_refused(self):
+        upload = start_upload(self.user, 'scan.pdf', 4)
+        with self.assertRaises(UploadError):
+            append_chunk(upload.id, self.user, 0, io.BytesIO(b'012345'), 6)
+
+    def test_upload_of_another_user_is_unknown(self):
+        upload = start_upload(self.user, 'scan.pdf', 4)
+        other = User.objects.create_user('other', password='pw')
+        with self.assertRaises(UploadError) as refused:
+            append_chunk(upload.id, other, 0, io.BytesIO(b'0123'), 4)
+        self.assertEqual(refused.exception.status, 404)
+
+
+class MetadataTests(SimpleTestCase):
+    def test_pdf_pages_and_image_dimensions(self):
+        pdf = ContentFile(b'%PDF-1.4 /Type /Pages /Type /Page x /Type/Page y')
+        self.assertEqual(describe(pdf, 'scan.pdf')['pages'], 2)
+        info = describe(ContentFile(image_bytes((30, 20))), 'photo.png')
+        self.assertEqual((info['width'], info['height'], info['content_type']), (30, 20, 'image/png'))
+
+
+class TransferTests(MediaTestCase):
+    def test_copies_once_and_verifies(self):
+        target_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, target_root, ignore_errors=True)
+        source, target = FileSystemStorage(location=self.media_root), FileSystemStorage(location=target_root)
+        name = source.save('bills/id_cards/card.pdf', ContentFile(b'%PDF card'))
+        self.assertEqual(copy_file(source, target, name), (len(b'%PDF card'), False))
+        self.assertEqual(copy_file(source, target, name), (0, True))
+        with target.open(name) as copied:
+            self.assertEqual(copied.read(), b'%PDF card')
+
+
+class OrphanTests(MediaTestCase):
+    def test_removes_only_old_unreferenced_files(self):
+        hospital, _ = hospital_user('H1')
+        kept = default_storage.save('bills/id_cards/kept.pdf', ContentFile(b'%PDF kept'))
+        Bill.objects.create(hospital=hospital, status='SUBMITTED', id_card_file=kept)
+        orphan = default_storage.save('bills/id_cards/orphan.pdf', ContentFile(b'%PDF orphan'))
+        StoredBlob.objects.filter(name=orphan).delete()
+        fresh = default_storage.save('bills/id_cards/fresh.pdf', ContentFile(b'%PDF fresh'))
+        StoredBlob.objects.filter(name=fresh).delete()
+        old = time.time() - 3 * 86400
+        for name in (kept, orphan):
+            os.utime(default_storage.path(name), (old, old))
+
+        removed, freed = collect_orphans(default_storage, timedelta(days=1), run_size=2)
+        self.assertEqual((removed, freed), (1, len(b'%PDF orphan')))
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(kept))
+        self.assertTrue(default_storage.exists(fresh))
+        self.assertFalse(FileMetadata.objects.filter(name=orphan).exists())
+
+
+class TieringTests(TestCase):
+    def test_file_shared_with_an_open_claim_stays_hot(self):
+        hospital, _ = hospital_user('H1')
+        closed = Bill.objects.create(hospital=hospital, status='APPROVED', ip_number='IP1',
+                                     id_card_file='bills/id_cards/shared.pdf', cc_card_file='bills/cc_cards/own.pdf')
+        Bill.objects.create(hospital=hospital, status='SUBMITTED', ip_number='IP2',
+                            id_card_file='bills/id_cards/shared.pdf')
+        request = SanctionRequest.objects.create(bill=closed, hospital_name=hospital.name, patient_name='Ravi',
+                                                 claimed_amount=100, status='APPROVED')
+        SanctionRequest.objects.filter(id=request.id).update(updated_at=timezone.now() - timedelta(days=400))
+        cutoff = timezone.now() - timedelta(days=180)
+        self.assertEqual(hot_names(['bills/id_cards/shared.pdf', 'bills/cc_cards/own.pdf'], cutoff),
+                         {'bills/id_cards/shared.pdf'})
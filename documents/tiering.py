@@ -0,0 +1,93 @@
+"""
+Cold storage tier for the files of long-closed claims.
+
+Once a claim has been approved or rejected for MEDIA_COLD_AFTER_DAYS its
+files are hardly ever opened again. ``manage.py tier_media`` moves them to
+MEDIA_COLD_STORAGE_CLASS by copying each S3 object onto itself with the new
+storage class: the key does not change, so no row is updated and every
+presigned URL keeps working. Only classes that serve reads immediately are
+accepted - an archive class needing a restore would break the links.
+
+A file shared through deduplication with a claim that is still open, or
+closed more recently, stays hot until that claim qualifies too. Thumbnails
+and previews are left in the hot tier for the claim pages. Requests are
+marked with media_archived_at once all their files are through.
+"""
+import logging
+from datetime import timedelta
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.utils import timezone
+from storages.utils import clean_name
+
+from workflow.models import SanctionRequest
+from .normalize import NORMALIZED_FIELDS
+from .previews import bill_media_names
+
+
+logger = logging.getLogger(__name__)
+
+# Storage classes whose objects can be read without a restore
+COLD_STORAGE_CLASSES = ('STANDARD_IA', 'ONEZONE_IA', 'INTELLIGENT_TIERING', 'GLACIER_IR')
+CLOSED_STATUSES = ('APPROVED', 'REJECTED')
+
+
+def cold_requests(cutoff=None):
+    """Requests closed before ``cutoff`` (default: MEDIA_COLD_AFTER_DAYS ago)."""
+    if cutoff is None:
+        cutoff = timezone.now() - timedelta(days=settings.MEDIA_COLD_AFTER_DAYS)
+    return SanctionRequest.objects.filter(status__in=CLOSED_STATUSES, updated_at__lt=cutoff)
+
+
+def hot_names(names, cutoff):
+    """Those of ``names`` also attached to a claim that is not cold yet."""
+    cold_bills = cold_requests(cutoff).values('bill_id')
+    shared = set()
+    for model, field, bill_column in NORMALIZED_FIELDS:
+        shared.update(
+            model.objects.filter(**{f'{field}__in': names})
+            .exclude(**{f'{bill_column}__in': cold_bills})
+            .values_list(field, flat=True)
+        )
+    return shared
+
+
+def move_to_cold(storage, name, storage_class):
+    """Change the storage class of one object in place; returns the bytes moved (0 if already cold)."""
+    client = storage.connection.meta.client
+    key = storage._normalize_name(clean_name(name))
+    head = client.head_object(Bucket=storage.bucket_name, Key=key)
+    if head.get('StorageClass', 'STANDARD') == storage_class:
+        return 0
+    # Managed copy: multipart above 5 GB, metadata and content type kept
+    client.copy(
+        {'Bucket': storage.bucket_name, 'Key': key}, storage.bucket_name, key,
+        ExtraArgs={'StorageClass': storage_class, 'MetadataDirective': 'COPY'},
+    )
+    return head['ContentLength']
+
+
+def archive_request(storage, request_id, bill_id, cutoff, storage_class):
+    """
+    Move one closed claim's files to the cold tier; returns (files moved,
+    bytes moved, files left hot). The request is marked only if nothing failed.
+    """
+    names = bill_media_names([bill_id])
+    kept = hot_names(names, cutoff) if names else set()
+    moved = size = 0
+    failed = False
+    for name in sorted(names - kept):
+        try:
+            moved_bytes = move_to_cold(storage, name, storage_class)
+        except (BotoCoreError, ClientError) as e:
+            logger.warning("Moving %s to %s failed: %s", name, storage_class, e)
+            failed = True
+            continue
+        if moved_bytes:
+            moved += 1
+            size += moved_bytes
+    if not failed:
+        # update(): a save() would bump updated_at, the closing time
+        SanctionRequest.objects.filter(id=request_id).update(media_archived_at=timezone.now())
+    return moved, size, len(kept)
@@ -0,0 +1,102 @@
+"""
+Copying media between local storage and S3.
+
+``manage.py migrate_storage`` moves a deployment from one backend to the
+other: every name held by a FileField is copied under the same name, so no
+row has to change. Each file is read from the source once, hashed on the
+way into a spooled temporary file (memory up to SPOOL_SIZE, disk beyond),
+written to the target, then read back and compared by SHA-256. A file
+already in the target with the same checksum is left as it is, so an
+interrupted run can be repeated safely.
+
+The backends are built here rather than taken from STORAGES, since only one
+of them is configured at a time; deduplication is bypassed, names being
+copied as they are.
+"""
+import hashlib
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+from .bundles import read_chunks
+
+
+SPOOL_SIZE = 8 * 1024 * 1024
+BACKENDS = ('local', 's3')
+
+
+class TransferError(Exception):
+    """A file whose copy could not be written or verified."""
+
+
+def local_storage():
+    return FileSystemStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+
+
+def s3_storage():
+    from project.storage import ParallelUploadS3Storage
+
+    if not (settings.AWS_ACCESS_KEY_ID and settings.AWS_STORAGE_BUCKET_NAME):
+        raise TransferError('AWS_ACCESS_KEY_ID and AWS_STORAGE_BUCKET_NAME must be set.')
+    return ParallelUploadS3Storage(
+        access_key=settings.AWS_ACCESS_KEY_ID,
+        secret_key=settings.AWS_SECRET_ACCESS_KEY,
+        bucket_name=settings.AWS_STORAGE_BUCKET_NAME,
+        region_name=settings.AWS_S3_REGION_NAME,
+    )
+
+
+def backend(label):
+    return s3_storage() if label == 's3' else local_storage()
+
+
+def file_columns():
+    """[(label, model, FileField attname)] of every FileField of every model."""
+    columns = []
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                columns.append((f'{model._meta.label}.{field.attname}', model, field.attname))
+    return columns
+
+
+def stored_sha256(storage, name):
+    hasher = hashlib.sha256()
+    for chunk in read_chunks(storage, name):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def copy_file(source, target, name):
+    """
+    Copy one file under the same name and verify it; returns (bytes copied,
+    whether it was already present). Raises OSError when the source is
+    missing and TransferError when the copy does not match.
+    """
+    hasher = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+        for chunk in read_chunks(source, name):
+            hasher.update(chunk)
+            spool.write(chunk)
+        digest = hasher.hexdigest()
+
+        if target.exists(name):
+            if stored_sha256(target, name) == digest:
+                return 0, True
+            # Partial or stale copy from an earlier run
+            target.delete(name)
+
+        spool.seek(0)
+        content = File(spool, name=name)
+        size = content.size
+        stored_name = target.save(name, content)
+    if stored_name != name:
+        target.delete(stored_name)
+        raise TransferError(f'{name} was stored as {stored_name}.')
+    if stored_sha256(target, name) != digest:
+        raise TransferError(f'Checksum of the copy of {name} does not match.')
+    return size, False
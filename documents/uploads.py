@@ -0,0 +1,155 @@
+"""
+Resumable chunked uploads.
+
+A large attachment no longer rides inside the claim form post. The browser
+first sends it in pieces, and the claim form then carries only its upload
+id; a connection dropping near the end of a 20 MB scan costs one chunk,
+not the whole form, and the gunicorn worker is never held for the full
+transfer.
+
+Protocol (all JSON, see documents/views.py):
+
+* POST uploads/                  filename, size, content_type -> upload_id, offset
+* GET  uploads/<id>/             -> offset, size, complete   (where to resume)
+* POST uploads/<id>/             raw bytes, ``Upload-Offset: <n>`` header
+                                 -> new offset; 409 with the current offset
+                                 when n does not match it
+
+Chunks are appended to CHUNKED_UPLOAD_DIR/<id>.part; the row's offset only
+moves forward under a row lock, so a retried or duplicated chunk is never
+written twice. Forms post ``<file field>_upload_id`` in place of the file:
+attach_uploads() puts the assembled file into request.FILES, and the normal
+FileField save stores it in the storage backend. Parts live until
+CHUNKED_UPLOAD_EXPIRY_HOURS so a rejected form can be posted again; ``manage.py
+purge_uploads`` removes them after that.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChunkedUpload
+
+
+UPLOAD_ID_SUFFIX = '_upload_id'
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A chunk that cannot be accepted; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, upload=None):
+        super().__init__(message)
+        self.status = status
+        self.upload = upload
+
+
+def part_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{upload.id.hex}.part')
+
+
+def start_upload(user, filename, size, content_type=''):
+    """Register a new upload of ``size`` bytes and create its empty part file."""
+    if size <= 0 or size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise UploadError(f'File size must be between 1 byte and {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes.')
+    upload = ChunkedUpload.objects.create(
+        user=user,
+        filename=os.path.basename(filename)[:255] or 'upload',
+        content_type=content_type[:100],
+        size=size,
+    )
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def append_chunk(upload_id, user, offset, stream, length):
+    """
+    Write ``length`` bytes read from ``stream`` at ``offset``; returns the
+    updated upload. Whatever arrived before a dropped connection is kept.
+    """
+    if length > settings.CHUNKED_UPLOAD_CHUNK_SIZE:
+        raise UploadError(f'Chunks are limited to {settings.CHUNKED_UPLOAD_CHUNK_SIZE} bytes.', status=413)
+
+    with transaction.atomic():
+        upload = ChunkedUpload.objects.select_for_update().filter(id=upload_id, user=user).first()
+        if upload is None:
+            raise UploadError('Unknown upload.', status=404)
+        if offset != upload.offset:
+            raise UploadError('Offset does not match the bytes received.', status=409, upload=upload)
+        if offset + length > upload.size:
+            raise UploadError('Chunk runs past the declared file size.', upload=upload)
+
+        received = 0
+        with open(part_path(upload), 'r+b') as part:
+            part.seek(offset)
+            while received < length:
+                try:
+                    data = stream.read(min(READ_SIZE, length - received))
+                except OSError:
+                    # Client gone mid-chunk (UnreadablePostError, gunicorn's NoMoreData)
+                    break
+                if not data:
+                    break
+                part.write(data)
+                received += len(data)
+            # Drop bytes of an earlier attempt that were never acknowledged
+            part.truncate()
+        upload.offset += received
+        upload.save(update_fields=['offset', 'updated_at'])
+    return upload
+
+
+def attach_uploads(request):
+    """Add the completed uploads named by ``<field>_upload_id`` posts to request.FILES."""
+    references = {
+        key[:-len(UPLOAD_ID_SUFFIX)]: value
+        for key, value in request.POST.items()
+        if key.endswith(UPLOAD_ID_SUFFIX) and value
+    }
+    if not references:
+        return
+    uploads = {}
+    for upload in ChunkedUpload.objects.filter(id__in=_valid_ids(references.values()), user=request.user):
+        uploads[str(upload.id)] = upload
+    for field, upload_id in references.items():
+        upload = uploads.get(_normalized_id(upload_id))
+        if upload is None or not upload.complete or field in request.FILES:
+            continue
+        # Closed with the request's other files when the response is done
+        request.FILES[field] = UploadedFile(
+            open(part_path(upload), 'rb'),
+            name=upload.filename,
+            content_type=upload.content_type or 'application/octet-stream',
+            size=upload.size,
+        )
+
+
+def _normalized_id(value):
+    try:
+        return str(ChunkedUpload._meta.pk.to_python(value))
+    except ValidationError:
+        return None
+
+
+def _valid_ids(values):
+    return [value for value in map(_normalized_id, values) if value]
+
+
+def purge_expired():
+    """Delete uploads older than CHUNKED_UPLOAD_EXPIRY_HOURS with their parts; returns the number removed."""
+    cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+    deleted = 0
+    expired = ChunkedUpload.objects.filter(created_at__lt=cutoff)
+    for upload in expired.iterator():
+        try:
+            os.remove(part_path(upload))
+        except FileNotFoundError:
+            pass
+        deleted += 1
+    expired.delete()
+    return deleted
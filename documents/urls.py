@@ -5,6 +5,11 @@ app_name = 'documents'
 
 urlpatterns = [
     path('', views.document_list, name='document_list'),
+    path('storage/url-cache/', views.url_cache_stats, name='url_cache_stats'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('direct-uploads/', views.direct_upload_grant, name='direct_upload_grant'),
+    path('direct-uploads/<str:token>/', views.direct_upload_receive, name='direct_upload_receive'),
     path('<uuid:doc_id>/', views.document_detail, name='document_detail'),
     path('<uuid:doc_id>/view/', views.document_view, name='document_view'),
 ]
@@ -1,21 +1,81 @@
+import posixpath
+from datetime import datetime, time, timedelta
+
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
 from django.contrib import messages
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .direct import GrantError, issue_grant, receive_upload
+from .models import ChunkedUpload, Document
+from .offload import hospital_owns_media, offload_response
+from .pagination import KeysetPage, cached_count
+from .uploads import UploadError, append_chunk, start_upload
+
 
-from .models import Document
+CONTENT_TYPE_FILTERS = [
+    ('application/pdf', 'PDF'),
+    ('image/', 'Images'),
+    ('application/vnd', 'Office documents'),
+    ('text/', 'Text'),
+]
 
 
 @login_required
 def document_list(request):
-    """List all documents from S3."""
-    documents = Document.objects.all().order_by('-uploaded_at')
+    """List documents from S3, one keyset page at a time."""
+    documents = Document.objects.select_related('uploaded_by')
+    
+    # Filters: content type (a full type or a family such as "image/") and upload date
+    filters = {}
+    content_type = request.GET.get('content_type', '').strip()
+    if content_type:
+        filters['content_type__startswith'] = content_type
+    date_from = _parse_day(request.GET.get('date_from'))
+    if date_from:
+        filters['uploaded_at__gte'] = _day_start(date_from)
+    date_to = _parse_day(request.GET.get('date_to'))
+    if date_to:
+        filters['uploaded_at__lt'] = _day_start(date_to + timedelta(days=1))
+    documents = documents.filter(**filters)
+    
+    page = KeysetPage(documents, after=request.GET.get('after'), before=request.GET.get('before'))
     
     return render(request, 'documents/document_list.html', {
-        'documents': documents,
+        'documents': page,
+        'page': page,
+        'total_count': cached_count(documents, filters),
+        'content_type': content_type,
+        'content_types': CONTENT_TYPE_FILTERS,
+        'date_from': date_from,
+        'date_to': date_to,
+        # Filter parameters carried over to the next/previous page links
+        'filter_query': urlencode({
+            key: value for key, value in request.GET.items() if key in ('content_type', 'date_from', 'date_to') and value
+        }),
     })
 
 
+def _parse_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def _day_start(day):
+    """Aware midnight of a date, so the date filters stay range scans on uploaded_at."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
 @login_required
 def document_detail(request, doc_id):
     """View document details."""
@@ -31,6 +91,10 @@ def document_view(request, doc_id):
     """View/download document from S3."""
     document = get_object_or_404(Document, id=doc_id)
     
+    if settings.MEDIA_OFFLOAD:
+        # Local media: the web server streams the file (documents/offload.py)
+        return offload_response(document.file.storage, document.file.name, document.original_filename)
+    
     try:
         # Get the file URL (S3 or local)
         file_url = document.file.url
@@ -38,3 +102,113 @@ def document_view(request, doc_id):
     except Exception as e:
         messages.error(request, f'Error accessing file: {str(e)}')
         return redirect('documents:document_list')
+
+
+@login_required
+def serve_media(request, path):
+    """Local media file under MEDIA_URL, after a permission check; the bytes are offloaded."""
+    name = posixpath.normpath(path).lstrip('/')
+    if name.startswith('..'):
+        raise Http404('File not found')
+    
+    # Like role_required: no profile, no files
+    profile = getattr(request.user, 'profile', None)
+    if profile is None:
+        messages.error(request, 'User profile not found.')
+        return redirect('login_selector')
+    # Hospitals see their own claim files and the shared document library
+    if profile.role == 'HOSPITAL' and not name.startswith('documents/'):
+        if not hospital_owns_media(profile.hospital, name):
+            messages.error(request, 'Access denied.')
+            return redirect('dashboard')
+    
+    return offload_response(default_storage, name)
+
+
+@staff_member_required
+def url_cache_stats(request):
+    """Presigned URL cache counters of the worker answering this request."""
+    url_cache = getattr(default_storage, 'url_cache', None)
+    if url_cache is None:
+        return JsonResponse({'enabled': False})
+    return JsonResponse({'enabled': True, **url_cache.stats()})
+
+
+def _upload_state(upload):
+    return {
+        'upload_id': str(upload.id),
+        'offset': upload.offset,
+        'size': upload.size,
+        'complete': upload.complete,
+        'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    }
+
+
+@login_required
+@require_POST
+def upload_start(request):
+    """Begin a resumable upload (documents/uploads.py)."""
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'size is required.'}, status=400)
+    try:
+        upload = start_upload(
+            request.user, request.POST.get('filename', ''), size, request.POST.get('content_type', '')
+        )
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(_upload_state(upload), status=201)
+
+
+@login_required
+def upload_chunk(request, upload_id):
+    """GET: where to resume. POST: the next chunk as the raw body, at the Upload-Offset header."""
+    if request.method == 'GET':
+        upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+        return JsonResponse(_upload_state(upload))
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed.'}, status=405)
+    
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Upload-Offset and Content-Length headers are required.'}, status=400)
+    try:
+        upload = append_chunk(upload_id, request.user, offset, request, length)
+    except UploadError as e:
+        body = {'error': str(e)}
+        if e.upload is not None:
+            body.update(_upload_state(e.upload))
+        return JsonResponse(body, status=e.status)
+    return JsonResponse(_upload_state(upload))
+
+
+@login_required
+@require_POST
+def direct_upload_grant(request):
+    """Grant for sending one file straight to storage (documents/direct.py)."""
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'size is required.'}, status=400)
+    try:
+        grant = issue_grant(
+            request.user, request.POST.get('field', ''), request.POST.get('filename', ''),
+            request.POST.get('content_type', ''), size,
+        )
+    except GrantError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(grant, status=201)
+
+
+@csrf_exempt
+@require_POST
+def direct_upload_receive(request, token):
+    """Local media stand-in for an S3 presigned POST: the signed token is the authorization."""
+    try:
+        receive_upload(token, request.FILES.get('file'))
+    except GrantError as e:
+        return JsonResponse({'error': str(e)}, status=403)
+    return HttpResponse(status=204)
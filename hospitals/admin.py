@@ -4,11 +4,16 @@ from .models import (
     Service,
     Scheme,
     Bill,
+    BillAttachment,
     BillItem,
     BillDocument,
+    BillImport,
+    Employee,
+    Dependent,
     WorkflowHistory,
     SanctionOrder
 )
+from .attachments import sync_attachments
 
 @admin.register(Hospital)
 class HospitalAdmin(admin.ModelAdmin):
@@ -28,6 +33,17 @@ class SchemeAdmin(admin.ModelAdmin):
     list_filter = ('is_active',)
     search_fields = ('name', 'code')
 
+class DependentInline(admin.TabularInline):
+    model = Dependent
+    extra = 0
+
+@admin.register(Employee)
+class EmployeeAdmin(admin.ModelAdmin):
+    list_display = ('employee_id', 'name', 'designation', 'employee_type', 'mobile_number')
+    list_filter = ('employee_type',)
+    search_fields = ('employee_id', 'name')
+    inlines = [DependentInline]
+
 class BillItemInline(admin.TabularInline):
     model = BillItem
     extra = 1
@@ -58,11 +74,19 @@ class BillAdmin(admin.ModelAdmin):
 
     inlines = [BillItemInline, BillDocumentInline, WorkflowHistoryInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        sync_attachments([form.instance.pk])
+
 @admin.register(SanctionOrder)
 class SanctionOrderAdmin(admin.ModelAdmin):
     list_display = ('order_number', 'bill', 'sanctioned_amount', 'order_date')
     search_fields = ('order_number',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        sync_attachments([obj.bill_id])
+
 @admin.register(WorkflowHistory)
 class WorkflowHistoryAdmin(admin.ModelAdmin):
     list_display = ('bill', 'role', 'action', 'action_by', 'action_at')
@@ -71,3 +95,21 @@ class WorkflowHistoryAdmin(admin.ModelAdmin):
 @admin.register(BillItem)
 class BillItemAdmin(admin.ModelAdmin):
     list_display = ('bill', 'service', 'claimed_amount')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        sync_attachments([obj.bill_id])
+
+@admin.register(BillImport)
+class BillImportAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'hospital', 'total_rows', 'claims_created', 'claims_failed', 'created_at')
+    list_filter = ('hospital',)
+    readonly_fields = ('created_at',)
+
+@admin.register(BillAttachment)
+class BillAttachmentAdmin(admin.ModelAdmin):
+    # Maintained by hospitals/attachments.py from the claims' file columns
+    list_display = ('bill', 'kind', 'label', 'name')
+    list_filter = ('kind',)
+    raw_id_fields = ('bill',)
+    readonly_fields = ('bill', 'kind', 'source_id', 'name', 'label')
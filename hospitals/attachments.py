@@ -0,0 +1,109 @@
+"""
+The claim attachment index (BillAttachment).
+
+A claim's files sit in six columns of four tables: the bill's ID card, CC
+card and discharge summary, each item's supporting document, the
+BillDocuments and the sanction order PDF. BillAttachment mirrors them as
+one row per file (kind, owning row, storage name, label), so a page of
+claims gets all its files - with their size and type from FileMetadata -
+in one query, and the media jobs list a claim's files without touching
+three tables.
+
+The columns remain the source of truth: forms, drafts and FieldFile work on
+them unchanged. sync_attachments() brings the rows of the given claims in
+line with them and is called on every path that changes claim files
+(submission, draft autosave, media normalization, admin edits);
+``manage.py sync_attachments`` rebuilds the whole index.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from documents.models import FileMetadata
+from .models import Bill, BillAttachment, BillDocument, BillItem, SanctionOrder
+
+
+# (kind, model, file column, column pointing at the claim, label column)
+SOURCES = [
+    ('ID_CARD', Bill, 'id_card_file', 'id', None),
+    ('CC_CARD', Bill, 'cc_card_file', 'id', None),
+    ('DISCHARGE_SUMMARY', Bill, 'discharge_summary_file', 'id', None),
+    ('ITEM', BillItem, 'supporting_document', 'bill_id', 'service__name'),
+    ('DOCUMENT', BillDocument, 'file', 'bill_id', 'document_type'),
+    ('SANCTION_ORDER', SanctionOrder, 'pdf_file', 'bill_id', 'order_number'),
+]
+# Files uploaded with the claim, as opposed to the generated sanction order
+UPLOADED_KINDS = ('ID_CARD', 'CC_CARD', 'DISCHARGE_SUMMARY', 'ITEM', 'DOCUMENT')
+# Files of the claim itself rather than of one item or document
+CLAIM_KINDS = ('ID_CARD', 'CC_CARD', 'DISCHARGE_SUMMARY', 'SANCTION_ORDER')
+DOCUMENT_TYPES = dict(BillDocument.DOCUMENT_TYPE_CHOICES)
+
+
+def current_attachments(bill_ids):
+    """{(bill id, kind, source id): (name, label)} read from the file columns."""
+    found = {}
+    for kind, model, column, bill_column, label_column in SOURCES:
+        values = [bill_column, 'pk', column] + ([label_column] if label_column else [])
+        rows = (
+            model.objects.filter(**{f'{bill_column}__in': bill_ids})
+            .exclude(**{column: ''}).exclude(**{f'{column}__isnull': True})
+            .values_list(*values)
+        )
+        for bill_id, pk, name, *label in rows:
+            label = label[0] if label else ''
+            if kind == 'DOCUMENT':
+                label = DOCUMENT_TYPES.get(label, label)
+            source_id = 0 if model is Bill else pk
+            found[(bill_id, kind, source_id)] = (name, (label or '')[:255])
+    return found
+
+
+def sync_attachments(bill_ids):
+    """Make the BillAttachment rows of ``bill_ids`` match their file columns."""
+    bill_ids = list(bill_ids)
+    if not bill_ids:
+        return
+    with transaction.atomic():
+        # Concurrent syncs of the same claim take turns
+        list(Bill.objects.select_for_update().filter(id__in=bill_ids).values_list('id', flat=True))
+        wanted = current_attachments(bill_ids)
+        stale = []
+        for attachment in BillAttachment.objects.filter(bill_id__in=bill_ids):
+            key = (attachment.bill_id, attachment.kind, attachment.source_id)
+            if wanted.get(key) == (attachment.name, attachment.label):
+                del wanted[key]
+            else:
+                stale.append(attachment.pk)
+        if stale:
+            BillAttachment.objects.filter(pk__in=stale).delete()
+        BillAttachment.objects.bulk_create([
+            BillAttachment(bill_id=bill_id, kind=kind, source_id=source_id, name=name, label=label)
+            for (bill_id, kind, source_id), (name, label) in wanted.items()
+        ])
+
+
+def attachments_for(bill_ids, kinds=None):
+    """
+    {bill id: [BillAttachment]} for ``bill_ids`` in one query, each with
+    ``size`` and ``content_type`` from FileMetadata (None when not described yet).
+    """
+    meta = FileMetadata.objects.filter(name=OuterRef('name'))
+    attachments = BillAttachment.objects.filter(bill_id__in=bill_ids)
+    if kinds:
+        attachments = attachments.filter(kind__in=kinds)
+    attachments = attachments.annotate(
+        size=Subquery(meta.values('size')[:1]),
+        content_type=Subquery(meta.values('content_type')[:1]),
+    ).order_by('bill_id', 'kind', 'source_id')
+    grouped = {}
+    for attachment in attachments:
+        grouped.setdefault(attachment.bill_id, []).append(attachment)
+    return grouped
+
+
+def attach_attachments(rows, bill_attr='bill_id'):
+    """Set ``.attachments`` on each row (claims or list rows) from one query."""
+    rows = list(rows)
+    found = attachments_for([getattr(row, bill_attr) for row in rows])
+    for row in rows:
+        row.attachments = found.get(getattr(row, bill_attr), [])
+    return rows
@@ -0,0 +1,386 @@
+"""
+Bulk claim ingestion for hospitals (CSV / XLSX).
+
+The spreadsheet has one row per line item. Rows that share a ``claim_ref``
+(the hospital's own reference, e.g. its IP register number) make up one
+claim and must be contiguous; the claim columns are read from the first row
+of each group.
+
+The file is read as a stream and claims are handled in batches: every batch
+is validated against cached Scheme / Service code maps and the field rules
+of the import forms (the model rules BillForm / BillItemForm apply), checked
+for duplicates with one fingerprint query, and written with bulk inserts
+inside one transaction.
+A claim with any bad row is skipped as a whole and reported row by row.
+"""
+import csv
+import io
+from datetime import date, datetime
+from itertools import groupby
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
+
+from workflow.models import SanctionRequest, WorkflowStep
+from .forms import BillImportForm, BillItemImportForm
+from .employees import register_employees
+from .models import Bill, BillItem, Scheme, Service
+from .overlaps import flag_overlaps
+from .pricing import get_tariff, price_items
+from .search import index_bills
+
+
+CLAIM_COLUMNS = [
+    'claim_ref',
+    'scheme_code',
+    'patient_name',
+    'designation',
+    'employee_id',
+    'employee_type',
+    'relationship',
+    'credit_card_number',
+    'ip_number',
+    'mobile_number',
+    'age',
+    'sex',
+    'disease_details',
+    'admission_date',
+    'discharge_date',
+    'bill_number',
+    'bill_date',
+]
+
+ITEM_COLUMNS = [
+    'service_code',
+    'hospital_service_name',
+    'claimed_rate',
+    'claimed_quantity',
+    'claimed_amount',
+    'description',
+]
+
+TEMPLATE_COLUMNS = CLAIM_COLUMNS + ITEM_COLUMNS
+REQUIRED_COLUMNS = {'claim_ref', 'scheme_code', 'patient_name', 'employee_id', 'ip_number',
+                    'admission_date', 'discharge_date'}
+
+# Claims per validation batch / transaction
+BATCH_SIZE = 500
+
+# Field rules come straight from the import forms. Calling field.clean()
+# avoids building (and deep-copying) a form instance for every row.
+CLAIM_FIELDS = BillImportForm.base_fields
+ITEM_FIELDS = BillItemImportForm.base_fields
+
+
+class BulkUploadError(Exception):
+    """The file as a whole cannot be read (bad format, missing columns)."""
+
+
+class ImportResult:
+    """Counters and per-row errors collected while ingesting one file."""
+
+    def __init__(self):
+        self.total_rows = 0
+        self.claims_created = 0
+        self.claims_failed = 0
+        self.errors = []  # (row_number, claim_ref, field, message)
+
+    def add_error(self, row_number, claim_ref, field, message):
+        self.errors.append((row_number, claim_ref, field, message))
+
+    def error_report(self):
+        """CSV of every rejected row, ready to hand to a FileField."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['row', 'claim_ref', 'field', 'error'])
+        writer.writerows(self.errors)
+        return ContentFile(buffer.getvalue().encode('utf-8'))
+
+
+# ---------------------------------------------------------------------------
+# Streaming readers
+# ---------------------------------------------------------------------------
+
+def _normalize_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def _cell_to_str(value):
+    """Turn an XLSX cell value into the string a form field expects."""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _rows_with_header(raw_rows):
+    header = next(raw_rows, None)
+    if header is None:
+        raise BulkUploadError('The file is empty.')
+    columns = [_normalize_header(h) for h in header]
+    missing = REQUIRED_COLUMNS - set(columns)
+    if missing:
+        raise BulkUploadError(f"Missing columns: {', '.join(sorted(missing))}")
+
+    # Row 1 is the header, so data starts at row 2 (matches the spreadsheet)
+    for row_number, values in enumerate(raw_rows, start=2):
+        values = [_cell_to_str(v) for v in values]
+        if not any(values):
+            continue
+        yield row_number, dict(zip(columns, values))
+
+
+def _iter_csv(uploaded_file):
+    uploaded_file.seek(0)
+    text = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+    try:
+        yield from _rows_with_header(csv.reader(text))
+    finally:
+        # Leave the underlying upload open for Django to clean up
+        text.detach()
+
+
+def _iter_xlsx(uploaded_file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise BulkUploadError('XLSX support needs openpyxl; upload a CSV instead.')
+
+    uploaded_file.seek(0)
+    # read_only mode streams rows instead of loading the whole sheet
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        yield from _rows_with_header(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def iter_sheet_rows(uploaded_file):
+    """Yield (row_number, {column: value}) from an uploaded CSV or XLSX file."""
+    name = uploaded_file.name.lower()
+    if name.endswith('.csv'):
+        return _iter_csv(uploaded_file)
+    if name.endswith('.xlsx'):
+        return _iter_xlsx(uploaded_file)
+    raise BulkUploadError('Unsupported file type; upload a .csv or .xlsx file.')
+
+
+def iter_claims(rows):
+    """Group contiguous rows into (claim_ref, [(row_number, row), ...], error)."""
+    seen = set()
+    for claim_ref, group in groupby(rows, key=lambda r: r[1].get('claim_ref', '')):
+        group = list(group)
+        if claim_ref in seen:
+            # Report instead of silently merging two separate blocks
+            yield claim_ref, group, 'Rows for this claim_ref must be contiguous.'
+            continue
+        seen.add(claim_ref)
+        yield claim_ref, group, None if claim_ref else 'claim_ref is required.'
+
+
+def _batched(iterable, size):
+    batch = []
+    for entry in iterable:
+        batch.append(entry)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------------------------------------------------------------------
+# Importer
+# ---------------------------------------------------------------------------
+
+class ClaimImporter:
+    """Validate and insert claims for one hospital from spreadsheet rows."""
+
+    def __init__(self, hospital, user):
+        self.hospital = hospital
+        self.user = user
+        self.result = ImportResult()
+        # Loaded once per file - no per-row lookups
+        self.schemes = {code.upper(): pk for pk, code in
+                        Scheme.objects.filter(is_active=True).values_list('id', 'code')}
+        self.services = {}
+        for pk, code, name in Service.objects.filter(is_active=True).values_list('id', 'code', 'name'):
+            if code:
+                self.services[code.upper()] = (pk, name)
+        self.first_step = WorkflowStep.objects.order_by('order').first()
+        self.tariff = get_tariff()
+        self.seen_fingerprints = set()
+
+    def run(self, rows):
+        counted = self._count_rows(rows)
+        for batch in _batched(iter_claims(counted), BATCH_SIZE):
+            self._process_batch(batch)
+        return self.result
+
+    def _count_rows(self, rows):
+        for row in rows:
+            self.result.total_rows += 1
+            yield row
+
+    def _fail(self, claim_ref, group, field, message):
+        self.result.claims_failed += 1
+        for row_number, _ in group:
+            self.result.add_error(row_number, claim_ref, field, message)
+
+    def _clean_row(self, fields, row_number, claim_ref, row):
+        """Run each form field's clean() on the row; returns cleaned dict or None."""
+        cleaned = {}
+        ok = True
+        for name, field in fields.items():
+            try:
+                cleaned[name] = field.clean(row.get(name, ''))
+            except ValidationError as e:
+                self.result.add_error(row_number, claim_ref, name, '; '.join(e.messages))
+                ok = False
+        return cleaned if ok else None
+
+    def _build_claim(self, claim_ref, group):
+        """Return (bill, items) or None after recording errors."""
+        first_number, first_row = group[0]
+        failed = False
+
+        claim_data = self._clean_row(CLAIM_FIELDS, first_number, claim_ref, first_row)
+        if claim_data is None:
+            failed = True
+
+        scheme_id = self.schemes.get(first_row.get('scheme_code', '').upper())
+        if scheme_id is None:
+            self.result.add_error(first_number, claim_ref, 'scheme_code', 'Unknown or inactive scheme code.')
+            failed = True
+
+        items = []
+        for row_number, row in group:
+            service = None
+            service_code = row.get('service_code', '').upper()
+            if service_code:
+                service = self.services.get(service_code)
+                if service is None:
+                    self.result.add_error(row_number, claim_ref, 'service_code', 'Unknown or inactive service code.')
+                    failed = True
+            elif not row.get('hospital_service_name'):
+                self.result.add_error(row_number, claim_ref, 'service_code',
+                                      'Either service_code or hospital_service_name is required.')
+                failed = True
+
+            item_data = self._clean_row(ITEM_FIELDS, row_number, claim_ref, row)
+            if item_data is None:
+                failed = True
+                continue
+
+            item = BillItem(**item_data)
+            if service is not None:
+                item.service_id = service[0]
+                if not item.hospital_service_name:
+                    item.hospital_service_name = service[1]
+            # bulk_create skips BillItem.save(), so mirror its amount rule here
+            if not item.claimed_amount:
+                item.claimed_amount = item.claimed_rate * item.claimed_quantity
+            items.append(item)
+
+        if failed:
+            self.result.claims_failed += 1
+            return None
+
+        price_items(items, self.hospital.tier, self.tariff)
+        bill = Bill(**claim_data)
+        bill.hospital = self.hospital
+        bill.scheme_id = scheme_id
+        bill.created_by = self.user
+        bill.status = 'SUBMITTED'
+        bill.gross_claimed_amount = sum(item.claimed_amount for item in items)
+        bill.fingerprint = bill.compute_fingerprint()
+        return bill, items
+
+    def _process_batch(self, batch):
+        claims = []
+        for claim_ref, group, error in batch:
+            if error:
+                self._fail(claim_ref, group, 'claim_ref', error)
+                continue
+            built = self._build_claim(claim_ref, group)
+            if built is not None:
+                claims.append((claim_ref, group, built))
+
+        if not claims:
+            return
+
+        # One indexed lookup for the whole batch
+        fingerprints = [bill.fingerprint for _, _, (bill, _) in claims]
+        existing = set(
+            Bill.objects.filter(fingerprint__in=fingerprints).values_list('fingerprint', flat=True)
+        )
+        fresh = []
+        for claim_ref, group, (bill, items) in claims:
+            if bill.fingerprint in existing or bill.fingerprint in self.seen_fingerprints:
+                self._fail(claim_ref, group, 'claim_ref', 'Duplicate of a claim that has already been submitted.')
+                continue
+            self.seen_fingerprints.add(bill.fingerprint)
+            fresh.append((claim_ref, group, bill, items))
+
+        try:
+            with transaction.atomic():
+                self._insert([(bill, items) for _, _, bill, items in fresh])
+            self.result.claims_created += len(fresh)
+        except IntegrityError:
+            # A concurrent submission took one of the fingerprints; fall back
+            # to one transaction per claim so the rest of the batch still lands.
+            for claim_ref, group, bill, items in fresh:
+                bill.pk = None
+                for item in items:
+                    item.pk = None
+                try:
+                    with transaction.atomic():
+                        self._insert([(bill, items)])
+                    self.result.claims_created += 1
+                except IntegrityError:
+                    self._fail(claim_ref, group, 'claim_ref', 'Duplicate of a claim that has already been submitted.')
+
+    def _insert(self, claims):
+        bills = [bill for bill, _ in claims]
+        register_employees(bills)
+        if connection.features.can_return_rows_from_bulk_insert:
+            Bill.objects.bulk_create(bills)
+            # bulk_create skips Bill.save(), which keeps the search index current
+            index_bills(bills)
+        else:
+            # e.g. Oracle: bulk_create cannot hand back the new primary keys;
+            # each save() indexes its own claim
+            for bill in bills:
+                bill.save()
+
+        line_items = []
+        for bill, items in claims:
+            for item in items:
+                item.bill = bill
+                line_items.append(item)
+        BillItem.objects.bulk_create(line_items, batch_size=1000)
+
+        SanctionRequest.objects.bulk_create([
+            SanctionRequest(
+                bill=bill,
+                hospital_name=self.hospital.name,
+                patient_name=bill.patient_name,
+                claimed_amount=bill.gross_claimed_amount,
+                current_step=self.first_step,
+                status='PENDING',
+            )
+            for bill in bills
+        ], batch_size=1000)
+
+        flag_overlaps(bills)
+
+
+def import_claims(uploaded_file, hospital, user):
+    """Ingest one uploaded spreadsheet and return its ImportResult."""
+    return ClaimImporter(hospital, user).run(iter_sheet_rows(uploaded_file))
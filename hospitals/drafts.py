@@ -0,0 +1,186 @@
+"""
+Incremental draft autosave for the claim form.
+
+The submit page posts only the fields and item rows that changed since the
+last autosave. Each field is cleaned on its own with the BillForm /
+BillItemForm field rules, so one bad value does not block the rest, and rows
+are written with ``save(update_fields=...)`` so a keystroke batch is a single
+narrow UPDATE. Uploaded files are stored once on the draft and then kept by
+reference; later autosaves and the final submission never resend them.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.forms.models import model_to_dict
+
+from .forms import BillForm, BillItemForm
+from .line_items import load_service_map, resolve_service
+from .models import BillItem
+
+
+BILL_FILE_FIELDS = ('id_card_file', 'cc_card_file', 'discharge_summary_file')
+# gross_claimed_amount is always recomputed from the items
+BILL_DRAFT_FIELDS = [
+    name for name in BillForm.Meta.fields
+    if name not in BILL_FILE_FIELDS and name != 'gross_claimed_amount'
+]
+
+ITEM_FILE_FIELD = 'supporting_document'
+# service is resolved from the cached service map instead of a per-row query
+ITEM_DRAFT_FIELDS = [name for name in BillItemForm.Meta.fields if name not in (ITEM_FILE_FIELD, 'service')]
+
+
+def _clean_field(field, value, initial=None):
+    if initial is not None:
+        # FileField.clean(data, initial) takes the stored file as fallback
+        return field.clean(value, initial)
+    return field.clean(value)
+
+
+def _model_value(instance, name, value):
+    """Current column value and the value to assign, comparable with each other."""
+    field = instance._meta.get_field(name)
+    if field.is_relation:
+        return getattr(instance, field.attname), (value.pk if value is not None else None), field.attname
+    return getattr(instance, name), value, name
+
+
+def apply_bill_changes(bill, data, files):
+    """
+    Clean and assign the posted claim fields and files.
+    Returns (changed_field_names, errors) - nothing is saved here.
+    """
+    fields = BillForm.base_fields
+    changed = []
+    errors = {}
+
+    for name in BILL_DRAFT_FIELDS:
+        if name not in data:
+            continue
+        raw = data.get(name)
+        if raw in (None, ''):
+            # Clearing a field is allowed on a draft even if it is required on submit
+            value = None if bill._meta.get_field(name).null else ''
+        else:
+            try:
+                value = _clean_field(fields[name], raw)
+            except ValidationError as e:
+                errors[name] = e.messages
+                continue
+        current, value, attname = _model_value(bill, name, value)
+        if current != value:
+            setattr(bill, attname, value)
+            changed.append(name)
+
+    for name in BILL_FILE_FIELDS:
+        upload = files.get(name)
+        if upload is None:
+            continue
+        try:
+            _clean_field(fields[name], upload, getattr(bill, name))
+        except ValidationError as e:
+            errors[name] = e.messages
+            continue
+        # Assigning the upload stores it on the next save(); after that only the key is kept
+        setattr(bill, name, upload)
+        changed.append(name)
+
+    return changed, errors
+
+
+def apply_item_changes(bill, payload, files):
+    """
+    Apply changed item rows to a saved draft.
+
+    ``payload`` is a JSON list of ``{"key": ..., "id": ..., <fields>}`` rows,
+    or ``{"id": ..., "delete": true}`` for removed rows. Returns
+    ({row_key: item_id}, {row_key: errors}).
+    """
+    try:
+        rows = json.loads(payload or '[]')
+    except ValueError:
+        return {}, {'items': ['Malformed item payload.']}
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return {}, {'items': ['Malformed item payload.']}
+
+    fields = BillItemForm.base_fields
+    service_map = load_service_map() if any('service' in row for row in rows) else {}
+    existing = {item.pk: item for item in bill.items.filter(pk__in=[r.get('id') for r in rows if r.get('id')])}
+    ids = {}
+    errors = {}
+
+    deleted = [r['id'] for r in rows if r.get('delete') and r.get('id') in existing]
+    if deleted:
+        BillItem.objects.filter(bill=bill, pk__in=deleted).delete()
+
+    for row in rows:
+        if row.get('delete'):
+            continue
+        key = str(row.get('key', ''))
+        item = existing.get(row.get('id'))
+        is_new = item is None
+        if is_new:
+            item = BillItem(bill=bill, claimed_amount=0)
+
+        changed = []
+        row_errors = {}
+        for name in ITEM_DRAFT_FIELDS:
+            if name not in row:
+                continue
+            try:
+                value = _clean_field(fields[name], row[name])
+            except ValidationError as e:
+                row_errors[name] = e.messages
+                continue
+            if value is None and not item._meta.get_field(name).null:
+                value = item._meta.get_field(name).get_default()
+                if value is None:
+                    # claimed_amount has no default; it is recomputed below
+                    continue
+            current, value, attname = _model_value(item, name, value)
+            if current != value:
+                setattr(item, attname, value)
+                changed.append(name)
+
+        if 'service' in row:
+            try:
+                service = resolve_service(service_map, row['service'])
+            except ValidationError as e:
+                row_errors['service'] = e.messages
+            else:
+                service_id = service[0] if service else None
+                if item.service_id != service_id:
+                    item.service_id = service_id
+                    changed.append('service')
+
+        upload = files.get(f'item-{key}-{ITEM_FILE_FIELD}')
+        if upload is not None:
+            setattr(item, ITEM_FILE_FIELD, upload)
+            changed.append(ITEM_FILE_FIELD)
+
+        if row_errors:
+            errors[key] = row_errors
+
+        # Keep the amount consistent with rate x quantity unless typed explicitly
+        amount_typed = row.get('claimed_amount') not in (None, '')
+        if not amount_typed and ({'claimed_rate', 'claimed_quantity'} & set(changed) or 'claimed_amount' in row):
+            amount = item.claimed_rate * item.claimed_quantity
+            if item.claimed_amount != amount:
+                item.claimed_amount = amount
+                changed.append('claimed_amount')
+
+        if is_new:
+            item.save()
+        elif changed:
+            item.save(update_fields=changed)
+        ids[key] = item.pk
+
+    return ids, errors
+
+
+def bill_form_for_draft(bill):
+    """Bound BillForm over the stored draft, used to validate it for submission."""
+    data = model_to_dict(bill, fields=[name for name in BillForm.Meta.fields if name not in BILL_FILE_FIELDS])
+    data = {name: value for name, value in data.items() if value is not None}
+    # No files are posted: FileField falls back to the stored file (initial)
+    return BillForm(data=data, files={}, instance=bill)
@@ -0,0 +1,182 @@
+"""
+Employee and dependents registry.
+
+Claims carry the employee details as typed on the form; the registry keeps
+one Employee per normalized employee_id (and one Dependent per patient name
+under it) so that
+
+* the claim form can prefill a known employee with one indexed lookup, and
+* an employee's claim history is a filter on the indexed Bill.employee_record FK.
+
+register_employees() links a batch of unsaved or saved bills with a fixed
+number of queries however many bills there are. The details on the registry
+follow the most recent claim that filled them in.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+
+from .models import Bill, Dependent, Employee, normalize_employee_id
+
+
+EMPLOYEE_FIELDS = ['name', 'designation', 'employee_type', 'credit_card_number', 'mobile_number']
+
+
+def employee_details(bill):
+    """Registry values carried by a claim; the patient's name only names a SELF claim."""
+    details = {
+        'designation': bill.designation or '',
+        'employee_type': bill.employee_type or '',
+        'credit_card_number': bill.credit_card_number or '',
+        'mobile_number': bill.mobile_number or '',
+    }
+    if bill.relationship == 'SELF':
+        details['name'] = bill.patient_name or ''
+    return details
+
+
+def create_missing(model, rows):
+    """Insert rows that are not stored yet, tolerating a concurrent insert of the same key."""
+    if not rows:
+        return
+    if connection.features.supports_ignore_conflicts:
+        model.objects.bulk_create(rows, ignore_conflicts=True)
+        return
+    # e.g. Oracle: no ON CONFLICT, insert one by one
+    for row in rows:
+        try:
+            with transaction.atomic():
+                row.save()
+        except IntegrityError:
+            # Inserted concurrently; the caller reloads the stored rows
+            pass
+
+
+def register_employees(bills):
+    """
+    Create or update the registry rows for ``bills`` and set each bill's
+    employee_record / dependent. The bills themselves are not saved.
+    """
+    # Per employee, every non-empty value of the batch with later claims winning
+    latest = {}
+    for bill in bills:
+        key = normalize_employee_id(bill.employee_id)
+        if key:
+            details = latest.setdefault(key, {})
+            details.update((field, value) for field, value in employee_details(bill).items() if value)
+    if not latest:
+        return bills
+
+    employees = {e.employee_id: e for e in Employee.objects.filter(employee_id__in=latest)}
+    create_missing(
+        Employee,
+        [Employee(employee_id=key, **details) for key, details in latest.items() if key not in employees]
+    )
+    if len(employees) < len(latest):
+        employees = {e.employee_id: e for e in Employee.objects.filter(employee_id__in=latest)}
+
+    changed = []
+    for key, details in latest.items():
+        employee = employees[key]
+        if any(getattr(employee, field) != value for field, value in details.items()):
+            for field, value in details.items():
+                setattr(employee, field, value)
+            changed.append(employee)
+    if changed:
+        Employee.objects.bulk_update(changed, EMPLOYEE_FIELDS, batch_size=500)
+
+    wanted = {}
+    for bill in bills:
+        employee = employees.get(normalize_employee_id(bill.employee_id))
+        bill.employee_record = employee
+        if employee and bill.relationship == 'DEPENDENT' and bill.patient_name:
+            wanted[(employee.id, bill.patient_name.strip())] = bill.sex or ''
+    bill_dependents = _register_dependents(wanted)
+    for bill in bills:
+        if bill.employee_record and bill.relationship == 'DEPENDENT' and bill.patient_name:
+            bill.dependent = bill_dependents.get((bill.employee_record.id, bill.patient_name.strip()))
+        else:
+            bill.dependent = None
+    return bills
+
+
+def _register_dependents(wanted):
+    """{(employee_id, name): Dependent} for every wanted pair, creating the missing ones."""
+    if not wanted:
+        return {}
+    employee_ids = {employee_id for employee_id, _ in wanted}
+
+    def load():
+        return {
+            (d.employee_id, d.name): d
+            for d in Dependent.objects.filter(employee_id__in=employee_ids, name__in={name for _, name in wanted})
+        }
+
+    dependents = load()
+    create_missing(
+        Dependent,
+        [Dependent(employee_id=employee_id, name=name, sex=sex)
+         for (employee_id, name), sex in wanted.items() if (employee_id, name) not in dependents]
+    )
+    if len(dependents) < len(wanted):
+        dependents = load()
+    return dependents
+
+
+def prefill_for(employee_id, hospital):
+    """
+    Form prefill values for a registered employee, or None. The card and
+    mobile numbers and the dependents only go to a hospital that has filed
+    a claim for the employee.
+    """
+    key = normalize_employee_id(employee_id)
+    if not key:
+        return None
+    employee = Employee.objects.filter(employee_id=key).first()
+    if employee is None:
+        return None
+    details = {
+        'employee_id': employee.employee_id,
+        'name': employee.name,
+        'designation': employee.designation,
+        'employee_type': employee.employee_type,
+    }
+    if employee.claims.filter(hospital=hospital).exclude(status='DRAFT').exists():
+        details.update(
+            credit_card_number=employee.credit_card_number,
+            mobile_number=employee.mobile_number,
+            dependents=list(employee.dependents.values('name', 'sex')),
+        )
+    return details
+
+
+def lookup_allowed(user):
+    """
+    Count one registry lookup for ``user``; False once EMPLOYEE_LOOKUPS_PER_MINUTE is used up.
+
+    The counter lives in the default cache. Under the per-process default
+    each worker counts on its own, so a user gets the limit once per
+    worker; configure a shared CACHE_BACKEND for one limit across workers.
+    """
+    key = f'employee-lookups:{user.pk}'
+    # add() starts the window; later lookups only increment inside it
+    cache.add(key, 0, timeout=60)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Window expired between add() and incr()
+        cache.set(key, 1, timeout=60)
+        count = 1
+    return count <= settings.EMPLOYEE_LOOKUPS_PER_MINUTE
+
+
+def claim_history(bill):
+    """Other submitted claims of the bill's employee, newest first, via the employee_record index."""
+    if not bill.employee_record_id:
+        return Bill.objects.none()
+    return (
+        Bill.objects.filter(employee_record_id=bill.employee_record_id)
+        .exclude(pk=bill.pk)
+        .exclude(status='DRAFT')
+        .order_by('-created_at')
+    )
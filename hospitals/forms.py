@@ -107,3 +107,53 @@ class BillItemForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 1, 'placeholder': 'Optional details'}),
             'supporting_document': forms.FileInput(attrs={'class': 'form-control'}),
         }
+
+
+class BulkUploadForm(forms.Form):
+    """Spreadsheet of claims for bulk ingestion (one row per line item)."""
+    file = forms.FileField(
+        label='Claims spreadsheet (.csv / .xlsx)',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('Upload a .csv or .xlsx file.')
+        return upload
+
+
+class BillImportForm(forms.ModelForm):
+    """
+    Claim-level rules for bulk ingestion. Same model rules as BillForm, minus
+    the scheme (resolved from a cached code map) and the file uploads.
+    """
+
+    class Meta:
+        model = Bill
+        fields = [
+            'patient_name',
+            'designation',
+            'employee_id',
+            'employee_type',
+            'relationship',
+            'credit_card_number',
+            'ip_number',
+            'mobile_number',
+            'age',
+            'sex',
+            'disease_details',
+            'admission_date',
+            'discharge_date',
+            'bill_number',
+            'bill_date',
+        ]
+
+
+class BillItemImportForm(forms.ModelForm):
+    """Line-item rules for bulk ingestion; the service is resolved from a cached code map."""
+    claimed_amount = forms.DecimalField(required=False, max_digits=12, decimal_places=2)
+
+    class Meta:
+        model = BillItem
+        fields = ['hospital_service_name', 'claimed_quantity', 'claimed_rate', 'claimed_amount', 'description']
@@ -0,0 +1,74 @@
+"""
+Idempotency keys for state-changing form POSTs.
+
+Each rendered form carries a random ``idempotency_key``. When the POST
+succeeds, its redirect target is stored under that key in the same
+transaction as the writes. A replay (double click, browser retry) finds
+the key and gets the original redirect without repeating any writes. If two
+copies race, the second fails on the unique key and its transaction rolls
+back. Keys expire after IDEMPOTENCY_KEY_TTL_HOURS and are purged in bulk by
+``manage.py purge_idempotency_keys``.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import messages
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+FIELD_NAME = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+
+
+def expiry_cutoff():
+    return timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def _posted_key(request):
+    key = request.POST.get(FIELD_NAME, '').strip()
+    return key if 0 < len(key) <= MAX_KEY_LENGTH else None
+
+
+def form_key(request):
+    """Key for the form being rendered; a re-rendered invalid form keeps its posted key."""
+    if request.method == 'POST':
+        return _posted_key(request) or uuid.uuid4().hex
+    return uuid.uuid4().hex
+
+
+def replay_response(request, scope):
+    """Redirect to the original result if this POST's key was already used, else None."""
+    key = _posted_key(request)
+    if key is None:
+        return None
+    response_url = (
+        IdempotencyKey.objects
+        .filter(key=key, user=request.user, scope=scope, created_at__gte=expiry_cutoff())
+        .values_list('response_url', flat=True)
+        .first()
+    )
+    if response_url is None:
+        return None
+    messages.info(request, 'This form was already submitted; showing the original result.')
+    return redirect(response_url)
+
+
+def remember_response(request, scope, response):
+    """
+    Store the redirect of a successful POST under its key and return it.
+    Call inside the POST's transaction so a racing replay raises IntegrityError.
+    """
+    key = _posted_key(request)
+    if key is not None and response.status_code in (301, 302, 303):
+        IdempotencyKey.objects.create(key=key, user=request.user, scope=scope, response_url=response['Location'])
+    return response
+
+
+def purge_expired():
+    """Delete expired keys in one statement; returns the number removed."""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=expiry_cutoff()).delete()
+    return deleted
@@ -0,0 +1,117 @@
+"""
+Compact JSON line-item grid.
+
+Large bills post their lines as one ``items_json`` array instead of a
+formset. The array is validated in a single pass: services are resolved
+from one cached id -> name map (one query per request, not one per row) and
+the numeric/text columns go through the BillItemImportForm field rules.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+
+from .forms import BillItemImportForm
+from .models import BillItem, Service
+
+
+MAX_LINE_ITEMS = 1000
+ITEM_FIELDS = BillItemImportForm.base_fields
+
+
+def load_service_map():
+    """{service_id: name} for every active service, from a single query."""
+    return dict(Service.objects.filter(is_active=True).values_list('id', 'name'))
+
+
+def service_choices(service_map):
+    """Static <select> choices built from the cached map (no queryset to re-evaluate)."""
+    return [('', '---------')] + list(service_map.items())
+
+
+def resolve_service(service_map, value):
+    """Map a posted service id to (id, name); raises ValidationError if unknown."""
+    if value in (None, ''):
+        return None
+    try:
+        service_id = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError('Select a valid service.')
+    if service_id not in service_map:
+        raise ValidationError('Select a valid service.')
+    return service_id, service_map[service_id]
+
+
+def _is_blank(row):
+    return not any(str(row.get(name, '') or '').strip() for name in
+                   ('service', 'hospital_service_name', 'claimed_rate', 'claimed_amount'))
+
+
+def parse_line_items(raw, files, service_map, file_prefix='grid'):
+    """
+    Validate a JSON array of line items.
+
+    Returns (items, errors): unsaved BillItem objects (without ``bill``) and
+    a list of (line_number, field, message). Blank rows are skipped, like
+    the formset path skips rows without a service.
+    """
+    try:
+        rows = json.loads(raw or '[]')
+    except ValueError:
+        return [], [(0, 'items', 'Malformed line item data.')]
+    if not isinstance(rows, list):
+        return [], [(0, 'items', 'Malformed line item data.')]
+    if len(rows) > MAX_LINE_ITEMS:
+        return [], [(0, 'items', f'A bill can have at most {MAX_LINE_ITEMS} service lines.')]
+
+    items = []
+    errors = []
+    for line_number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict) or _is_blank(row):
+            continue
+
+        cleaned = {}
+        for name, field in ITEM_FIELDS.items():
+            try:
+                cleaned[name] = field.clean(row.get(name, ''))
+            except ValidationError as e:
+                errors.append((line_number, name, '; '.join(e.messages)))
+
+        try:
+            service = resolve_service(service_map, row.get('service'))
+        except ValidationError as e:
+            errors.append((line_number, 'service', '; '.join(e.messages)))
+            continue
+        if service is None and not cleaned.get('hospital_service_name'):
+            errors.append((line_number, 'service', 'Select a service or enter the hospital service name.'))
+            continue
+        if len(cleaned) != len(ITEM_FIELDS):
+            continue
+
+        item = BillItem(**cleaned)
+        if service is not None:
+            item.service_id = service[0]
+            if not item.hospital_service_name:
+                item.hospital_service_name = service[1]
+        if not item.claimed_amount:
+            item.claimed_amount = item.claimed_rate * item.claimed_quantity
+        item.supporting_document = files.get(f'{file_prefix}-{row.get("key", line_number)}-supporting_document')
+        items.append(item)
+
+    return items, errors
+
+
+def items_as_json_rows(items):
+    """Initial grid rows for a saved draft, or for re-display after a failed post."""
+    return [
+        {
+            'key': item.pk or index,
+            'id': item.pk,
+            'service': item.service_id or '',
+            'hospital_service_name': item.hospital_service_name or '',
+            'claimed_rate': str(item.claimed_rate),
+            'claimed_quantity': item.claimed_quantity,
+            'claimed_amount': str(item.claimed_amount),
+            'description': item.description,
+        }
+        for index, item in enumerate(items)
+    ]
@@ -0,0 +1,117 @@
+"""
+Fill Bill.fingerprint for claims filed before the duplicate check existed
+and report duplicate groups.
+
+Claims without a fingerprint are walked in id order, one batch at a time:
+each batch is hashed, the fingerprints some other claim already holds are
+looked up through the unique index, and the rest are written. The oldest
+claim of a group therefore keeps the fingerprint (or the one fingerprinted
+at submission) and the later copies stay NULL, so the index is populated
+without deleting anything. Rejected claims are left without one, as they
+are on rejection.
+
+Duplicate groups are found by the database, grouping the claims on the
+same normalized key the fingerprint hashes (hospital_id, employee_id,
+ip_number, admission/discharge dates, bill_number).
+
+Usage:
+    python manage.py backfill_bill_fingerprints
+    python manage.py backfill_bill_fingerprints --dry-run
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min, Value
+from django.db.models.functions import Coalesce, Replace, Upper
+
+from hospitals.models import Bill, bill_fingerprint
+
+
+KEY_FIELDS = ('hospital_id', 'employee_id', 'ip_number', 'admission_date', 'discharge_date', 'bill_number')
+IGNORED_STATUSES = ('DRAFT', 'REJECTED')
+
+
+def _key_part(field):
+    # SQL side of models._normalize_key_part; IDs typed in a form carry spaces, not tabs
+    return Upper(Replace(Coalesce(field, Value('')), Value(' '), Value('')))
+
+
+def duplicate_groups():
+    """Groups of claims sharing a normalized key: [(queryset of the group, claim count)]."""
+    keys = {
+        'employee': _key_part('employee_id'),
+        'ip': _key_part('ip_number'),
+        'invoice': _key_part('bill_number'),
+    }
+    claims = Bill.objects.exclude(status__in=IGNORED_STATUSES)
+    columns = ('hospital_id', 'employee', 'ip', 'admission_date', 'discharge_date', 'invoice')
+    groups = (
+        claims.annotate(**keys).values(*columns)
+        .annotate(claims=Count('id'), oldest=Min('id'))
+        .filter(claims__gt=1)
+        .order_by('oldest')
+    )
+    for group in groups:
+        yield claims.alias(**keys).filter(**{name: group[name] for name in columns}), group['claims']
+
+
+class Command(BaseCommand):
+    help = 'Compute duplicate-claim fingerprints for existing bills and list duplicate groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Claims hashed and written per batch (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report duplicate groups, do not write fingerprints')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        missing = Bill.objects.exclude(status__in=IGNORED_STATUSES).filter(fingerprint__isnull=True)
+        self.stdout.write(f'{missing.count()} bills have no fingerprint.')
+
+        written = 0
+        if not dry_run:
+            last_id = 0
+            while True:
+                batch = list(
+                    missing.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', *KEY_FIELDS)[:batch_size]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                written += self._write_batch(batch)
+
+        group_count = 0
+        for claims, size in duplicate_groups():
+            group_count += 1
+            rows = list(claims.order_by('id').values_list('id', 'fingerprint'))
+            kept = next((bill_id for bill_id, fp in rows if fp), rows[0][0])
+            self.stdout.write(self.style.WARNING(
+                f'Duplicate group of {size}: bill ids {", ".join(str(bill_id) for bill_id, _ in rows)} '
+                f'(keeping {kept})'
+            ))
+
+        if dry_run:
+            self.stdout.write('Dry run - nothing written.')
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {written} fingerprints; {group_count} duplicate groups found.'
+        ))
+
+    def _write_batch(self, batch):
+        """Fingerprint one batch, skipping fingerprints already held; returns the number written."""
+        fingerprints = {}
+        for bill_id, *key in batch:
+            # Oldest copy within the batch first
+            fingerprints.setdefault(bill_fingerprint(*key), bill_id)
+        taken = set(
+            Bill.objects.filter(fingerprint__in=list(fingerprints))
+            .values_list('fingerprint', flat=True)
+        )
+        updates = [Bill(id=bill_id, fingerprint=fp) for fp, bill_id in fingerprints.items() if fp not in taken]
+        with transaction.atomic():
+            Bill.objects.bulk_update(updates, ['fingerprint'])
+        return len(updates)
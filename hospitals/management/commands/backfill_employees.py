@@ -0,0 +1,55 @@
+"""
+Build the employee/dependents registry from claims filed before it existed
+and link every claim to its Employee (and Dependent).
+
+Claims are read once in id order, in keyset batches; each batch is folded
+into the registry by hospitals.employees.register_employees (one row per
+normalized employee_id, details from the latest claim) and its links are
+written back with bulk_update. Safe to re-run.
+
+Usage:
+    python manage.py backfill_employees
+    python manage.py backfill_employees --all
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hospitals.employees import register_employees
+from hospitals.models import Bill, Dependent, Employee
+
+
+class Command(BaseCommand):
+    help = 'Populate the employee registry from existing claims and link the claims to it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Re-link every claim, not only unlinked ones')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Claims per batch (default: 2000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bills = Bill.objects.exclude(status='DRAFT').exclude(employee_id='').only(
+            'id', 'employee_id', 'patient_name', 'relationship', 'sex', 'designation',
+            'employee_type', 'credit_card_number', 'mobile_number',
+        ).order_by('id')
+        if not options['all']:
+            bills = bills.filter(employee_record__isnull=True)
+
+        linked = 0
+        last_id = 0
+        # Keyset batches in id order, so the newest claim's details win
+        while True:
+            batch = list(bills.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                register_employees(batch)
+                Bill.objects.bulk_update(batch, ['employee_record', 'dependent'], batch_size=500)
+            linked += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Linked {linked} claims; registry has {Employee.objects.count()} employees '
+            f'and {Dependent.objects.count()} dependents.'
+        ))
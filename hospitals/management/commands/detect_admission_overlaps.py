@@ -0,0 +1,43 @@
+"""
+Nightly sweep for patients admitted at two hospitals over overlapping dates.
+
+Walks the employee registry in keyset batches; each batch reads its
+employees' claims as admission intervals sorted by date, flags every
+cross-hospital overlap and drops flags that no longer hold (e.g. after a
+rejection or a corrected date). Claims must be linked to the registry
+first (manage.py backfill_employees).
+
+Usage, e.g. from cron:
+    python manage.py detect_admission_overlaps
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hospitals.models import AdmissionOverlap, Employee
+from hospitals.overlaps import sweep_overlaps
+
+
+class Command(BaseCommand):
+    help = 'Flag claims of the same patient with overlapping admissions at different hospitals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Employees per batch (default: 500)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        flagged = 0
+        last_id = 0
+        while True:
+            employee_ids = list(
+                Employee.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not employee_ids:
+                break
+            with transaction.atomic():
+                flagged += sweep_overlaps(employee_ids)
+            last_id = employee_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{flagged} new overlap flags; {AdmissionOverlap.objects.count()} flags in total.'
+        ))
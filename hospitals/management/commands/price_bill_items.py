@@ -0,0 +1,53 @@
+"""
+Price the line items of claims submitted before the pricing engine existed
+(or all of them with --all, e.g. after a tariff revision).
+
+Items are read in batches per hospital tier against the in-memory tariff
+matrix and written back with bulk_update; drafts are skipped, they are
+priced when submitted.
+
+Usage:
+    python manage.py price_bill_items
+    python manage.py price_bill_items --all
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hospitals.models import BillItem
+from hospitals.pricing import TariffMatrix, price_saved_items
+
+
+class Command(BaseCommand):
+    help = 'Compute tariff allowable rate, excess and suggested rate for submitted bill items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Re-price every item, not only unpriced ones')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Items per bulk_update batch (default: 2000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        tariff = TariffMatrix.load()
+
+        items = BillItem.objects.exclude(bill__status='DRAFT').only(
+            'id', 'service', 'claimed_rate', 'claimed_quantity', 'claimed_amount'
+        ).order_by('id')
+        if not options['all']:
+            items = items.filter(suggested_rate__isnull=True)
+
+        priced = 0
+        for tier in TariffMatrix.TIER_COLUMNS:
+            tier_items = items.filter(bill__hospital__tier=tier)
+            last_id = 0
+            # Keyset batches: safe to write while walking the table, on every backend
+            while True:
+                batch = list(tier_items.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                with transaction.atomic():
+                    price_saved_items(batch, tier, tariff)
+                priced += len(batch)
+                last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Priced {priced} bill items.'))
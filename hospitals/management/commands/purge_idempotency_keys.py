@@ -0,0 +1,17 @@
+"""
+Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS.
+
+Meant to run from cron, e.g. hourly:
+    python manage.py purge_idempotency_keys
+"""
+from django.core.management.base import BaseCommand
+
+from hospitals.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Remove expired form idempotency keys'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Removed {deleted} expired idempotency keys.'))
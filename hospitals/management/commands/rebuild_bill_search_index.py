@@ -0,0 +1,43 @@
+"""
+Rebuild the claim search index from the Bill table.
+
+Needed once after the index is introduced (existing claims are not indexed
+until then) and whenever it has drifted, e.g. after raw SQL updates or
+queryset.update() calls that bypass Bill.save().
+
+Usage:
+    python manage.py rebuild_bill_search_index
+    python manage.py rebuild_bill_search_index --batch-size 5000
+"""
+from django.core.management.base import BaseCommand
+
+from hospitals.models import BILL_SEARCH_FIELDS, Bill
+from hospitals.search import clear_index, index_bills, uses_fts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the claim search index (FTS5 on SQLite, token table elsewhere)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Bills indexed per batch (default: 2000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        backend = 'SQLite FTS5' if uses_fts() else 'token table'
+        self.stdout.write(f'Rebuilding claim search index ({backend})...')
+
+        clear_index()
+        bills = Bill.objects.order_by('id').only('id', *BILL_SEARCH_FIELDS)
+        batch = []
+        indexed = 0
+        for bill in bills.iterator(chunk_size=batch_size):
+            batch.append(bill)
+            if len(batch) >= batch_size:
+                index_bills(batch)
+                indexed += len(batch)
+                batch = []
+        index_bills(batch)
+        indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} bills.'))
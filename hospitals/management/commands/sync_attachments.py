@@ -0,0 +1,42 @@
+"""
+Rebuild the claim attachment index (hospitals/attachments.py) from the
+claims' file columns.
+
+The migration fills it once; run this whenever it has drifted, e.g. after
+raw SQL or queryset.update() calls on file columns, which bypass the sync.
+Claims are walked in keyset batches, each synced in its own transaction.
+
+Usage:
+    python manage.py sync_attachments
+    python manage.py sync_attachments --batch-size 2000
+"""
+from django.core.management.base import BaseCommand
+
+from hospitals.attachments import sync_attachments
+from hospitals.models import Bill, BillAttachment
+
+
+class Command(BaseCommand):
+    help = 'Bring the claim attachment index in line with the claim file columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Claims synced per batch (default: 500)')
+
+    def handle(self, *args, **options):
+        synced = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Bill.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]
+            sync_attachments(batch)
+            synced += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Synced {synced} claims; {BillAttachment.objects.count()} attachments indexed.'
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0005_alter_bill_sex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
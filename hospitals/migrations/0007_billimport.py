@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('hospitals', '0006_bill_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('total_rows', models.PositiveIntegerField(default=0)),
+                ('claims_created', models.PositiveIntegerField(default=0)),
+                ('claims_failed', models.PositiveIntegerField(default=0)),
+                ('error_report', models.FileField(blank=True, null=True, upload_to='bill_imports/reports/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bill_imports', to='hospitals.hospital')),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
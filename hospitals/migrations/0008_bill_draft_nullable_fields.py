@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0007_billimport'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bill',
+            name='admission_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='bill',
+            name='age',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='bill',
+            name='discharge_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='bill',
+            name='scheme',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='claims', to='hospitals.scheme'),
+        ),
+    ]
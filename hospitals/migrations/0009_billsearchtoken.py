@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:17
+
+from django.db import DatabaseError, migrations, models, transaction
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    # SQLite uses an FTS5 table instead of BillSearchToken when it is available
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE hospitals_bill_fts USING fts5("
+                "patient_name, employee_id, ip_number, bill_number, tgnpdcl_id, claim_id, "
+                "prefix='2 3 4')"
+            )
+    except DatabaseError:
+        # SQLite built without FTS5: search falls back to the token table
+        pass
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS hospitals_bill_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0008_bill_draft_nullable_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('token', models.CharField(max_length=64)),
+                ('bill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='hospitals.bill')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'field', 'bill'], name='bill_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
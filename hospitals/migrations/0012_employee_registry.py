@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0011_billitem_pricing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_id', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('designation', models.CharField(blank=True, max_length=100)),
+                ('employee_type', models.CharField(blank=True, max_length=30)),
+                ('credit_card_number', models.CharField(blank=True, max_length=50)),
+                ('mobile_number', models.CharField(blank=True, max_length=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['employee_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Dependent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('sex', models.CharField(blank=True, max_length=10)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dependents', to='hospitals.employee')),
+            ],
+            options={
+                'ordering': ['name'],
+                'unique_together': {('employee', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='dependent',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claims', to='hospitals.dependent'),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='employee_record',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='claims', to='hospitals.employee'),
+        ),
+    ]
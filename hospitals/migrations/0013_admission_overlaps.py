@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0012_employee_registry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionOverlap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('overlap_days', models.PositiveIntegerField()),
+                ('detected_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['employee_record', 'admission_date', 'discharge_date'], name='bill_emp_admission_idx'),
+        ),
+        migrations.AddField(
+            model_name='admissionoverlap',
+            name='bill',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='admission_overlaps', to='hospitals.bill'),
+        ),
+        migrations.AddField(
+            model_name='admissionoverlap',
+            name='other_bill',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='hospitals.bill'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='admissionoverlap',
+            unique_together={('bill', 'other_bill')},
+        ),
+    ]
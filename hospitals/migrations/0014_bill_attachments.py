@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+
+def index_attachments(apps, schema_editor):
+    # Same mapping as hospitals/attachments.py, on the historical models
+    Bill = apps.get_model('hospitals', 'Bill')
+    BillItem = apps.get_model('hospitals', 'BillItem')
+    BillDocument = apps.get_model('hospitals', 'BillDocument')
+    SanctionOrder = apps.get_model('hospitals', 'SanctionOrder')
+    BillAttachment = apps.get_model('hospitals', 'BillAttachment')
+    document_types = dict(BillDocument._meta.get_field('document_type').flatchoices)
+    sources = [
+        ('ID_CARD', Bill, 'id_card_file', 'id', None),
+        ('CC_CARD', Bill, 'cc_card_file', 'id', None),
+        ('DISCHARGE_SUMMARY', Bill, 'discharge_summary_file', 'id', None),
+        ('ITEM', BillItem, 'supporting_document', 'bill_id', 'service__name'),
+        ('DOCUMENT', BillDocument, 'file', 'bill_id', 'document_type'),
+        ('SANCTION_ORDER', SanctionOrder, 'pdf_file', 'bill_id', 'order_number'),
+    ]
+
+    last_id = 0
+    while True:
+        bill_ids = list(Bill.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not bill_ids:
+            break
+        last_id = bill_ids[-1]
+        rows = []
+        for kind, model, column, bill_column, label_column in sources:
+            values = [bill_column, 'pk', column] + ([label_column] if label_column else [])
+            found = (
+                model.objects.filter(**{f'{bill_column}__in': bill_ids})
+                .exclude(**{column: ''}).exclude(**{f'{column}__isnull': True})
+                .values_list(*values)
+            )
+            for bill_id, pk, name, *label in found:
+                label = label[0] if label else ''
+                if kind == 'DOCUMENT':
+                    label = document_types.get(label, label)
+                rows.append(BillAttachment(
+                    bill_id=bill_id, kind=kind, source_id=0 if model is Bill else pk,
+                    name=name, label=(label or '')[:255],
+                ))
+        BillAttachment.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0013_admission_overlaps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ID_CARD', 'ID Card'), ('CC_CARD', 'CC Card'), ('DISCHARGE_SUMMARY', 'Discharge Summary'), ('ITEM', 'Supporting Document'), ('DOCUMENT', 'Bill Document'), ('SANCTION_ORDER', 'Sanction Order')], max_length=20)),
+                ('source_id', models.PositiveBigIntegerField(default=0)),
+                ('name', models.CharField(max_length=255)),
+                ('label', models.CharField(blank=True, max_length=255)),
+                ('bill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='hospitals.bill')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='billattachment',
+            constraint=models.UniqueConstraint(fields=('bill', 'kind', 'source_id'), name='bill_attachment_kind_uniq'),
+        ),
+        migrations.RunPython(index_attachments, migrations.RunPython.noop),
+    ]
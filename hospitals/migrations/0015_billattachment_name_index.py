@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0014_bill_attachments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='billattachment',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 from django.utils import timezone
+import hashlib
 import uuid
 
 class Hospital(models.Model):
@@ -61,6 +63,17 @@ class Service(models.Model):
     class Meta:
         ordering = ['name']
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Imported here: pricing.py needs the models defined in this module
+        from .pricing import invalidate_tariff
+        invalidate_tariff()
+
+    def delete(self, *args, **kwargs):
+        from .pricing import invalidate_tariff
+        invalidate_tariff()
+        return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name} ({self.code})" if self.code else self.name
 
@@ -76,6 +89,78 @@ class Scheme(models.Model):
     def __str__(self):
         return self.name
 
+def _normalize_key_part(value):
+    """Uppercase and strip all whitespace so '  ip 12 ' and 'IP12' match."""
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return ''.join(str(value).split()).upper()
+
+
+def bill_fingerprint(hospital_id, employee_id, ip_number, admission_date, discharge_date, bill_number):
+    """
+    Normalized duplicate-claim fingerprint.
+    Takes plain values so the backfill command can hash rows straight
+    from values_list() without building Bill instances.
+    """
+    parts = [
+        str(hospital_id or ''),
+        _normalize_key_part(employee_id),
+        _normalize_key_part(ip_number),
+        _normalize_key_part(admission_date),
+        _normalize_key_part(discharge_date),
+        _normalize_key_part(bill_number),
+    ]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def normalize_employee_id(value):
+    """Registry key for an employee ID: 'e 100 ' and 'E100' are the same employee."""
+    return _normalize_key_part(value)
+
+
+class Employee(models.Model):
+    """
+    Employee registry, one row per employee_id (see hospitals/employees.py).
+    Details follow the latest submitted claim; each Bill keeps its own copy
+    as filed.
+    """
+    employee_id = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=255, blank=True)
+    designation = models.CharField(max_length=100, blank=True)
+    employee_type = models.CharField(max_length=30, blank=True)
+    credit_card_number = models.CharField(max_length=50, blank=True)
+    mobile_number = models.CharField(max_length=15, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['employee_id']
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.name}" if self.name else self.employee_id
+
+
+class Dependent(models.Model):
+    """A family member claims have been filed for under an employee."""
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='dependents')
+    name = models.CharField(max_length=255)
+    sex = models.CharField(max_length=10, blank=True)
+
+    class Meta:
+        ordering = ['name']
+        unique_together = ['employee', 'name']
+
+    def __str__(self):
+        return f"{self.name} ({self.employee.employee_id})"
+
+
+# Bill columns covered by the claim search index (see hospitals/search.py)
+BILL_SEARCH_FIELDS = ('patient_name', 'employee_id', 'ip_number', 'bill_number', 'tgnpdcl_id', 'claim_id')
+
+
 class Bill(models.Model):
     STATUS_CHOICES = (
         ('DRAFT', 'Draft'),
@@ -116,10 +201,13 @@ class Bill(models.Model):
         related_name='claims'
     )
 
+    # scheme, age and the admission dates are nullable only so a DRAFT can
+    # be saved half-filled; BillForm still requires them for submission.
     scheme = models.ForeignKey(
         Scheme,
         on_delete=models.PROTECT,
-        related_name='claims'
+        related_name='claims',
+        null=True
     )
 
     patient_name = models.CharField(max_length=255)
@@ -139,14 +227,33 @@ class Bill(models.Model):
     credit_card_number = models.CharField(max_length=50)
     ip_number = models.CharField(max_length=50)
 
+    # Registry links, set when the claim is submitted (see hospitals/employees.py).
+    # Named employee_record because employee_id is the typed ID above.
+    employee_record = models.ForeignKey(
+        Employee,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='claims'
+    )
+    dependent = models.ForeignKey(
+        Dependent,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='claims'
+    )
+
     mobile_number = models.CharField(max_length=15)
-    age = models.PositiveIntegerField()
+    age = models.PositiveIntegerField(null=True)
     sex = models.CharField(max_length=10, choices=SEX_CHOICES)
 
     disease_details = models.TextField()
 
-    admission_date = models.DateField()
-    discharge_date = models.DateField()
+    admission_date = models.DateField(null=True)
+    discharge_date = models.DateField(null=True)
     
     gross_claimed_amount = models.DecimalField(
         max_digits=14,
@@ -186,6 +293,40 @@ class Bill(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name='created_bills')
 
+    # Duplicate-claim guard (see bill_fingerprint). NULL for drafts, for
+    # rejected claims (so a corrected copy can be filed) and for historical
+    # duplicates left behind by the backfill command.
+    fingerprint = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    def compute_fingerprint(self):
+        return bill_fingerprint(
+            self.hospital_id,
+            self.employee_id,
+            self.ip_number,
+            self.admission_date,
+            self.discharge_date,
+            self.bill_number,
+        )
+
+    def save(self, *args, **kwargs):
+        # The fingerprint is taken once, when a non-draft claim is inserted.
+        # Later status saves leave it alone so backfilled duplicates (NULL)
+        # never collide with the claim they duplicate.
+        if self._state.adding and self.fingerprint is None and self.status not in ('DRAFT', 'REJECTED'):
+            self.fingerprint = self.compute_fingerprint()
+        update_fields = kwargs.get('update_fields')
+        if self.status == 'REJECTED' and self.fingerprint is not None:
+            # A rejected claim no longer blocks its corrected resubmission
+            self.fingerprint = None
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = list(update_fields) + ['fingerprint']
+        super().save(*args, **kwargs)
+
+        if update_fields is None or set(update_fields) & set(BILL_SEARCH_FIELDS):
+            # Imported here: search.py needs the models defined in this module
+            from .search import index_bills
+            index_bills([self])
+
     def submit_claim(self):
         self.status = 'SUBMITTED'
         self.submitted_at = timezone.now()
@@ -194,6 +335,12 @@ class Bill(models.Model):
     def __str__(self):
         return f"Claim {self.claim_id} - {self.bill_number}"
 
+    class Meta:
+        # Per-employee admission intervals, sorted by start (see hospitals/overlaps.py)
+        indexes = [
+            models.Index(fields=['employee_record', 'admission_date', 'discharge_date'], name='bill_emp_admission_idx'),
+        ]
+
 class BillItem(models.Model):
     """Individual service claim in a bill."""
     bill = models.ForeignKey(Bill, related_name='items', on_delete=models.CASCADE)
@@ -208,6 +355,11 @@ class BillItem(models.Model):
     approved_rate = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     approved_quantity = models.PositiveIntegerField(null=True, blank=True)
     approved_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    # Tariff check, computed once at submission (see hospitals/pricing.py)
+    allowable_rate = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    excess_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
+    suggested_rate = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
     
     supporting_document = models.FileField(upload_to='bills/supporting_docs/', blank=True, null=True)
     comments = models.TextField(blank=True)
@@ -285,4 +437,119 @@ class SanctionOrder(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Sanction Order {self.order_number}"
\ No newline at end of file
+        return f"Sanction Order {self.order_number}"
+
+
+class BillAttachment(models.Model):
+    """
+    One file of a claim, whichever column holds it: an index of the claim's
+    file columns kept in step by hospitals/attachments.py, so the files of a
+    page of claims are read with one query. The columns stay the source of truth.
+    """
+    KIND_CHOICES = (
+        ('ID_CARD', 'ID Card'),
+        ('CC_CARD', 'CC Card'),
+        ('DISCHARGE_SUMMARY', 'Discharge Summary'),
+        ('ITEM', 'Supporting Document'),
+        ('DOCUMENT', 'Bill Document'),
+        ('SANCTION_ORDER', 'Sanction Order'),
+    )
+
+    bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name='attachments')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # BillItem / BillDocument / SanctionOrder row holding the file; 0 for the bill's own columns
+    source_id = models.PositiveBigIntegerField(default=0)
+    # Indexed for lookups by stored file (documents/direct.py)
+    name = models.CharField(max_length=255, db_index=True)
+    label = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        # Its index also serves the (bill, kind) lookups
+        constraints = [
+            models.UniqueConstraint(fields=['bill', 'kind', 'source_id'], name='bill_attachment_kind_uniq'),
+        ]
+
+    @property
+    def url(self):
+        return default_storage.url(self.name)
+
+    @property
+    def filename(self):
+        return self.name.rsplit('/', 1)[-1]
+
+    @property
+    def display_name(self):
+        return self.label or self.get_kind_display()
+
+    def __str__(self):
+        return f"{self.bill_id} {self.kind}: {self.name}"
+
+
+class BillImport(models.Model):
+    """One bulk spreadsheet upload by a hospital and its outcome."""
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='bill_imports')
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    file_name = models.CharField(max_length=255)
+
+    total_rows = models.PositiveIntegerField(default=0)
+    claims_created = models.PositiveIntegerField(default=0)
+    claims_failed = models.PositiveIntegerField(default=0)
+    error_report = models.FileField(upload_to='bill_imports/reports/', blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.file_name} ({self.claims_created} created, {self.claims_failed} failed)"
+
+
+class BillSearchToken(models.Model):
+    """
+    Portable claim search index: one row per normalized token of a searchable
+    Bill field. Used where SQLite FTS5 is not available (e.g. Oracle 11g);
+    prefix lookups are range scans on the (token, field, bill) index.
+    """
+    bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name='search_tokens')
+    field = models.CharField(max_length=20)
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [models.Index(fields=['token', 'field', 'bill'], name='bill_search_token_idx')]
+
+    def __str__(self):
+        return f"{self.field}:{self.token}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    One-time token of a submitted form (see hospitals/idempotency.py).
+    A replayed POST with the same key is answered with the stored redirect.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    scope = models.CharField(max_length=50)
+    response_url = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+class AdmissionOverlap(models.Model):
+    """
+    Flag: the same patient is admitted at another hospital over overlapping
+    dates. Stored once per direction so each claim lists its own flags
+    (see hospitals/overlaps.py).
+    """
+    bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name='admission_overlaps')
+    other_bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name='+')
+    overlap_days = models.PositiveIntegerField()
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['bill', 'other_bill']
+
+    def __str__(self):
+        return f"{self.bill_id} overlaps {self.other_bill_id} ({self.overlap_days} days)"
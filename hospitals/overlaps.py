@@ -0,0 +1,82 @@
+"""
+Cross-hospital overlapping-admission detection.
+
+A patient (an employee, or one of their dependents) cannot be admitted at
+two hospitals over the same nights. Claims are read per employee as
+admission intervals sorted by admission date, straight off the
+(employee_record, admission_date, discharge_date) index, so checking a
+claim is one index seek plus a walk over that employee's own claims. A
+sweep over the sorted intervals yields every overlapping pair.
+
+A discharge and an admission on the same day (a transfer) is not an
+overlap. Overlaps within one hospital are left to the duplicate-claim
+guard. Flags are AdmissionOverlap rows, one per direction; submission adds
+them and the nightly ``manage.py detect_admission_overlaps`` sweep also
+drops flags whose claims no longer overlap.
+"""
+from .employees import create_missing
+from .models import AdmissionOverlap, Bill
+
+
+IGNORED_STATUSES = ('DRAFT', 'REJECTED')
+
+
+def _intervals(employee_ids):
+    return (
+        Bill.objects.filter(
+            employee_record_id__in=employee_ids,
+            admission_date__isnull=False,
+            discharge_date__isnull=False,
+        )
+        .exclude(status__in=IGNORED_STATUSES)
+        .order_by('employee_record_id', 'admission_date', 'discharge_date', 'id')
+        .values_list('id', 'employee_record_id', 'dependent_id', 'hospital_id', 'admission_date', 'discharge_date')
+    )
+
+
+def find_overlaps(intervals):
+    """
+    Yield (bill_id, other_bill_id, overlap_days) in both directions for
+    intervals sorted by employee and admission date.
+    """
+    current_employee = None
+    active = {}  # dependent_id (None for the employee) -> intervals still open at the sweep position
+    for bill_id, employee_id, dependent_id, hospital_id, start, end in intervals:
+        if employee_id != current_employee:
+            current_employee, active = employee_id, {}
+        still_open = [interval for interval in active.get(dependent_id, []) if interval[3] > start]
+        for other_id, other_hospital, _, other_end in still_open:
+            if other_hospital != hospital_id:
+                days = (min(end, other_end) - start).days
+                yield bill_id, other_id, days
+                yield other_id, bill_id, days
+        still_open.append((bill_id, hospital_id, start, end))
+        active[dependent_id] = still_open
+
+
+def _store(pairs, employee_ids, prune):
+    stored = AdmissionOverlap.objects.filter(bill__employee_record_id__in=employee_ids)
+    existing = set(stored.values_list('bill_id', 'other_bill_id'))
+    found = {(bill_id, other_id): days for bill_id, other_id, days in pairs}
+    create_missing(AdmissionOverlap, [
+        AdmissionOverlap(bill_id=bill_id, other_bill_id=other_id, overlap_days=days)
+        for (bill_id, other_id), days in found.items() if (bill_id, other_id) not in existing
+    ])
+    if prune:
+        stale = existing - found.keys()
+        for bill_id, other_id in stale:
+            stored.filter(bill_id=bill_id, other_bill_id=other_id).delete()
+    return len(found.keys() - existing)
+
+
+def flag_overlaps(bills):
+    """Flag overlaps of just-submitted bills; returns the number of new flags."""
+    employee_ids = {bill.employee_record_id for bill in bills if bill.employee_record_id}
+    if not employee_ids:
+        return 0
+    return _store(find_overlaps(_intervals(employee_ids)), employee_ids, prune=False)
+
+
+def sweep_overlaps(employee_ids):
+    """Re-check every claim of the given employees: add new flags, drop stale ones."""
+    return _store(find_overlaps(_intervals(employee_ids)), employee_ids, prune=True)
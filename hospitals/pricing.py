@@ -0,0 +1,111 @@
+"""
+Claim pricing against the Service tariff.
+
+The tariff matrix (service x hospital tier) is read with one query and
+kept in memory for TARIFF_CACHE_SECONDS. Saving or deleting a Service drops
+it and bumps a version key in the default cache; every worker compares that
+key on read and reloads as soon as it moves. With a cache shared by the
+workers (see CACHES in settings) a tariff edit is therefore seen everywhere
+at once; with the per-process default, other workers keep the old rates for
+up to TARIFF_CACHE_SECONDS. price_items() runs over all lines of a claim in one pass and stores on
+each item:
+
+* allowable_rate - the tariff rate for the hospital's tier (None if the line
+  has no tariffed service)
+* excess_amount  - claimed amount above allowable_rate x quantity
+* suggested_rate - the claimed rate capped at the tariff, offered to
+  officers as the approved rate
+
+Tier-III hospitals have no rate column of their own and are priced at the
+Tier-II rate.
+"""
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import BillItem, Service
+
+
+TARIFF_CACHE_SECONDS = 300
+TARIFF_VERSION_KEY = 'hospitals:tariff-version'
+PRICING_FIELDS = ['allowable_rate', 'excess_amount', 'suggested_rate']
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+_cache = {'matrix': None, 'loaded_at': 0.0, 'version': None}
+
+
+class TariffMatrix:
+    """In-memory {(service_id, tier): rate} built from a single Service query."""
+
+    TIER_COLUMNS = {'TIER1': 0, 'TIER2': 1, 'TIER3': 1}
+
+    def __init__(self, rows):
+        self.rates = {}
+        for service_id, *tier_rates in rows:
+            for tier, column in self.TIER_COLUMNS.items():
+                rate = tier_rates[column]
+                # A zero base rate means the service is not tariffed for that tier
+                if rate:
+                    self.rates[(service_id, tier)] = rate
+
+    @classmethod
+    def load(cls):
+        return cls(Service.objects.values_list('id', 'base_rate_tier1', 'base_rate_tier2'))
+
+    def rate(self, service_id, tier):
+        return self.rates.get((service_id, tier))
+
+
+def get_tariff():
+    """The cached tariff matrix, reloaded after TARIFF_CACHE_SECONDS or once the tariff version moves."""
+    now = time.monotonic()
+    # Read before loading: a change committed meanwhile leaves the version behind, forcing a reload
+    version = cache.get(TARIFF_VERSION_KEY)
+    if (_cache['matrix'] is None or version != _cache['version']
+            or now - _cache['loaded_at'] > TARIFF_CACHE_SECONDS):
+        _cache['matrix'] = TariffMatrix.load()
+        _cache['loaded_at'] = now
+        _cache['version'] = version
+    return _cache['matrix']
+
+
+def invalidate_tariff():
+    """Drop this worker's matrix now and, once the change commits, every other worker's."""
+    _cache['matrix'] = None
+    transaction.on_commit(lambda: cache.set(TARIFF_VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+def _claimed_rate(item):
+    """Effective claimed rate; lines entered with only an amount are divided out."""
+    if item.claimed_rate:
+        return item.claimed_rate
+    if item.claimed_amount and item.claimed_quantity:
+        return (item.claimed_amount / item.claimed_quantity).quantize(CENT)
+    return ZERO
+
+
+def price_items(items, tier, tariff=None):
+    """Fill the pricing fields of every item in place (nothing is saved)."""
+    tariff = tariff or get_tariff()
+    for item in items:
+        claimed_rate = _claimed_rate(item)
+        allowable = tariff.rate(item.service_id, tier) if item.service_id else None
+        item.allowable_rate = allowable
+        if allowable is None:
+            item.excess_amount = None
+            item.suggested_rate = claimed_rate
+            continue
+        item.excess_amount = max((item.claimed_amount or ZERO) - allowable * item.claimed_quantity, ZERO)
+        item.suggested_rate = min(claimed_rate, allowable)
+    return items
+
+
+def price_saved_items(items, tier, tariff=None):
+    """Price already-saved items and write the results with one bulk UPDATE."""
+    price_items(items, tier, tariff)
+    BillItem.objects.bulk_update(items, PRICING_FIELDS, batch_size=500)
+    return items
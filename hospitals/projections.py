@@ -0,0 +1,116 @@
+"""
+List projections: read only the columns a list page shows.
+
+A ListProjection declares the columns of one list (joined columns as ORM
+paths, e.g. ``'bill__employee_id'``) and turns a queryset into a lazy
+``values_list()`` query that yields small ``__slots__`` row objects instead
+of model instances. The result is still a QuerySet, so ``.count()``,
+slicing and ``{% if rows %}`` work as before, but TextFields (CLOBs on
+Oracle) and other unused columns are never fetched.
+
+Rows offer the bits of the model API that list templates use:
+``get_<column>_display`` for choice columns and ``<column>_url`` for file
+columns. ``extra`` names further attributes, None until the view fills
+them in (e.g. ``attachments``, see hospitals/attachments.py).
+"""
+from django.db import models
+from django.db.models.query import ValuesListIterable
+
+from .models import Bill
+
+
+class ListRow:
+    """Base for generated row classes; values are assigned in column order."""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        for name in self.__slots__[len(values):]:
+            setattr(self, name, None)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {getattr(self, "id", "")}>'
+
+
+class RowIterable(ValuesListIterable):
+    row_class = None
+
+    def __iter__(self):
+        row_class = self.row_class
+        for values in super().__iter__():
+            yield row_class(*values)
+
+
+def _resolve_field(model, path):
+    field = None
+    for part in path.split('__'):
+        field = model._meta.get_field(part)
+        model = field.related_model
+    return field
+
+
+def _display_method(attr, choices):
+    def get_display(self):
+        value = getattr(self, attr)
+        return choices.get(value, value)
+    return get_display
+
+
+def _url_property(attr, storage):
+    def url(self):
+        name = getattr(self, attr)
+        return storage.url(name) if name else ''
+    return property(url)
+
+
+class ListProjection:
+    """
+    The columns one list page needs.
+
+    ``columns`` holds ORM paths; a path is exposed on the row with ``__``
+    replaced by ``_`` unless given as an ``(attr, path)`` pair.
+    """
+
+    def __init__(self, name, model, columns, extra=()):
+        self.model = model
+        self.paths = []
+        slots = []
+        attrs = {}
+        for column in columns:
+            attr, path = column if isinstance(column, tuple) else (column.replace('__', '_'), column)
+            field = _resolve_field(model, path)
+            slots.append(attr)
+            self.paths.append(path)
+            if field.choices:
+                attrs[f'get_{attr}_display'] = _display_method(attr, dict(field.flatchoices))
+            if isinstance(field, models.FileField):
+                attrs[f'{attr}_url'] = _url_property(attr, field.storage)
+        attrs['__slots__'] = tuple(slots) + tuple(extra)
+        self.row_class = type(name, (ListRow,), attrs)
+        self.iterable_class = type(f'{name}Iterable', (RowIterable,), {'row_class': self.row_class})
+
+    def apply(self, queryset):
+        """Lazy queryset of row objects carrying only the declared columns."""
+        rows = queryset.values_list(*self.paths)
+        rows._iterable_class = self.iterable_class
+        return rows
+
+
+# bill_list and the hospital dashboard
+BILL_LIST = ListProjection('BillListRow', Bill, [
+    'id',
+    'claim_id',
+    'patient_name',
+    'employee_id',
+    'ip_number',
+    'credit_card_number',
+    'bill_number',
+    'bill_date',
+    'admission_date',
+    'discharge_date',
+    'gross_claimed_amount',
+    'gross_approved_amount',
+    'status',
+    'submitted_at',
+])
@@ -0,0 +1,154 @@
+"""
+Indexed claim search.
+
+The searchable Bill fields (BILL_SEARCH_FIELDS) are normalized into
+upper-case alphanumeric tokens. Every query term is matched as a token
+prefix and all terms must match. There are two index backends, picked per
+database:
+
+* SQLite with FTS5: the ``hospitals_bill_fts`` virtual table, one column
+  per field and rowid = bill id, queried with ``MATCH``.
+* Everything else (Oracle 11g): the BillSearchToken table, where a prefix
+  is a range scan ``token >= 'RAV' AND token < 'RAW'`` on its index.
+
+Both only narrow a queryset by bill id, so the caller's own role scoping
+(hospital, approval steps) still applies.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import BILL_SEARCH_FIELDS, BillSearchToken
+
+
+FTS_TABLE = 'hospitals_bill_fts'
+MAX_TERMS = 8
+MAX_TOKEN_LENGTH = 64
+# Matched from the start of the whole value only (a UUID's inner groups are noise)
+WHOLE_VALUE_FIELDS = ('claim_id',)
+
+_WORD_RE = re.compile(r'[A-Z0-9]+')
+_fts_available = {}
+
+
+def _words(value):
+    return _WORD_RE.findall(str(value).upper())
+
+
+def field_tokens(field, value):
+    """
+    Index tokens for one field value: every word plus the words run
+    together, so 'IP/2024/117' is found by 'ip', '2024', 'ip2024' or 'IP/2024'.
+    """
+    if value in (None, ''):
+        return set()
+    words = _words(value)
+    if not words:
+        return set()
+    compact = ''.join(words)[:MAX_TOKEN_LENGTH]
+    if field in WHOLE_VALUE_FIELDS:
+        return {compact}
+    return {word[:MAX_TOKEN_LENGTH] for word in words} | {compact}
+
+
+def query_terms(query):
+    """Whitespace-separated search terms with punctuation dropped ('3f2a-11' -> '3F2A11')."""
+    terms = []
+    for part in str(query or '').split():
+        term = ''.join(_words(part))[:MAX_TOKEN_LENGTH]
+        if term and term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def uses_fts():
+    """True when the default database is SQLite and the FTS5 table exists."""
+    if connection.vendor != 'sqlite':
+        return False
+    key = connection.settings_dict['NAME']
+    if key not in _fts_available:
+        _fts_available[key] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available[key]
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def index_bills(bills):
+    """(Re)write the index entries of the given saved bills in one batch."""
+    bills = [bill for bill in bills if bill.pk is not None]
+    if not bills:
+        return
+    ids = [bill.pk for bill in bills]
+
+    if uses_fts():
+        columns = ', '.join(BILL_SEARCH_FIELDS)
+        placeholders = ', '.join(['%s'] * (len(BILL_SEARCH_FIELDS) + 1))
+        rows = [
+            [bill.pk] + [' '.join(sorted(field_tokens(name, getattr(bill, name)))) for name in BILL_SEARCH_FIELDS]
+            for bill in bills
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            for chunk in _chunks(ids, 500):
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(chunk))})', chunk
+                )
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES ({placeholders})', rows)
+        return
+
+    tokens = [
+        BillSearchToken(bill_id=bill.pk, field=name, token=token)
+        for bill in bills
+        for name in BILL_SEARCH_FIELDS
+        for token in field_tokens(name, getattr(bill, name))
+    ]
+    with transaction.atomic():
+        BillSearchToken.objects.filter(bill_id__in=ids).delete()
+        BillSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+def clear_index():
+    """Drop every index entry (before a full rebuild)."""
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        BillSearchToken.objects.all().delete()
+
+
+def _prefix_end(term):
+    """Smallest string greater than every string starting with ``term``."""
+    return term[:-1] + chr(ord(term[-1]) + 1)
+
+
+def search_bills(queryset, query, field=None, bill_lookup='pk'):
+    """
+    Narrow ``queryset`` to claims matching every term of ``query``.
+
+    ``field`` limits the match to one of BILL_SEARCH_FIELDS; ``bill_lookup``
+    is the path to the bill id on the queryset's model ('bill' for
+    SanctionRequest). A query without terms returns the queryset unchanged.
+    """
+    if field is not None and field not in BILL_SEARCH_FIELDS:
+        raise ValueError(f'{field} is not a searchable claim field')
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+    lookup = f'{bill_lookup}__in'
+
+    if uses_fts():
+        column = f'{field} : ' if field else ''
+        expression = ' AND '.join(f'{column}"{term}"*' for term in terms)
+        return queryset.filter(**{
+            lookup: RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+        })
+
+    for term in terms:
+        tokens = BillSearchToken.objects.filter(token__gte=term, token__lt=_prefix_end(term))
+        if field:
+            tokens = tokens.filter(field=field)
+        queryset = queryset.filter(**{lookup: tokens.values('bill_id')})
+    return queryset
@@ -0,0 +1,518 @@
+import io
+import json
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from workflow.models import SanctionRequest, WorkflowStep
+from .attachments import attachments_for, sync_attachments
+from .bulk_upload import import_claims
+from .employees import claim_history, register_employees
+from .line_items import load_service_map, parse_line_items
+from .models import (
+    AdmissionOverlap, Bill, BillAttachment, BillDocument, BillItem, Hospital, Scheme, Service, bill_fingerprint,
+)
+from .overlaps import flag_overlaps
+from .pricing import TARIFF_VERSION_KEY, get_tariff, price_items
+from .projections import BILL_LIST, ListProjection
+from .search import search_bills
+
+
+# Pages render without a collected static manifest
+PAGE_STORAGES = {
+    'default': {'BACKEND': 'documents.blobs.DedupFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def hospital_user(code):
+    hospital = Hospital.objects.create(name=f'Hospital {code}', code=code, tier='TIER1')
+    user = User.objects.create_user(f'user-{code}', password='pw')
+    UserProfile.objects.create(user=user, role='HOSPITAL', hospital=hospital)
+    return hospital, user
+
+
+def claim_fields():
+    return dict(
+        patient_name='Ravi', designation='AE', employee_id='E100', employee_type='EMPLOYEE',
+        relationship='SELF', credit_card_number='CC1', ip_number='IP1', mobile_number='999',
+        age=40, sex='Male', disease_details='fever', bill_number='INV1',
+        admission_date=date(2026, 1, 1), discharge_date=date(2026, 1, 5),
+    )
+
+
+def submitted_bill(hospital, **fields):
+    values = dict(claim_fields(), status='SUBMITTED')
+    values.update(fields)
+    return Bill.objects.create(hospital=hospital, **values)
+
+
+def registered_bill(hospital, **fields):
+    bill = submitted_bill(hospital, **fields)
+    register_employees([bill])
+    bill.save(update_fields=['employee_record', 'dependent'])
+    return bill
+
+
+class EmployeeLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hospital, self.user = hospital_user('H1')
+        self.other_hospital, self.other_user = hospital_user('H2')
+        registered_bill(self.hospital)
+
+    def lookup(self, user, employee_id='e 100'):
+        self.client.force_login(user)
+        return self.client.get('/hospitals/employees/lookup/', {'employee_id': employee_id})
+
+    def test_treating_hospital_gets_full_prefill(self):
+        data = self.lookup(self.user).json()
+        self.assertTrue(data['found'])
+        self.assertEqual(data['credit_card_number'], 'CC1')
+        self.assertEqual(data['dependents'], [])
+
+    def test_other_hospital_gets_only_public_fields(self):
+        data = self.lookup(self.other_user).json()
+        self.assertTrue(data['found'])
+        self.assertEqual(data['designation'], 'AE')
+        self.assertNotIn('credit_card_number', data)
+        self.assertNotIn('mobile_number', data)
+        self.assertNotIn('dependents', data)
+
+    @override_settings(EMPLOYEE_LOOKUPS_PER_MINUTE=2)
+    def test_lookups_are_rate_limited(self):
+        self.assertEqual(self.lookup(self.user).status_code, 200)
+        self.assertEqual(self.lookup(self.user, 'E101').status_code, 200)
+        self.assertEqual(self.lookup(self.user, 'E102').status_code, 429)
+
+
+@override_settings(STORAGES=PAGE_STORAGES)
+class BillListTests(TestCase):
+    def setUp(self):
+        self.hospital, self.user = hospital_user('H1')
+        submitted_bill(self.hospital)
+        self.client.force_login(self.user)
+
+    def test_date_filters(self):
+        today = timezone.localdate().isoformat()
+        response = self.client.get('/hospitals/bills/', {'date_from': today, 'date_to': today})
+        self.assertEqual(len(response.context['bills']), 1)
+        response = self.client.get('/hospitals/bills/', {'date_from': '2999-01-01'})
+        self.assertEqual(len(response.context['bills']), 0)
+
+    def test_malformed_dates_are_ignored(self):
+        for value in ('not-a-date', '2026-02-30'):
+            response = self.client.get('/hospitals/bills/', {'date_from': value, 'date_to': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['bills']), 1)
+
+
+class SubmitDraftTests(TestCase):
+    def setUp(self):
+        self.hospital, self.user = hospital_user('H1')
+        WorkflowStep.objects.create(name='JPO', order=1, role_name='JPO')
+        scheme = Scheme.objects.create(name='Scheme', code='S1')
+        self.draft = Bill.objects.create(hospital=self.hospital, status='DRAFT', scheme=scheme, **claim_fields())
+        service = Service.objects.create(name='Room', code='ROOM')
+        BillItem.objects.create(bill=self.draft, service=service, claimed_rate=100, claimed_quantity=2, claimed_amount=200)
+        BillItem.objects.create(bill=self.draft, claimed_amount=0)
+        self.client.force_login(self.user)
+
+    def submit(self, key='key-1'):
+        return self.client.post(f'/hospitals/drafts/{self.draft.id}/submit/', {'idempotency_key': key})
+
+    def test_submits_draft_and_drops_empty_lines(self):
+        response = self.submit()
+        self.assertRedirects(response, '/hospitals/', fetch_redirect_response=False)
+        self.draft.refresh_from_db()
+        self.assertEqual(self.draft.status, 'SUBMITTED')
+        self.assertEqual(self.draft.items.count(), 1)
+        self.assertTrue(SanctionRequest.objects.filter(bill=self.draft).exists())
+
+    def test_retry_replays_the_first_result(self):
+        self.submit()
+        response = self.submit()
+        self.assertRedirects(response, '/hospitals/', fetch_redirect_response=False)
+        self.assertEqual(SanctionRequest.objects.filter(bill=self.draft).count(), 1)
+
+    def test_retry_without_key_goes_to_dashboard(self):
+        self.submit(key='')
+        response = self.submit(key='')
+        self.assertRedirects(response, '/hospitals/', fetch_redirect_response=False)
+        self.assertEqual(SanctionRequest.objects.filter(bill=self.draft).count(), 1)
+
+
+class FingerprintTests(TestCase):
+    def setUp(self):
+        self.hospital, _ = hospital_user('H1')
+
+    def test_normalizes_case_and_whitespace(self):
+        self.assertEqual(
+            bill_fingerprint(1, ' e 100', 'ip1 ', date(2026, 1, 1), date(2026, 1, 5), 'inv 1'),
+            bill_fingerprint(1, 'E100', 'IP1', date(2026, 1, 1), date(2026, 1, 5), 'INV1'),
+        )
+        self.assertNotEqual(
+            bill_fingerprint(1, 'E100', 'IP1', date(2026, 1, 1), date(2026, 1, 5), 'INV1'),
+            bill_fingerprint(2, 'E100', 'IP1', date(2026, 1, 1), date(2026, 1, 5), 'INV1'),
+        )
+
+    def test_duplicate_claim_is_refused_by_the_index(self):
+        submitted_bill(self.hospital)
+        with self.assertRaises(IntegrityError):
+            submitted_bill(self.hospital, employee_id='e100 ', bill_number='inv1')
+
+    def test_drafts_have_no_fingerprint(self):
+        submitted_bill(self.hospital)
+        draft = submitted_bill(self.hospital, status='DRAFT')
+        self.assertIsNone(draft.fingerprint)
+
+    def test_rejected_claim_can_be_refiled(self):
+        bill = submitted_bill(self.hospital)
+        bill.status = 'REJECTED'
+        bill.save(update_fields=['status'])
+        bill.refresh_from_db()
+        self.assertIsNone(bill.fingerprint)
+        self.assertIsNotNone(submitted_bill(self.hospital).fingerprint)
+
+
+@override_settings(STORAGES=PAGE_STORAGES)
+class SubmitBillTests(TestCase):
+    def setUp(self):
+        self.hospital, self.user = hospital_user('H1')
+        WorkflowStep.objects.create(name='JPO', order=1, role_name='JPO')
+        self.scheme = Scheme.objects.create(name='Scheme', code='S1')
+        self.service = Service.objects.create(name='Room', code='ROOM', base_rate_tier1=100)
+        self.client.force_login(self.user)
+
+    def post(self, key, **fields):
+        data = {name: value.isoformat() if isinstance(value, date) else value
+                for name, value in claim_fields().items()}
+        data.update({
+            'scheme': self.scheme.id, 'idempotency_key': key,
+            'items_json': json.dumps([{'service': self.service.id, 'claimed_rate': '150', 'claimed_quantity': '2'}]),
+        })
+        data.update(fields)
+        return self.client.post('/hospitals/submit-bill/', data)
+
+    def test_submission_enters_workflow_priced(self):
+        response = self.post('key-1')
+        self.assertRedirects(response, '/hospitals/', fetch_redirect_response=False)
+        bill = Bill.objects.get()
+        self.assertEqual(bill.gross_claimed_amount, Decimal('300'))
+        self.assertTrue(SanctionRequest.objects.filter(bill=bill).exists())
+        item = bill.items.get()
+        self.assertEqual((item.allowable_rate, item.excess_amount), (Decimal('100'), Decimal('100')))
+
+    def test_replayed_form_creates_one_claim(self):
+        self.post('key-1')
+        response = self.post('key-1')
+        self.assertRedirects(response, '/hospitals/', fetch_redirect_response=False)
+        self.assertEqual(Bill.objects.count(), 1)
+
+    def test_duplicate_claim_from_another_form_is_refused(self):
+        self.post('key-1')
+        response = self.post('key-2', employee_id='e 100')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'has already been submitted')
+        self.assertEqual(Bill.objects.count(), 1)
+
+
+class BackfillFingerprintTests(TestCase):
+    def setUp(self):
+        self.hospital, _ = hospital_user('H1')
+        self.older = submitted_bill(self.hospital)
+        self.copy = submitted_bill(self.hospital, employee_id='e 100', fingerprint='x')
+        self.other = submitted_bill(self.hospital, bill_number='INV2', fingerprint='y')
+        # Filed before the duplicate check existed
+        Bill.objects.update(fingerprint=None)
+
+    def backfill(self, *args):
+        out = io.StringIO()
+        call_command('backfill_bill_fingerprints', '--batch-size', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_oldest_copy_keeps_the_fingerprint(self):
+        output = self.backfill()
+        self.assertIn(f'bill ids {self.older.id}, {self.copy.id} (keeping {self.older.id})', output)
+        self.assertIn('Backfilled 2 fingerprints; 1 duplicate groups found.', output)
+        fingerprints = dict(Bill.objects.values_list('id', 'fingerprint'))
+        self.assertEqual(fingerprints[self.older.id], self.older.compute_fingerprint())
+        self.assertIsNone(fingerprints[self.copy.id])
+        self.assertIsNotNone(fingerprints[self.other.id])
+
+    def test_dry_run_writes_nothing(self):
+        output = self.backfill('--dry-run')
+        self.assertIn(f'Duplicate group of 2: bill ids {self.older.id}, {self.copy.id}', output)
+        self.assertFalse(Bill.objects.exclude(fingerprint=None).exists())
+
+
+class BulkUploadTests(TestCase):
+    HEADER = ('claim_ref,scheme_code,patient_name,designation,employee_id,employee_type,relationship,'
+              'credit_card_number,ip_number,mobile_number,age,sex,disease_details,admission_date,'
+              'discharge_date,bill_number,bill_date,service_code,hospital_service_name,claimed_rate,'
+              'claimed_quantity,claimed_amount,description\n')
+    ROW = ('{ref},S1,Ravi,AE,{employee},EMPLOYEE,SELF,CC1,{ip},999,40,Male,fever,2026-01-01,2026-01-05,'
+           'INV1,2026-01-05,{service},,{rate},1,,\n')
+
+    def setUp(self):
+        self.hospital, self.user = hospital_user('H1')
+        WorkflowStep.objects.create(name='JPO', order=1, role_name='JPO')
+        Scheme.objects.create(name='Scheme', code='S1')
+        Service.objects.create(name='Room', code='ROOM', base_rate_tier1=100)
+
+    def sheet(self, *rows):
+        return SimpleUploadedFile('claims.csv', (self.HEADER + ''.join(rows)).encode())
+
+    def test_imports_valid_claims_and_reports_bad_rows(self):
+        result = import_claims(self.sheet(
+            self.ROW.format(ref='A', employee='E100', ip='IP1', service='ROOM', rate='150'),
+            self.ROW.format(ref='A', employee='E100', ip='IP1', service='ROOM', rate='50'),
+            self.ROW.format(ref='B', employee='E200', ip='IP2', service='NOPE', rate='10'),
+        ), self.hospital, self.user)
+        self.assertEqual((result.total_rows, result.claims_created, result.claims_failed), (3, 1, 1))
+        self.assertEqual(result.errors[0][1], 'B')
+        bill = Bill.objects.get()
+        self.assertEqual(bill.items.count(), 2)
+        self.assertEqual(bill.gross_claimed_amount, Decimal('200'))
+        self.assertTrue(SanctionRequest.objects.filter(bill=bill).exists())
+
+    def test_claims_saved_one_by_one_are_indexed_once(self):
+        sheet = self.sheet(self.ROW.format(ref='A', employee='E100', ip='IP1', service='ROOM', rate='150'))
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                mock.patch('hospitals.bulk_upload.index_bills') as batch_index:
+            import_claims(sheet, self.hospital, self.user)
+        batch_index.assert_not_called()
+        self.assertEqual(list(search_bills(Bill.objects.all(), 'ravi')), [Bill.objects.get()])
+
+
+class DraftAutosaveTests(TestCase):
+    def setUp(self):
+        self.hospital, self.user = hospital_user('H1')
+        self.service = Service.objects.create(name='Room', code='ROOM')
+        self.client.force_login(self.user)
+
+    def save(self, data):
+        return self.client.post('/hospitals/drafts/save/', data).json()
+
+    def test_saves_only_the_posted_fields(self):
+        result = self.save({'patient_name': 'Ravi', 'age': 'forty'})
+        draft = Bill.objects.get(id=result['draft_id'])
+        self.assertEqual((draft.status, draft.patient_name), ('DRAFT', 'Ravi'))
+        self.assertIn('age', result['errors'])
+
+        result = self.save({'draft_id': draft.id, 'designation': 'AE'})
+        self.assertEqual(result['saved'], ['designation'])
+        draft.refresh_from_db()
+        self.assertEqual((draft.patient_name, draft.designation), ('Ravi', 'AE'))
+
+    def test_item_rows_are_added_and_removed(self):
+        result = self.save({'items': json.dumps([
+            {'key': 'a', 'service': self.service.id, 'claimed_rate': '10', 'claimed_quantity': '2'},
+        ])})
+        item_id = result['items']['a']
+        draft = Bill.objects.get(id=result['draft_id'])
+        self.assertEqual(draft.items.get().claimed_amount, Decimal('20'))
+        self.save({'draft_id': draft.id, 'items': json.dumps([{'id': item_id, 'delete': True}])})
+        self.assertFalse(draft.items.exists())
+
+    def test_malformed_item_payload_is_reported(self):
+        draft_id = self.save({'patient_name': 'Ravi'})['draft_id']
+        for payload in ('{}', '[1]', '["row"]', '{oops'):
+            result = self.save({'draft_id': draft_id, 'items': payload})
+            self.assertEqual(result['item_errors'], {'items': ['Malformed item payload.']})
+
+
+class LineItemTests(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Room', code='ROOM')
+
+    def test_parses_rows_and_skips_blank_ones(self):
+        items, errors = parse_line_items(json.dumps([
+            {'service': self.service.id, 'claimed_rate': '25', 'claimed_quantity': '4'},
+            {'service': '', 'claimed_rate': ''},
+            {'hospital_service_name': 'Custom', 'claimed_rate': '0', 'claimed_quantity': '1', 'claimed_amount': '70'},
+        ]), {}, load_service_map())
+        self.assertEqual(errors, [])
+        self.assertEqual([item.claimed_amount for item in items], [Decimal('100'), Decimal('70')])
+        self.assertEqual(items[0].hospital_service_name, 'Room')
+
+    def test_reports_errors_by_line(self):
+        items, errors = parse_line_items(json.dumps([
+            {'service': 999, 'claimed_rate': '1', 'claimed_quantity': '1'},
+            {'service': self.service.id, 'claimed_rate': 'abc', 'claimed_quantity': '1'},
+        ]), {}, load_service_map())
+        self.assertEqual(items, [])
+        self.assertEqual([(line, field) for line, field, _ in errors], [(1, 'service'), (2, 'claimed_rate')])
+
+    def test_malformed_payload(self):
+        self.assertEqual(parse_line_items('{oops', {}, {})[1][0][1], 'items')
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        hospital, _ = hospital_user('H1')
+        self.ravi = submitted_bill(hospital, patient_name='Ravi Kumar', ip_number='IP-1001')
+        self.rani = submitted_bill(hospital, patient_name='Rani Devi', ip_number='IP-2002', employee_id='E200')
+
+    def search(self, query, field=None):
+        return set(search_bills(Bill.objects.all(), query, field=field))
+
+    def test_terms_match_token_prefixes(self):
+        self.assertEqual(self.search('ra'), {self.ravi, self.rani})
+        self.assertEqual(self.search('ravi'), {self.ravi})
+        self.assertEqual(self.search('ra kum'), {self.ravi})
+        self.assertEqual(self.search('ip 2002'), {self.rani})
+
+    def test_field_scoped_search(self):
+        self.assertEqual(self.search('e200', field='employee_id'), {self.rani})
+        self.assertEqual(self.search('ravi', field='employee_id'), set())
+
+    def test_index_follows_edits(self):
+        self.ravi.patient_name = 'Suresh'
+        self.ravi.save()
+        self.assertEqual(self.search('ravi'), set())
+        self.assertEqual(self.search('sure'), {self.ravi})
+
+    def test_empty_query_leaves_queryset_alone(self):
+        self.assertEqual(self.search('  '), {self.ravi, self.rani})
+
+
+class ProjectionTests(TestCase):
+    def test_rows_carry_only_declared_columns(self):
+        hospital, _ = hospital_user('H1')
+        bill = submitted_bill(hospital)
+        row = BILL_LIST.apply(Bill.objects.all()).get()
+        self.assertEqual((row.id, row.patient_name), (bill.id, 'Ravi'))
+        self.assertEqual(row.get_status_display(), 'Submitted')
+        self.assertFalse(hasattr(row, 'disease_details'))
+
+    def test_extra_attributes_default_to_none(self):
+        projection = ListProjection('ExtraRow', Bill, ['id', 'id_card_file'], extra=['attachments'])
+        hospital, _ = hospital_user('H1')
+        submitted_bill(hospital, id_card_file='bills/id_cards/a.pdf')
+        row = projection.apply(Bill.objects.all()).get()
+        self.assertIsNone(row.attachments)
+        self.assertTrue(row.id_card_file_url.endswith('bills/id_cards/a.pdf'))
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Room', code='ROOM', base_rate_tier1=100, base_rate_tier2=80)
+
+    def item(self, **fields):
+        return BillItem(service=self.service, claimed_quantity=2, **fields)
+
+    def test_excess_above_tier_rate(self):
+        item, = price_items([self.item(claimed_rate=Decimal('150'), claimed_amount=Decimal('300'))], 'TIER1')
+        self.assertEqual((item.allowable_rate, item.excess_amount, item.suggested_rate),
+                         (Decimal('100'), Decimal('100'), Decimal('100')))
+
+    def test_tier_three_uses_tier_two_rate_and_amount_only_lines(self):
+        item, = price_items([self.item(claimed_rate=0, claimed_amount=Decimal('120'))], 'TIER3')
+        self.assertEqual((item.allowable_rate, item.excess_amount, item.suggested_rate),
+                         (Decimal('80'), Decimal('0'), Decimal('60.00')))
+
+    def test_untariffed_service(self):
+        item, = price_items([BillItem(hospital_service_name='X', claimed_rate=Decimal('5'),
+                                      claimed_quantity=1, claimed_amount=Decimal('5'))], 'TIER1')
+        self.assertIsNone(item.allowable_rate)
+        self.assertEqual(item.suggested_rate, Decimal('5'))
+
+
+class TariffCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = Service.objects.create(name='Room', code='ROOM', base_rate_tier1=100)
+
+    def test_tariff_change_in_another_worker_is_picked_up(self):
+        self.assertEqual(get_tariff().rate(self.service.id, 'TIER1'), Decimal('100'))
+        # Another worker edits the tariff: the row changes, this worker's matrix does not
+        Service.objects.filter(id=self.service.id).update(base_rate_tier1=120)
+        self.assertEqual(get_tariff().rate(self.service.id, 'TIER1'), Decimal('100'))
+        cache.set(TARIFF_VERSION_KEY, 'edited elsewhere')
+        self.assertEqual(get_tariff().rate(self.service.id, 'TIER1'), Decimal('120'))
+
+    def test_saving_a_service_moves_the_version_on_commit(self):
+        get_tariff()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.base_rate_tier1 = 90
+            self.service.save()
+            self.assertIsNone(cache.get(TARIFF_VERSION_KEY))
+        self.assertIsNotNone(cache.get(TARIFF_VERSION_KEY))
+        self.assertEqual(get_tariff().rate(self.service.id, 'TIER1'), Decimal('90'))
+
+
+class ClaimHistoryTests(TestCase):
+    def test_lists_the_employees_other_claims(self):
+        first, _ = hospital_user('H1')
+        second, _ = hospital_user('H2')
+        bill = registered_bill(first)
+        other = registered_bill(second, employee_id='e 100', bill_number='INV2')
+        registered_bill(second, employee_id='E200', bill_number='INV3')
+        self.assertEqual(list(claim_history(bill)), [other])
+
+
+class OverlapTests(TestCase):
+    def setUp(self):
+        self.first, _ = hospital_user('H1')
+        self.second, _ = hospital_user('H2')
+
+    def test_flags_overlapping_admissions_at_other_hospitals(self):
+        bill = registered_bill(self.first)
+        other = registered_bill(self.second, admission_date=date(2026, 1, 3), discharge_date=date(2026, 1, 8))
+        self.assertEqual(flag_overlaps([other]), 2)
+        self.assertEqual(AdmissionOverlap.objects.get(bill=bill).overlap_days, 2)
+        self.assertEqual(AdmissionOverlap.objects.get(bill=other).other_bill, bill)
+
+    def test_same_day_transfer_is_not_an_overlap(self):
+        registered_bill(self.first)
+        other = registered_bill(self.second, admission_date=date(2026, 1, 5), discharge_date=date(2026, 1, 8))
+        self.assertEqual(flag_overlaps([other]), 0)
+
+
+class AttachmentTests(TestCase):
+    def setUp(self):
+        hospital, _ = hospital_user('H1')
+        self.bill = submitted_bill(hospital, id_card_file='bills/id_cards/id.pdf')
+        self.item = BillItem.objects.create(bill=self.bill, hospital_service_name='X', claimed_amount=1,
+                                            supporting_document='bills/supporting_docs/rx.pdf')
+        BillDocument.objects.create(bill=self.bill, document_type=BillDocument.DOCUMENT_TYPE_CHOICES[0][0],
+                                    file='bills/documents/doc.pdf')
+
+    def kinds(self):
+        return sorted(BillAttachment.objects.filter(bill=self.bill).values_list('kind', 'name'))
+
+    def test_sync_mirrors_the_file_columns(self):
+        sync_attachments([self.bill.id])
+        self.assertEqual(self.kinds(), [
+            ('DOCUMENT', 'bills/documents/doc.pdf'),
+            ('ID_CARD', 'bills/id_cards/id.pdf'),
+            ('ITEM', 'bills/supporting_docs/rx.pdf'),
+        ])
+        self.bill.id_card_file = ''
+        self.bill.save()
+        self.item.supporting_document = 'bills/supporting_docs/rx2.pdf'
+        self.item.save()
+        sync_attachments([self.bill.id])
+        self.assertEqual(self.kinds(), [
+            ('DOCUMENT', 'bills/documents/doc.pdf'),
+            ('ITEM', 'bills/supporting_docs/rx2.pdf'),
+        ])
+
+    def test_attachments_for_a_page_in_one_query(self):
+        sync_attachments([self.bill.id])
+        with CaptureQueriesContext(connection) as queries:
+            found = attachments_for([self.bill.id, 0])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(found[self.bill.id]), 3)
+        self.assertNotIn(0, found)
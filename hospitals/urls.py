@@ -6,6 +6,12 @@ app_name = 'hospitals'
 urlpatterns = [
     path('', views.hospital_dashboard, name='dashboard'),
     path('submit-bill/', views.submit_bill, name='submit_bill'),
+    path('drafts/save/', views.save_draft, name='save_draft'),
+    path('drafts/<int:bill_id>/submit/', views.submit_draft, name='submit_draft'),
+    path('employees/lookup/', views.employee_lookup, name='employee_lookup'),
+    path('bulk-upload/', views.bulk_upload, name='bulk_upload'),
+    path('bulk-upload/template/', views.bulk_upload_template, name='bulk_upload_template'),
     path('bills/', views.bill_list, name='bill_list'),
     path('bills/<int:bill_id>/', views.bill_detail, name='bill_detail'),
+    path('bills/<int:bill_id>/download/', views.bill_download_all, name='bill_download_all'),
 ]
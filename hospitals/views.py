@@ -1,14 +1,50 @@
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
 from django.contrib import messages
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
 from django.forms import modelformset_factory
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_POST
 
 from accounts.decorators import role_required, hospital_required
-from .models import Hospital, Bill, BillDocument, BillItem, Service, Scheme
-from .forms import BillForm, BillDocumentForm, BillItemForm
+from .models import Hospital, Bill, BillDocument, BillItem, BillImport, Service, Scheme
+from .forms import BillForm, BillDocumentForm, BillItemForm, BulkUploadForm
+from .bulk_upload import BulkUploadError, TEMPLATE_COLUMNS, import_claims
+from .line_items import items_as_json_rows, load_service_map, parse_line_items, service_choices
+from .drafts import apply_bill_changes, apply_item_changes, bill_form_for_draft, BILL_DRAFT_FIELDS
+from .search import search_bills
+from .projections import BILL_LIST
+from .idempotency import form_key, remember_response, replay_response
+from .employees import lookup_allowed, prefill_for, register_employees
+from .overlaps import flag_overlaps
+from .pricing import price_items, price_saved_items
+from .attachments import sync_attachments
+from documents.bundles import bill_attachments, stream_zip
+from documents.metadata import attach_metadata
+from documents.previews import attach_previews
+from documents.processing import queue_bill_media
+from documents.direct import attach_direct_uploads
+from documents.uploads import attach_uploads
 from workflow.models import SanctionRequest, WorkflowStep
 
 
+DUPLICATE_CLAIM_MESSAGE = (
+    'A claim with the same employee ID, IP number, admission/discharge dates '
+    'and invoice number has already been submitted.'
+)
+
+# Columns written when a draft is submitted (claim data is already stored)
+BILL_SUBMIT_FIELDS = BILL_DRAFT_FIELDS + [
+    'status', 'gross_claimed_amount', 'fingerprint', 'employee_record', 'dependent', 'updated_at'
+]
+
+
 @login_required
 @hospital_required
 def hospital_dashboard(request):
@@ -19,7 +55,7 @@ def hospital_dashboard(request):
         messages.error(request, 'No hospital assigned to your account.')
         return redirect('dashboard')
     
-    bills = Bill.objects.filter(hospital=hospital).order_by('-created_at')[:20]
+    bills = BILL_LIST.apply(Bill.objects.filter(hospital=hospital).order_by('-created_at'))[:20]
     
     return render(request, 'hospitals/dashboard.html', {
         'hospital': hospital,
@@ -41,75 +77,334 @@ def submit_bill(request):
         can_delete=False
     )
     
-    services = Service.objects.filter(is_active=True)
+    # One query for the service list, shared by every row / the JSON grid.
+    # Static choices mean the <select> of each row (and empty_form) no longer
+    # re-runs the Service query when it renders.
+    service_map = load_service_map()
+    choices = service_choices(service_map)
+    BillItemFormSet.form.base_fields['service'].choices = choices
+    # ?grid=json (or a posted items_json) switches to the compact JSON line-item grid
+    json_grid = request.GET.get('grid') == 'json' or 'items_json' in request.POST
+    grid_rows = []
+    item_errors = []
     
     if request.method == 'POST':
-        bill_form = BillForm(request.POST, request.FILES)
-        formset = BillItemFormSet(request.POST, request.FILES, queryset=BillItem.objects.none())
+        # Double click / browser retry: answer with the first submission's result
+        replayed = replay_response(request, 'submit_bill')
+        if replayed:
+            return replayed
+        
+        # Files sent ahead (resumable or straight to storage) are posted by id / signed key
+        attach_uploads(request)
+        attach_direct_uploads(request)
+        
+        # Posting over an autosaved draft keeps its already-uploaded files
+        draft = None
+        if request.POST.get('draft_id'):
+            draft = get_object_or_404(Bill, id=request.POST['draft_id'], hospital=hospital, status='DRAFT')
+        bill_form = BillForm(request.POST, request.FILES, instance=draft)
         
-        if bill_form.is_valid() and formset.is_valid():
+        if json_grid:
+            formset = BillItemFormSet(queryset=BillItem.objects.none())
+            items, item_errors = parse_line_items(request.POST['items_json'], request.FILES, service_map)
+            items_valid = not item_errors
+            grid_rows = _posted_grid_rows(request.POST['items_json'])
+        else:
+            formset = BillItemFormSet(request.POST, request.FILES, queryset=BillItem.objects.none())
+            items_valid = formset.is_valid()
+            items = _items_from_formset(formset) if items_valid else []
+        
+        if bill_form.is_valid() and items_valid:
             bill = bill_form.save(commit=False)
             bill.hospital = hospital
             bill.created_by = request.user
             bill.status = 'SUBMITTED'
-            bill.save()
-            
-            # Save items and calculate gross total
-            total_amount = 0
-            print(f"DEBUG: Processing {len(formset)} forms")
-            for i, form in enumerate(formset):
-                # Process if Service FK is selected OR if a Custom Name is entered (with amounts)
-                # Note: form.cleaned_data might rely on prefix names in template
-                if form.cleaned_data.get('service') or form.cleaned_data.get('hospital_service_name'):
-                    item = form.save(commit=False)
-                    item.bill = bill
-                    
-                    # Ensure name is captured. If FK exists, use its name as fallback if custom name empty
-                    if item.service and not item.hospital_service_name:
-                        item.hospital_service_name = item.service.name
-                    
-                    # DEBUG: Print Item Data
-                    print(f"DEBUG item {i}: Rate={item.claimed_rate}, Qty={item.claimed_quantity}, AmountInput={item.claimed_amount}")
-                    
-                    item.save()  # Model's save() handles calculation if amount is missing
-                    
-                    print(f"DEBUG item {i} Saved: Amount={item.claimed_amount}")
-                    
-                    total_amount += item.claimed_amount
-            
-            print(f"DEBUG: Total Amount Calculated: {total_amount}")
-            
-            # Update bill with calculated total
-            bill.gross_claimed_amount = total_amount
-            bill.save()
-            
-            # Create SanctionRequest to enter workflow
-            first_step = WorkflowStep.objects.order_by('order').first()
-            SanctionRequest.objects.create(
-                bill=bill,
-                hospital_name=hospital.name,
-                patient_name=bill.patient_name,
-                claimed_amount=bill.gross_claimed_amount,
-                current_step=first_step,
-                status='PENDING'
-            )
+            bill.fingerprint = bill.compute_fingerprint()
             
-            messages.success(request, 'Bill submitted successfully and entered the approval workflow!')
-            return redirect('hospitals:dashboard')
-        else:
-            messages.error(request, 'Please correct the errors below.')
+            # Single unique-index probe on the fingerprint column
+            if Bill.objects.filter(fingerprint=bill.fingerprint).exists():
+                bill_form.add_error(None, DUPLICATE_CLAIM_MESSAGE)
+            else:
+                try:
+                    with transaction.atomic():
+                        _save_submitted_bill(bill, items, hospital)
+                        response = remember_response(request, 'submit_bill', redirect('hospitals:dashboard'))
+                except IntegrityError:
+                    # Lost a race with a replay of this form or a concurrent submit of the same claim
+                    replayed = replay_response(request, 'submit_bill')
+                    if replayed:
+                        return replayed
+                    bill_form.add_error(None, DUPLICATE_CLAIM_MESSAGE)
+                else:
+                    messages.success(request, 'Bill submitted successfully and entered the approval workflow!')
+                    return response
+        
+        messages.error(request, 'Please correct the errors below.')
     else:
-        bill_form = BillForm()
+        # ?draft=<id> resumes an autosaved draft, files included
+        draft = None
+        if request.GET.get('draft'):
+            draft = get_object_or_404(Bill, id=request.GET['draft'], hospital=hospital, status='DRAFT')
+        bill_form = BillForm(instance=draft)
         bill_form.fields['scheme'].queryset = Scheme.objects.filter(is_active=True)
-        formset = BillItemFormSet(queryset=BillItem.objects.none())
+        draft_items = draft.items.all() if draft else BillItem.objects.none()
+        if json_grid:
+            formset = BillItemFormSet(queryset=BillItem.objects.none())
+            grid_rows = items_as_json_rows(draft_items)
+        else:
+            formset = BillItemFormSet(queryset=draft_items)
+    
         
     return render(request, 'hospitals/submit_bill.html', {
         'bill_form': bill_form,
         'formset': formset,
-        'services': services,
+        'service_options': choices[1:],
+        'draft': draft,
+        'json_grid': json_grid,
+        'grid_rows': grid_rows,
+        'item_errors': item_errors,
+        'direct_uploads': settings.DIRECT_UPLOADS,
+        'idempotency_key': form_key(request),
     })
 
 
+def _posted_grid_rows(raw):
+    """Posted JSON rows, echoed back so a failed submit keeps the grid."""
+    try:
+        rows = json.loads(raw or '[]')
+    except ValueError:
+        return []
+    return rows if isinstance(rows, list) else []
+
+
+def _items_from_formset(formset):
+    """Unsaved BillItems for the filled-in formset rows."""
+    items = []
+    for form in formset:
+        # Process if Service FK is selected OR if a Custom Name is entered (with amounts)
+        if form.cleaned_data.get('service') or form.cleaned_data.get('hospital_service_name'):
+            item = form.save(commit=False)
+            
+            # Ensure name is captured. If FK exists, use its name as fallback if custom name empty
+            if item.service and not item.hospital_service_name:
+                item.hospital_service_name = item.service.name
+            # Same rule as BillItem.save(); items are bulk inserted
+            if not item.claimed_amount:
+                item.claimed_amount = item.claimed_rate * item.claimed_quantity
+            items.append(item)
+    return items
+
+
+def _save_submitted_bill(bill, items, hospital):
+    """Save a validated bill with its items and put it into the workflow."""
+    from_draft = bill.pk is not None
+    bill.gross_claimed_amount = sum(item.claimed_amount for item in items)
+    register_employees([bill])
+    bill.save()
+    if from_draft:
+        # A draft posted through the full form takes its lines from the posted grid
+        bill.items.all().delete()
+    
+    for item in items:
+        item.bill = bill
+    price_items(items, hospital.tier)
+    BillItem.objects.bulk_create(items)
+    
+    flag_overlaps([bill])
+    _enter_workflow(bill, hospital)
+    return bill
+
+
+def _enter_workflow(bill, hospital):
+    """Create the SanctionRequest that puts a submitted bill into the approval chain."""
+    first_step = WorkflowStep.objects.order_by('order').first()
+    SanctionRequest.objects.create(
+        bill=bill,
+        hospital_name=hospital.name,
+        patient_name=bill.patient_name,
+        claimed_amount=bill.gross_claimed_amount,
+        current_step=first_step,
+        status='PENDING'
+    )
+    sync_attachments([bill.id])
+    queue_bill_media(bill)
+
+
+@login_required
+@hospital_required
+@require_POST
+def save_draft(request):
+    """
+    Autosave endpoint for the claim form.
+    Receives only the changed fields, item rows and newly picked files.
+    """
+    hospital = request.user.profile.hospital
+    draft_id = request.POST.get('draft_id')
+    
+    if draft_id:
+        bill = get_object_or_404(Bill, id=draft_id, hospital=hospital, status='DRAFT')
+    else:
+        bill = Bill(hospital=hospital, created_by=request.user, status='DRAFT')
+    
+    attach_uploads(request)
+    attach_direct_uploads(request)
+    changed, errors = apply_bill_changes(bill, request.POST, request.FILES)
+    
+    with transaction.atomic():
+        if bill.pk is None:
+            bill.save()
+        elif changed:
+            bill.save(update_fields=changed + ['updated_at'])
+        
+        item_ids, item_errors = apply_item_changes(bill, request.POST.get('items'), request.FILES)
+        sync_attachments([bill.id])
+    
+    return JsonResponse({
+        'draft_id': bill.id,
+        'saved': changed,
+        'errors': errors,
+        'items': item_ids,
+        'item_errors': item_errors,
+        'idempotency_key': form_key(request),
+    })
+
+
+@login_required
+@hospital_required
+@require_POST
+def submit_draft(request, bill_id):
+    """Validate a stored draft and send it into the workflow - nothing is re-posted."""
+    hospital = request.user.profile.hospital
+    # Double click / browser retry: answer with the first submission's result
+    replayed = replay_response(request, 'submit_draft')
+    if replayed:
+        return replayed
+    bill = get_object_or_404(Bill, id=bill_id, hospital=hospital)
+    if bill.status != 'DRAFT':
+        # Submitted already, e.g. by a retry that carried no key
+        messages.info(request, 'This claim was already submitted.')
+        return redirect('hospitals:dashboard')
+    
+    bill_form = bill_form_for_draft(bill)
+    items = list(bill.items.all())
+    named_items = [item for item in items if item.service_id or item.hospital_service_name]
+    
+    if not bill_form.is_valid() or not named_items:
+        for field, errors in bill_form.errors.items():
+            label = bill_form.fields[field].label if field in bill_form.fields else 'Claim'
+            messages.error(request, f'{label}: {" ".join(errors)}')
+        if not named_items:
+            messages.error(request, 'Add at least one service line before submitting.')
+        return redirect(f"{reverse('hospitals:submit_bill')}?draft={bill.id}")
+    
+    bill = bill_form.save(commit=False)
+    bill.fingerprint = bill.compute_fingerprint()
+    if Bill.objects.filter(fingerprint=bill.fingerprint).exists():
+        messages.error(request, DUPLICATE_CLAIM_MESSAGE)
+        return redirect(f"{reverse('hospitals:submit_bill')}?draft={bill.id}")
+    
+    bill.status = 'SUBMITTED'
+    bill.gross_claimed_amount = sum(item.claimed_amount for item in named_items)
+    
+    try:
+        with transaction.atomic():
+            # Only one copy of a racing retry gets past the DRAFT row lock
+            if not Bill.objects.select_for_update().filter(id=bill.id, status='DRAFT').exists():
+                messages.info(request, 'This claim was already submitted.')
+                return redirect('hospitals:dashboard')
+            # Rows left without a service are empty lines from the grid
+            BillItem.objects.filter(bill=bill).exclude(id__in=[item.id for item in named_items]).delete()
+            register_employees([bill])
+            bill.save(update_fields=BILL_SUBMIT_FIELDS)
+            price_saved_items(named_items, hospital.tier)
+            flag_overlaps([bill])
+            _enter_workflow(bill, hospital)
+            response = remember_response(request, 'submit_draft', redirect('hospitals:dashboard'))
+    except IntegrityError:
+        # Lost a race with a replay of this form, or the claim is a duplicate
+        replayed = replay_response(request, 'submit_draft')
+        if replayed:
+            return replayed
+        messages.error(request, DUPLICATE_CLAIM_MESSAGE)
+        return redirect(f"{reverse('hospitals:submit_bill')}?draft={bill.id}")
+    
+    messages.success(request, 'Bill submitted successfully and entered the approval workflow!')
+    return response
+
+
+@login_required
+@hospital_required
+def employee_lookup(request):
+    """Registry details for the claim form's employee ID prefill."""
+    if not lookup_allowed(request.user):
+        return JsonResponse({'found': False, 'error': 'Too many lookups, try again in a minute.'}, status=429)
+    details = prefill_for(request.GET.get('employee_id'), request.user.profile.hospital)
+    if details is None:
+        return JsonResponse({'found': False})
+    return JsonResponse({'found': True, **details})
+
+
+@login_required
+@hospital_required
+def bulk_upload(request):
+    """Bulk claim submission from a CSV/XLSX spreadsheet."""
+    hospital = request.user.profile.hospital
+    
+    if request.method == 'POST':
+        form = BulkUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_claims(upload, hospital, request.user)
+            except BulkUploadError as e:
+                messages.error(request, str(e))
+                return redirect('hospitals:bulk_upload')
+            
+            bill_import = BillImport(
+                hospital=hospital,
+                uploaded_by=request.user,
+                file_name=upload.name[:255],
+                total_rows=result.total_rows,
+                claims_created=result.claims_created,
+                claims_failed=result.claims_failed,
+            )
+            if result.errors:
+                bill_import.error_report.save(f'{upload.name.rsplit(".", 1)[0]}_errors.csv', result.error_report(), save=False)
+            bill_import.save()
+            
+            if result.claims_failed:
+                messages.warning(request, f'{result.claims_created} claims submitted, {result.claims_failed} rejected. Download the error report for details.')
+            else:
+                messages.success(request, f'{result.claims_created} claims submitted and entered the approval workflow!')
+            return redirect('hospitals:bulk_upload')
+    else:
+        form = BulkUploadForm()
+    
+    imports = BillImport.objects.filter(hospital=hospital)[:20]
+    
+    return render(request, 'hospitals/bulk_upload.html', {
+        'hospital': hospital,
+        'form': form,
+        'imports': imports,
+    })
+
+
+@login_required
+@hospital_required
+def bulk_upload_template(request):
+    """Download an empty CSV with the bulk upload columns."""
+    response = HttpResponse(','.join(TEMPLATE_COLUMNS) + '\r\n', content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="claims_template.csv"'
+    return response
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
 @login_required
 @hospital_required
 def bill_list(request):
@@ -122,6 +417,21 @@ def bill_list(request):
     
     bills = Bill.objects.filter(hospital=hospital).order_by('-created_at')
     
+    # Indexed prefix search: q covers every searchable field, the others one each
+    bills = search_bills(bills, request.GET.get('q'))
+    for field in ('claim_id', 'patient_name', 'employee_id', 'ip_number'):
+        bills = search_bills(bills, request.GET.get(field), field=field)
+    if request.GET.get('status'):
+        bills = bills.filter(status=request.GET['status'])
+    # Dates that do not parse are ignored rather than failing the page
+    date_from = _parse_day(request.GET.get('date_from'))
+    date_to = _parse_day(request.GET.get('date_to'))
+    if date_from:
+        bills = bills.filter(created_at__date__gte=date_from)
+    if date_to:
+        bills = bills.filter(created_at__date__lte=date_to)
+    bills = BILL_LIST.apply(bills)
+    
     return render(request, 'hospitals/bill_list.html', {
         'hospital': hospital,
         'bills': bills,
@@ -140,9 +450,33 @@ def bill_detail(request, bill_id):
             messages.error(request, 'Access denied.')
             return redirect('dashboard')
     
-    documents = bill.documents.all()
+    documents = list(bill.documents.all())
+    file_previews = attach_previews(bill, documents=documents)
+    file_meta = attach_metadata(bill, documents=documents)
     
     return render(request, 'hospitals/bill_detail.html', {
         'bill': bill,
         'documents': documents,
+        'file_previews': file_previews,
+        'file_meta': file_meta,
     })
+
+
+@login_required
+def bill_download_all(request, bill_id):
+    """Every file attached to a claim as one ZIP, streamed from storage."""
+    bill = get_object_or_404(Bill, id=bill_id)
+    
+    profile = request.user.profile
+    if profile.role == 'HOSPITAL' and profile.hospital != bill.hospital:
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    entries = bill_attachments(bill)
+    if not entries:
+        messages.error(request, 'This claim has no attachments.')
+        return redirect('hospitals:bill_detail', bill_id=bill.id)
+    
+    response = StreamingHttpResponse(stream_zip(default_storage, entries), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="claim-{bill.claim_id or bill.id}.zip"'
+    return response
@@ -187,11 +187,28 @@ AWS_S3_FILE_OVERWRITE = False
 AWS_DEFAULT_ACL = None
 AWS_S3_SIGNATURE_VERSION = 's3v4'
 
+# Presigned media URLs are reused until this many seconds before they expire
+# (AWS_QUERYSTRING_EXPIRE, default 3600); at most PRESIGNED_URL_CACHE_SIZE per worker
+PRESIGNED_URL_MIN_REMAINING = int(os.environ.get('PRESIGNED_URL_MIN_REMAINING', 900))
+PRESIGNED_URL_CACHE_SIZE = int(os.environ.get('PRESIGNED_URL_CACHE_SIZE', 10000))
+
+# Files of S3_MULTIPART_THRESHOLD bytes or more go to S3 as parallel multipart
+# parts (project/storage.py): S3_UPLOAD_CONCURRENCY parts in flight per file,
+# S3_UPLOAD_THREADS per worker process, each part tried S3_UPLOAD_PART_ATTEMPTS times
+S3_MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+S3_MULTIPART_PART_SIZE = int(os.environ.get('S3_MULTIPART_PART_SIZE', 8 * 1024 * 1024))
+S3_UPLOAD_CONCURRENCY = int(os.environ.get('S3_UPLOAD_CONCURRENCY', 8))
+S3_UPLOAD_THREADS = int(os.environ.get('S3_UPLOAD_THREADS', 32))
+S3_UPLOAD_PART_ATTEMPTS = int(os.environ.get('S3_UPLOAD_PART_ATTEMPTS', 3))
+
 if AWS_ACCESS_KEY_ID and AWS_STORAGE_BUCKET_NAME:
     # Use S3 for file storage
     STORAGES = {
         "default": {
-            "BACKEND": "storages.backends.s3.S3Storage",
+            # S3Storage with a per-worker cache of presigned URLs, parallel
+            # multipart uploads and content deduplication (project/storage.py,
+            # documents/blobs.py)
+            "BACKEND": "project.storage.DedupS3Storage",
             "OPTIONS": {
                 "access_key": AWS_ACCESS_KEY_ID,
                 "secret_key": AWS_SECRET_ACCESS_KEY,
@@ -204,16 +221,64 @@ if AWS_ACCESS_KEY_ID and AWS_STORAGE_BUCKET_NAME:
         },
     }
 else:
-    # Local file storage fallback
+    # Local file storage fallback, with content deduplication (documents/blobs.py)
     STORAGES = {
         "default": {
-            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "BACKEND": "documents.blobs.DedupFileSystemStorage",
         },
         "staticfiles": {
             "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
         },
     }
 
+# Uploads are hashed (SHA-256) while they stream in, for deduplication
+FILE_UPLOAD_HANDLERS = [
+    'documents.blobs.HashingMemoryFileUploadHandler',
+    'documents.blobs.HashingTemporaryFileUploadHandler',
+]
+
+# Background threads per worker processing a submitted claim's files
+# (documents/processing.py); 0 leaves it to `manage.py normalize_media` and
+# `manage.py generate_previews`
+MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 2))
+
+# Uploaded images are re-encoded after submission (documents/normalize.py):
+# longest side capped, metadata stripped, stored as JPEG or WEBP
+MEDIA_NORMALIZE = os.environ.get('MEDIA_NORMALIZE', 'True') == 'True'
+MEDIA_MAX_DIMENSION = int(os.environ.get('MEDIA_MAX_DIMENSION', 2480))
+MEDIA_IMAGE_QUALITY = int(os.environ.get('MEDIA_IMAGE_QUALITY', 80))
+MEDIA_IMAGE_FORMAT = os.environ.get('MEDIA_IMAGE_FORMAT', 'JPEG').upper()
+# Merge a claim's photographed pages of one document type into a single PDF
+MEDIA_MERGE_PAGES = os.environ.get('MEDIA_MERGE_PAGES', 'False') == 'True'
+
+# Files of claims approved or rejected more than MEDIA_COLD_AFTER_DAYS ago are
+# moved to a cheaper S3 storage class by `manage.py tier_media`
+# (documents/tiering.py); keys and URLs stay the same
+MEDIA_COLD_AFTER_DAYS = int(os.environ.get('MEDIA_COLD_AFTER_DAYS', 730))
+MEDIA_COLD_STORAGE_CLASS = os.environ.get('MEDIA_COLD_STORAGE_CLASS', 'GLACIER_IR')
+
+# Resumable chunked uploads (documents/uploads.py): parts are assembled under
+# CHUNKED_UPLOAD_DIR (shared by all app servers) and removed by
+# `manage.py purge_uploads` after CHUNKED_UPLOAD_EXPIRY_HOURS
+CHUNKED_UPLOAD_DIR = os.environ.get('CHUNKED_UPLOAD_DIR', str(BASE_DIR / 'upload_parts'))
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_SIZE', 1024 * 1024))
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 200 * 1024 * 1024))
+CHUNKED_UPLOAD_EXPIRY_HOURS = int(os.environ.get('CHUNKED_UPLOAD_EXPIRY_HOURS', 24))
+
+# Attachments go from the browser straight to storage under a signed grant
+# (documents/direct.py): an S3 presigned POST - the bucket needs a CORS rule
+# allowing POST from the site - or a signed endpoint for local media. Grants
+# expire after DIRECT_UPLOAD_EXPIRY_SECONDS
+DIRECT_UPLOADS = os.environ.get('DIRECT_UPLOADS', 'True') == 'True'
+DIRECT_UPLOAD_EXPIRY_SECONDS = int(os.environ.get('DIRECT_UPLOAD_EXPIRY_SECONDS', 900))
+DIRECT_UPLOAD_MAX_SIZE = int(os.environ.get('DIRECT_UPLOAD_MAX_SIZE', 200 * 1024 * 1024))
+
+# Local media only: Django checks permissions and the web server streams the
+# file - 'nginx' (X-Accel-Redirect to MEDIA_OFFLOAD_PREFIX) or 'sendfile'
+# (X-Sendfile). See documents/offload.py.
+MEDIA_OFFLOAD = '' if AWS_ACCESS_KEY_ID and AWS_STORAGE_BUCKET_NAME else os.environ.get('MEDIA_OFFLOAD', '').lower()
+MEDIA_OFFLOAD_PREFIX = os.environ.get('MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+
 
 
 # Logging configuration
@@ -263,6 +328,29 @@ LOGOUT_REDIRECT_URL = '/login/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# The default cache is private to each worker process. Point CACHE_BACKEND at
+# a shared one (e.g. django.core.cache.backends.db.DatabaseCache after
+# `manage.py createcachetable`, or .redis.RedisCache) so tariff changes
+# (hospitals/pricing.py) reach every worker at once and the employee lookup
+# limit is counted once, not per worker
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# How long a submitted form's idempotency key is replayed (hospitals/idempotency.py);
+# expired keys are removed by `manage.py purge_idempotency_keys`
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+# Employee registry lookups one user may make per minute (hospitals/employees.py);
+# counted in the default cache, i.e. per worker unless CACHE_BACKEND is shared
+EMPLOYEE_LOOKUPS_PER_MINUTE = int(os.environ.get('EMPLOYEE_LOOKUPS_PER_MINUTE', 30))
+
+# How long the document library total is cached (documents/pagination.py)
+DOCUMENT_COUNT_CACHE_SECONDS = int(os.environ.get('DOCUMENT_COUNT_CACHE_SECONDS', 300))
+
 # Session Configuration
 # Temporarily use file-based sessions to avoid Oracle 11g session query issues
 # TODO: Fix database session queries and switch back to 'django.contrib.sessions.backends.db'
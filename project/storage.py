@@ -0,0 +1,206 @@
+"""
+Media storage backend.
+
+Every FieldFile.url on S3 computes a fresh SigV4 presigned URL, and the
+approval queue, request_detail and bill_detail render dozens per page.
+CachedS3Storage keeps each signed URL and hands it out again until it is
+within PRESIGNED_URL_MIN_REMAINING seconds of expiring, so a link is always
+valid for at least that long when the page is served. The cache is a
+bounded LRU (PRESIGNED_URL_CACHE_SIZE entries) per worker process; its
+counters are exposed by url_cache.stats().
+
+ParallelUploadS3Storage sends files of S3_MULTIPART_THRESHOLD bytes or more
+as a multipart upload whose parts go out concurrently (S3_UPLOAD_CONCURRENCY
+per file) on a thread pool shared by the whole process (S3_UPLOAD_THREADS),
+so a burst of large discharge summaries cannot spawn unbounded threads.
+Each part is retried on its own (S3_UPLOAD_PART_ATTEMPTS); a failed upload
+is aborted so no orphaned parts are billed. At most CONCURRENCY parts are
+held in memory per file.
+
+DedupS3Storage adds content deduplication (documents/blobs.py) on top.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+from documents.blobs import DedupStorageMixin
+
+
+class PresignedUrlCache:
+    """Thread-safe LRU of {key: (url, expires_at)} with hit/miss counters."""
+
+    def __init__(self, max_entries, min_remaining):
+        self.max_entries = max_entries
+        self.min_remaining = min_remaining
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expired = self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            url, expires_at = entry
+            if expires_at - now < self.min_remaining:
+                # Too close to expiry to hand out again
+                del self._entries[key]
+                self.expired += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return url
+
+    def put(self, key, url, expire):
+        with self._lock:
+            self._entries[key] = (url, time.monotonic() + expire)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.expired
+            return {
+                'pid': os.getpid(),
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+class CachedS3Storage(S3Storage):
+    """S3Storage that reuses presigned URLs until close to their expiry."""
+
+    def __init__(self, **settings_overrides):
+        super().__init__(**settings_overrides)
+        self.url_cache = PresignedUrlCache(
+            settings.PRESIGNED_URL_CACHE_SIZE,
+            settings.PRESIGNED_URL_MIN_REMAINING,
+        )
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if expire is None:
+            expire = self.querystring_expire
+        # Unsigned URLs are not worth caching; short-lived ones could not be reused
+        if not self.querystring_auth or expire <= self.url_cache.min_remaining:
+            return super().url(name, parameters, expire, http_method)
+
+        key = (name, tuple(sorted((parameters or {}).items())), expire, http_method)
+        url = self.url_cache.get(key)
+        if url is None:
+            url = super().url(name, parameters, expire, http_method)
+            self.url_cache.put(key, url, expire)
+        return url
+
+    def delete(self, name):
+        super().delete(name)
+        # Rare; a full clear keeps the cache keyed for fast lookups
+        self.url_cache.clear()
+
+
+# S3 allows at most this many parts of at least 5 MB (except the last)
+MAX_PARTS = 10000
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+_upload_pool = None
+_upload_pool_lock = threading.Lock()
+
+
+def _upload_threads():
+    global _upload_pool
+    with _upload_pool_lock:
+        if _upload_pool is None:
+            _upload_pool = ThreadPoolExecutor(
+                max_workers=settings.S3_UPLOAD_THREADS, thread_name_prefix='s3-upload'
+            )
+    return _upload_pool
+
+
+def _upload_part(client, upload, number, data):
+    attempts = settings.S3_UPLOAD_PART_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            response = client.upload_part(PartNumber=number, Body=data, **upload)
+            return {'PartNumber': number, 'ETag': response['ETag']}
+        except (BotoCoreError, ClientError):
+            if attempt == attempts:
+                raise
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
+
+def upload_multipart(client, bucket, key, content, params, part_size, concurrency):
+    """Upload ``content`` to ``key`` as parallel parts; aborts the upload on failure."""
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **params)['UploadId']
+    upload = {'Bucket': bucket, 'Key': key, 'UploadId': upload_id}
+    parts = []
+    pending = set()
+    try:
+        number = 0
+        # The file is read here, one part at a time; only the network calls run in the pool
+        while True:
+            data = content.read(part_size)
+            if not data:
+                break
+            number += 1
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                parts.extend(future.result() for future in done)
+            pending.add(_upload_threads().submit(_upload_part, client, upload, number, data))
+        parts.extend(future.result() for future in pending)
+        pending = set()
+        parts.sort(key=lambda part: part['PartNumber'])
+        client.complete_multipart_upload(MultipartUpload={'Parts': parts}, **upload)
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        wait(pending)
+        client.abort_multipart_upload(**upload)
+        raise
+
+
+class ParallelUploadS3Storage(CachedS3Storage):
+    """CachedS3Storage that uploads large files as concurrent multipart parts."""
+
+    def _save(self, name, content):
+        size = getattr(content, 'size', None) or 0
+        if size < settings.S3_MULTIPART_THRESHOLD:
+            return super()._save(name, content)
+
+        cleaned_name = clean_name(name)
+        key = self._normalize_name(cleaned_name)
+        params = self._get_write_parameters(key, content)
+        if self.gzip and params.get('ContentType') in self.gzip_content_types:
+            # Compressed on the fly by S3Storage; the size is not known up front
+            return super()._save(name, content)
+
+        part_size = max(settings.S3_MULTIPART_PART_SIZE, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+        content.seek(0, os.SEEK_SET)
+        upload_multipart(
+            self.connection.meta.client, self.bucket_name, key, content, params,
+            part_size, settings.S3_UPLOAD_CONCURRENCY,
+        )
+        return cleaned_name
+
+
+class DedupS3Storage(DedupStorageMixin, ParallelUploadS3Storage):
+    """CachedS3Storage that uploads each distinct content once."""
@@ -1,11 +1,15 @@
 """
 URL configuration for TGNPDCL Monolithic Application.
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from documents.views import serve_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('accounts.urls')),
@@ -14,5 +18,10 @@ urlpatterns = [
     path('documents/', include('documents.urls')),
 ]
 
-if settings.DEBUG:
+if settings.MEDIA_OFFLOAD:
+    # Media links go through the permission check; the web server sends the bytes
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='serve_media'),
+    ]
+elif settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
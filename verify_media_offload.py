@@ -0,0 +1,119 @@
+"""
+Local harness for the web-server media offload (documents/offload.py).
+
+Runs the app in a single-threaded WSGI server - one sync worker - and starts
+a deliberately slow download of a large media file. While that download is
+in progress it times a second request:
+
+* streamed by Django, the worker is stuck feeding the slow client and the
+  second request waits;
+* with MEDIA_OFFLOAD=nginx the worker only sends the X-Accel-Redirect
+  header and answers the second request at once.
+
+Usage:
+    python verify_media_offload.py
+"""
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.append(os.getcwd())
+os.environ['MEDIA_OFFLOAD'] = 'nginx'  # before setup, so the media route is installed
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+
+import django
+django.setup()
+
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.urls import get_resolver
+
+FILE_SIZE = 64 * 1024 * 1024
+SLOW_DOWNLOAD_SECONDS = 3
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def slow_download(port, path, session_cookie):
+    """Read the file 16 KB at a time, then give up after SLOW_DOWNLOAD_SECONDS."""
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024)
+    sock.sendall(
+        f"GET {path} HTTP/1.0\r\nHost: 127.0.0.1\r\nCookie: {settings.SESSION_COOKIE_NAME}={session_cookie}\r\n\r\n".encode()
+    )
+    deadline = time.monotonic() + SLOW_DOWNLOAD_SECONDS
+    received = 0
+    while time.monotonic() < deadline:
+        chunk = sock.recv(16 * 1024)
+        if not chunk:
+            break
+        received += len(chunk)
+        time.sleep(0.05)
+    sock.close()
+    return received
+
+
+def second_request_latency(port, media_path, session_cookie):
+    downloader = threading.Thread(target=slow_download, args=(port, media_path, session_cookie))
+    downloader.start()
+    time.sleep(0.5)  # the worker is now serving the download
+    started = time.monotonic()
+    probe = urllib.request.Request(
+        f'http://127.0.0.1:{port}/documents/storage/url-cache/',
+        headers={'Cookie': f'{settings.SESSION_COOKIE_NAME}={session_cookie}'},
+    )
+    urllib.request.urlopen(probe, timeout=30).read()
+    latency = time.monotonic() - started
+    downloader.join()
+    return latency
+
+
+def verify_media_offload():
+    print("Testing media offload with one sync worker...")
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['127.0.0.1']
+
+    name = default_storage.save('offload_check/large_scan.pdf', ContentFile(b'%PDF' + b'0' * FILE_SIZE))
+    user = User.objects.create_user('offload_check_user', password=None, is_staff=True)
+    client = Client()
+    client.force_login(user)
+    session_cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+    media_path = '/' + settings.MEDIA_URL.lstrip('/') + name
+
+    get_resolver().url_patterns  # load the URLconf (with the media route) before MEDIA_OFFLOAD is toggled
+    server = make_server('127.0.0.1', 0, get_wsgi_application(), handler_class=QuietHandler)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        settings.MEDIA_OFFLOAD = ''
+        streamed = second_request_latency(port, media_path, session_cookie)
+        print(f"  streamed by Django: second request waited {streamed:.2f}s")
+
+        settings.MEDIA_OFFLOAD = 'nginx'
+        offloaded = second_request_latency(port, media_path, session_cookie)
+        print(f"  X-Accel-Redirect:   second request waited {offloaded:.2f}s")
+    finally:
+        server.shutdown()
+        default_storage.delete(name)
+        user.delete()
+
+    if offloaded < 0.5 <= streamed:
+        print("SUCCESS: the worker is released as soon as the offload header is sent.")
+    else:
+        print("FAILED: offload did not free the worker.")
+
+
+if __name__ == "__main__":
+    verify_media_offload()
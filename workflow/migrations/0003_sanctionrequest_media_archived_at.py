@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0002_alter_approvallog_action'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sanctionrequest',
+            name='media_archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
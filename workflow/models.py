@@ -81,6 +81,8 @@ class SanctionRequest(models.Model):
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     is_limit_exceeded = models.BooleanField(default=False)
+    # Set once the claim's files have moved to the cold tier (documents/tiering.py)
+    media_archived_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
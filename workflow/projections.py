@@ -0,0 +1,29 @@
+"""Column sets for the SanctionRequest list pages (see hospitals.projections)."""
+from hospitals.projections import ListProjection
+
+from .models import SanctionRequest
+
+
+APPROVAL_QUEUE = ListProjection('ApprovalQueueRow', SanctionRequest, [
+    'id',
+    'hospital_name',
+    'patient_name',
+    ('employee_id', 'bill__employee_id'),
+    ('bill_id', 'bill'),
+    'claimed_amount',
+    'current_step__name',
+    'status',
+    'created_at',
+    'assigned_to__username',
+], extra=['attachments'])
+
+TASK_ALLOCATION = ListProjection('TaskAllocationRow', SanctionRequest, [
+    'id',
+    'hospital_name',
+    'patient_name',
+    'claimed_amount',
+    'current_step__name',
+    'current_step__role_name',
+    ('assigned_to_id', 'assigned_to'),
+    'assigned_to__username',
+])
@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import UserProfile
+from hospitals.attachments import sync_attachments
+from hospitals.models import Bill, Hospital, IdempotencyKey
+from .models import ApprovalLog, SanctionRequest, WorkflowStep
+
+
+# Pages render without a collected static manifest
+PAGE_STORAGES = {
+    'default': {'BACKEND': 'documents.blobs.DedupFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class ProcessRequestTests(TestCase):
+    def setUp(self):
+        self.first_step = WorkflowStep.objects.create(name='JPO', order=1, role_name='JPO')
+        self.last_step = WorkflowStep.objects.create(name='PO', order=2, role_name='PO',
+                                                     can_approve_final=True, can_reject=True)
+        hospital = Hospital.objects.create(name='Hospital H1', code='H1')
+        self.bill = Bill.objects.create(hospital=hospital, status='SUBMITTED', employee_id='E100',
+                                        ip_number='IP1', bill_number='INV1')
+        self.sanction_request = SanctionRequest.objects.create(
+            bill=self.bill, hospital_name=hospital.name, patient_name='Ravi', claimed_amount=200,
+            current_step=self.first_step, status='PENDING',
+        )
+        user = User.objects.create_user('jpo', password='pw')
+        UserProfile.objects.create(user=user, role='JPO')
+        self.client.force_login(user)
+
+    def act(self, action, key='key-1'):
+        return self.client.post(f'/workflow/request/{self.sanction_request.id}/process/', {
+            'action': action, 'comments': 'checked', 'approved_amount': '150', 'idempotency_key': key,
+        })
+
+    def test_denied_action_writes_nothing(self):
+        response = self.act('APPROVE')
+        self.assertRedirects(response, f'/workflow/request/{self.sanction_request.id}/',
+                             fetch_redirect_response=False)
+        self.assertFalse(ApprovalLog.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.sanction_request.refresh_from_db()
+        self.assertEqual(self.sanction_request.status, 'PENDING')
+
+    def test_denied_key_can_still_be_used(self):
+        self.act('APPROVE')
+        self.act('FORWARD')
+        self.sanction_request.refresh_from_db()
+        self.assertEqual(self.sanction_request.current_step, self.last_step)
+        self.assertEqual(ApprovalLog.objects.get().action, 'FORWARD')
+
+    def test_forward_is_logged_once_on_retry(self):
+        self.act('FORWARD')
+        self.act('FORWARD')
+        self.assertEqual(ApprovalLog.objects.count(), 1)
+        self.sanction_request.refresh_from_db()
+        self.assertEqual(self.sanction_request.current_step, self.last_step)
+
+    def test_status_change_leaves_search_index_alone(self):
+        with mock.patch('hospitals.search.index_bills') as index_bills:
+            self.act('FORWARD')
+        index_bills.assert_not_called()
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.status, 'UNDER_REVIEW')
+
+
+@override_settings(STORAGES=PAGE_STORAGES)
+class ApprovalQueueTests(TestCase):
+    def setUp(self):
+        step = WorkflowStep.objects.create(name='JPO', order=1, role_name='JPO')
+        hospital = Hospital.objects.create(name='Hospital H1', code='H1')
+        for n in range(3):
+            bill = Bill.objects.create(hospital=hospital, status='SUBMITTED', employee_id=f'E{n}',
+                                       ip_number=f'IP{n}', bill_number='INV1', patient_name=f'Patient {n}',
+                                       id_card_file=f'bills/id_cards/card{n}.pdf')
+            sync_attachments([bill.id])
+            SanctionRequest.objects.create(bill=bill, hospital_name=hospital.name, patient_name=bill.patient_name,
+                                           claimed_amount=100, current_step=step, status='PENDING')
+        user = User.objects.create_user('jpo', password='pw')
+        UserProfile.objects.create(user=user, role='JPO')
+        self.client.force_login(user)
+
+    def test_attachments_listed_from_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/workflow/queue/')
+        self.assertEqual(response.status_code, 200)
+        for n in range(3):
+            self.assertContains(response, f'bills/id_cards/card{n}.pdf')
+        attachment_queries = [query for query in queries if 'hospitals_billattachment' in query['sql']]
+        self.assertEqual(len(attachment_queries), 1)
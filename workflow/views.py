@@ -1,11 +1,20 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
 from accounts.decorators import approver_required, role_required
+from documents.metadata import attach_metadata
+from documents.previews import attach_previews
+from hospitals.attachments import CLAIM_KINDS, attach_attachments, attachments_for
+from hospitals.employees import claim_history
+from hospitals.idempotency import form_key, remember_response, replay_response
+from hospitals.projections import BILL_LIST
+from hospitals.search import search_bills
 from .models import SanctionRequest, ApprovalLog, WorkflowStep
+from .projections import APPROVAL_QUEUE, TASK_ALLOCATION
 
 
 @login_required
@@ -28,10 +37,16 @@ def approval_queue(request):
         current_step__in=steps,
         status__in=['PENDING', 'IN_PROGRESS']
     ).order_by('created_at')
+    # Search stays inside the requests this officer can already see
+    query = request.GET.get('q', '').strip()
+    pending_requests = APPROVAL_QUEUE.apply(search_bills(pending_requests, query, bill_lookup='bill'))
+    # Every file of the listed claims in one query; the rows stay cached on the queryset
+    attach_attachments(pending_requests)
     
     return render(request, 'workflow/approval_queue.html', {
         'step': steps.first(),
         'pending_requests': pending_requests,
+        'query': query,
     })
 
 
@@ -39,10 +54,10 @@ def approval_queue(request):
 @role_required('CUSTOMER_ADMIN')
 def customer_admin_allocation(request):
     """Dashboard for Customer Admin to allocate tasks."""
-    requests = SanctionRequest.objects.exclude(status__in=['APPROVED', 'REJECTED'])
+    requests = TASK_ALLOCATION.apply(SanctionRequest.objects.exclude(status__in=['APPROVED', 'REJECTED']))
     
     # Get all potential assignees (officers)
-    assignees = User.objects.filter(profile__role__in=['JPO', 'PO', 'AS', 'GMM', 'CGM', 'JS','DIRECTOR'])
+    assignees = User.objects.filter(profile__role__in=['JPO', 'PO', 'AS', 'GMM', 'CGM', 'JS','DIRECTOR']).select_related('profile')
     
     return render(request, 'workflow/task_allocation.html', {
         'requests': requests,
@@ -88,7 +103,7 @@ def request_detail(request, request_id):
     
     # Get bill documents
     try:
-        bill_documents = sanction_request.bill.documents.all()
+        bill_documents = list(sanction_request.bill.documents.all())
     except:
         bill_documents = []
     
@@ -96,6 +111,7 @@ def request_detail(request, request_id):
     # Convert to list to ensure attributes persist to template and avoid re-evaluation
     items = list(sanction_request.bill.items.all())
     total_claimed_amount = 0
+    total_excess_amount = 0
     
     # DEBUG LOGGING
     print(f"DEBUG: Processing Request {sanction_request.id}")
@@ -113,6 +129,9 @@ def request_detail(request, request_id):
         # Sum total
         if item.claimed_amount:
             total_claimed_amount += item.claimed_amount
+        # Tariff deviation was priced at submission; only summed here
+        if item.excess_amount:
+            total_excess_amount += item.excess_amount
             
     print(f"DEBUG: Total Claimed calculated: {total_claimed_amount}")
     print(f"DEBUG: Stored Claimed: {sanction_request.claimed_amount}")
@@ -137,15 +156,29 @@ def request_detail(request, request_id):
         print(f"DEBUG: Found previous approved amount: {suggested_amount}")
     
     steps = WorkflowStep.objects.all().order_by('order')
+    # Inline thumbnails; originals are only fetched when opened
+    file_previews = attach_previews(sanction_request.bill, items, bill_documents)
+    claim_files = attachments_for([sanction_request.bill_id], CLAIM_KINDS).get(sanction_request.bill_id, [])
+    attach_metadata(sanction_request.bill, items, bill_documents, claim_files)
+    employee_claims = BILL_LIST.apply(claim_history(sanction_request.bill))[:10]
+    admission_overlaps = sanction_request.bill.admission_overlaps.select_related(
+        'other_bill__hospital', 'other_bill__sanction_request'
+    ).order_by('other_bill__admission_date')
     
     return render(request, 'workflow/request_detail.html', {
         'sanction_request': sanction_request,
         'items': items, # Pass processed list of items
         'total_claimed_amount': total_claimed_amount,
+        'total_excess_amount': total_excess_amount,
         'suggested_amount': suggested_amount,
         'logs': logs,
         'bill_documents': bill_documents,
         'steps': steps,
+        'employee_claims': employee_claims,
+        'admission_overlaps': admission_overlaps,
+        'file_previews': file_previews,
+        'claim_files': claim_files,
+        'idempotency_key': form_key(request),
     })
 
 
@@ -156,104 +189,131 @@ def process_request(request, request_id):
     sanction_request = get_object_or_404(SanctionRequest, id=request_id)
     
     if request.method == 'POST':
-        action = request.POST.get('action')
-        comments = request.POST.get('comments', '')
-        amount = request.POST.get('approved_amount')
+        # Double click / browser retry: answer with the first action's result
+        replayed = replay_response(request, 'process_request')
+        if replayed:
+            return replayed
+        # Refused before any write, and not remembered: nothing to replay
+        denied = _action_denied(sanction_request, request.POST.get('action'))
+        if denied:
+            messages.error(request, denied)
+            return redirect('workflow:request_detail', request_id=request_id)
+        try:
+            with transaction.atomic():
+                response = _apply_action(request, sanction_request)
+                remember_response(request, 'process_request', response)
+        except IntegrityError:
+            # A concurrent replay of the same form committed first
+            replayed = replay_response(request, 'process_request')
+            if replayed:
+                return replayed
+            raise
+        return response
+    
+    return redirect('workflow:request_detail', request_id=request_id)
+
+
+def _action_denied(sanction_request, action):
+    """Why the current step cannot take ``action``, or None."""
+    step = sanction_request.current_step
+    if action == 'APPROVE' and not step.can_approve_final:
+        return 'You do not have permission for final approval.'
+    if action == 'REJECT' and not step.can_reject:
+        return 'You do not have permission to reject this request.'
+    if action in ['FORWARD', 'REJECT_RECOMMENDED'] and not WorkflowStep.objects.filter(order__gt=step.order).exists():
+        return 'No next step available.'
+    return None
+
+
+def _apply_action(request, sanction_request):
+    """Apply the posted item updates and workflow action; returns the redirect."""
+    action = request.POST.get('action')
+    comments = request.POST.get('comments', '')
+    amount = request.POST.get('approved_amount')
+    
+    # Update Bill Items (Remarks and Approved Amounts)
+    for item in sanction_request.bill.items.all():
+        save_item = False
         
-        # Update Bill Items (Remarks and Approved Amounts)
-        for item in sanction_request.bill.items.all():
-            save_item = False
-            
-            # Update comments/remarks
-            remark_key = f'remarks_{item.id}'
-            if remark_key in request.POST:
-                item.comments = request.POST.get(remark_key)
+        # Update comments/remarks
+        remark_key = f'remarks_{item.id}'
+        if remark_key in request.POST:
+            item.comments = request.POST.get(remark_key)
+            save_item = True
+        
+        # Update approved rate if present
+        rate_key = f'approved_rate_{item.id}'
+        if rate_key in request.POST and request.POST.get(rate_key):
+            try:
+                item.approved_rate = float(request.POST.get(rate_key))
                 save_item = True
-            
-            # Update approved rate if present
-            rate_key = f'approved_rate_{item.id}'
-            if rate_key in request.POST and request.POST.get(rate_key):
-                try:
-                    item.approved_rate = float(request.POST.get(rate_key))
-                    save_item = True
-                except ValueError:
-                    pass
-            
-            # Update approved amount if present
-            amt_key = f'approved_amount_{item.id}'
-            if amt_key in request.POST and request.POST.get(amt_key):
-                try:
-                    item.approved_amount = float(request.POST.get(amt_key))
-                    save_item = True
-                except ValueError:
-                    pass
-            
-            # Update approved quantity if present
-            qty_key = f'approved_quantity_{item.id}'
-            if qty_key in request.POST and request.POST.get(qty_key):
-                try:
-                    item.approved_quantity = int(request.POST.get(qty_key))
-                    save_item = True
-                except ValueError:
-                    pass
-
-            if save_item:
-                item.save()
+            except ValueError:
+                pass
         
-        # Create approval log
-        ApprovalLog.objects.create(
-            request=sanction_request,
-            step=sanction_request.current_step,
-            user=request.user,
-            action=action,
-            comments=comments,
-            approved_amount_at_stage=amount if amount else None,
-        )
+        # Update approved amount if present
+        amt_key = f'approved_amount_{item.id}'
+        if amt_key in request.POST and request.POST.get(amt_key):
+            try:
+                item.approved_amount = float(request.POST.get(amt_key))
+                save_item = True
+            except ValueError:
+                pass
         
-        # Validate actions based on step permissions
-        if action == 'APPROVE':
-            if not sanction_request.current_step.can_approve_final:
-                messages.error(request, 'You do not have permission for final approval.')
-                return redirect('workflow:request_detail', request_id=request_id)
-            sanction_request.status = 'APPROVED'
-            sanction_request.sanctioned_amount = amount
-            sanction_request.bill.status = 'APPROVED'
-            sanction_request.bill.save()
-            messages.success(request, 'Request approved successfully.')
-        elif action == 'REJECT':
-            if not sanction_request.current_step.can_reject:
-                messages.error(request, 'You do not have permission to reject this request.')
-                return redirect('workflow:request_detail', request_id=request_id)
-            sanction_request.status = 'REJECTED'
-            sanction_request.bill.status = 'REJECTED'
-            sanction_request.bill.save()
-            messages.warning(request, 'Request rejected.')
-        elif action in ['FORWARD', 'REJECT_RECOMMENDED']:
-            # Move to next step
-            next_step = WorkflowStep.objects.filter(
-                order__gt=sanction_request.current_step.order
-            ).first()
-            if next_step:
-                sanction_request.current_step = next_step
-                sanction_request.status = 'IN_PROGRESS'
-                sanction_request.assigned_to = None
-                if sanction_request.bill.status != 'UNDER_REVIEW':
-                    sanction_request.bill.status = 'UNDER_REVIEW'
-                    sanction_request.bill.save()
-                
-                msg = f'Request forwarded to {next_step.name}.'
-                if action == 'REJECT_RECOMMENDED':
-                    msg = f'Request forwarded to {next_step.name} with recommendation for rejection.'
-                messages.success(request, msg)
-            else:
-                messages.error(request, 'No next step available.')
-        elif action == 'CLARIFY':
-            sanction_request.status = 'CLARIFICATION'
-            sanction_request.bill.status = 'CLARIFICATION'
-            sanction_request.bill.save()
-            messages.info(request, 'Clarification requested.')
+        # Update approved quantity if present
+        qty_key = f'approved_quantity_{item.id}'
+        if qty_key in request.POST and request.POST.get(qty_key):
+            try:
+                item.approved_quantity = int(request.POST.get(qty_key))
+                save_item = True
+            except ValueError:
+                pass
+
+        if save_item:
+            item.save()
+    
+    # Create approval log
+    ApprovalLog.objects.create(
+        request=sanction_request,
+        step=sanction_request.current_step,
+        user=request.user,
+        action=action,
+        comments=comments,
+        approved_amount_at_stage=amount if amount else None,
+    )
+    
+    # Step permissions were checked by _action_denied() before any write
+    if action == 'APPROVE':
+        sanction_request.status = 'APPROVED'
+        sanction_request.sanctioned_amount = amount
+        sanction_request.bill.status = 'APPROVED'
+        sanction_request.bill.save(update_fields=['status', 'updated_at'])
+        messages.success(request, 'Request approved successfully.')
+    elif action == 'REJECT':
+        sanction_request.status = 'REJECTED'
+        sanction_request.bill.status = 'REJECTED'
+        sanction_request.bill.save(update_fields=['status', 'updated_at'])
+        messages.warning(request, 'Request rejected.')
+    elif action in ['FORWARD', 'REJECT_RECOMMENDED']:
+        # Move to next step
+        next_step = WorkflowStep.objects.filter(
+            order__gt=sanction_request.current_step.order
+        ).first()
+        sanction_request.current_step = next_step
+        sanction_request.status = 'IN_PROGRESS'
+        sanction_request.assigned_to = None
+        if sanction_request.bill.status != 'UNDER_REVIEW':
+            sanction_request.bill.status = 'UNDER_REVIEW'
+            sanction_request.bill.save(update_fields=['status', 'updated_at'])
         
-        sanction_request.save()
-        return redirect('workflow:approval_queue')
+        msg = f'Request forwarded to {next_step.name}.'
+        if action == 'REJECT_RECOMMENDED':
+            msg = f'Request forwarded to {next_step.name} with recommendation for rejection.'
+        messages.success(request, msg)
+    elif action == 'CLARIFY':
+        sanction_request.status = 'CLARIFICATION'
+        sanction_request.bill.status = 'CLARIFICATION'
+        sanction_request.bill.save(update_fields=['status', 'updated_at'])
+        messages.info(request, 'Clarification requested.')
     
-    return redirect('workflow:request_detail', request_id=request_id)
+    sanction_request.save()
+    return redirect('workflow:approval_queue')